@@ -0,0 +1,71 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Lets the tests import Timber's modules from the directory above, and holds their shared fixtures.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ListLogger:
+    # Keeps logged lines in a list instead of writing a log file. It has everything TimberSync uses of a
+    # TimberLogger.
+
+    def __init__(self):
+        self.path = "test.log"
+        self.verbose = True
+        self.lines = []
+
+    def log(self, message, *args):
+        self.lines.append(message % args if args else message)
+
+    def detail(self, message, *args):
+        self.log(message, *args)
+
+    def close_log(self):
+        pass
+
+
+def write_file(root, rel_path, content="data", mtime=1000000000):
+    # Writes a file under root, making its directories, and sets its modification time. content can be text or
+    # bytes.
+    path = os.path.join(str(root), rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content.encode("utf-8") if isinstance(content, str) else content)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def read_file(root, rel_path):
+    with open(os.path.join(str(root), rel_path), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def logger():
+    return ListLogger()
+
+
+@pytest.fixture
+def trees(tmp_path):
+    source = tmp_path / "source"
+    destination = tmp_path / "destination"
+    source.mkdir()
+    destination.mkdir()
+    return str(source), str(destination)
+
+
+@pytest.fixture
+def make_sync(logger):
+    # Returns a function that makes a TimberSync logging to the test's logger. TimberSync shows its progress with
+    # tqdm, so tests that sync are skipped where it isn't installed.
+    pytest.importorskip("tqdm")
+    from timber_sync import TimberSync
+
+    def make():
+        return TimberSync(logger)
+    return make
@@ -0,0 +1,96 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for the catalog of a directory tree.
+
+import csv
+import json
+import os
+import time
+
+import pytest
+
+from conftest import write_file
+
+# the catalog shows its progress with tqdm
+pytest.importorskip("tqdm")
+from timber_catalog import TimberCatalog, CATALOG_HEADER, CATALOG_TIME_FORMAT
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    write_file(root, "a.txt", "aaa", mtime=1000000000)
+    write_file(root, "d/b.txt", "bb", mtime=1100000000)
+    write_file(root, "d/e/c.txt", "c", mtime=1200000000)
+    write_file(root, ".hidden.txt")
+    write_file(root, ".git/config")
+    write_file(root, "d/skip.tmp")
+    return str(root)
+
+
+def catalog(logger, tree, output, ignored_directories="", **settings):
+    cataloger = TimberCatalog(logger)
+    for key, value in settings.items():
+        setattr(cataloger, key, value)
+    cataloger.catalog(tree, output, ignored_directories)
+
+
+def modified(mtime):
+    return time.strftime(CATALOG_TIME_FORMAT, time.localtime(mtime))
+
+
+def test_csv_catalog(logger, tree, tmp_path):
+    output = str(tmp_path / "catalog.csv")
+    catalog(logger, tree, output, exclude_patterns=["*.tmp"])
+    with open(output, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == list(CATALOG_HEADER)
+    assert sorted(rows[1:]) == sorted([["", "a.txt", "3", modified(1000000000)],
+                                       ["d", "b.txt", "2", modified(1100000000)],
+                                       [os.path.join("d", "e"), "c.txt", "1", modified(1200000000)]])
+    assert "Catalog of 3 files saved to %s" % output in logger.lines
+
+
+def test_jsonl_catalog(logger, tree, tmp_path):
+    output = str(tmp_path / "catalog.JSONL")
+    catalog(logger, tree, output, ignored_directories="e", exclude_patterns=["!.hidden.txt"])
+    with open(output, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert sorted((row["directory"], row["name"]) for row in rows) == \
+        [("", ".hidden.txt"), ("", "a.txt"), ("d", "b.txt"), ("d", "skip.tmp")]
+    b = [row for row in rows if row["name"] == "b.txt"][0]
+    assert b == {"directory": "d", "name": "b.txt", "size": 2, "mtime": 1100000000, "modified": modified(1100000000)}
+
+
+def test_parallel_catalog_lists_the_same_files(logger, tree, tmp_path):
+    outputs = []
+    for jobs in (1, 4):
+        output = str(tmp_path / ("catalog%d.jsonl" % jobs))
+        cataloger = TimberCatalog(logger)
+        cataloger.scanner.jobs = jobs
+        cataloger.catalog(tree, output)
+        with open(output, encoding="utf-8") as f:
+            outputs.append(sorted(f))
+    assert outputs[0] == outputs[1]
+
+
+@pytest.mark.parametrize("output", ["catalog.txt", "catalog"])
+def test_unknown_format_exits(logger, tree, tmp_path, output):
+    with pytest.raises(SystemExit):
+        catalog(logger, tree, str(tmp_path / output))
+    assert not os.path.exists(tmp_path / output)
+
+
+def test_missing_directory_exits(logger, tmp_path):
+    with pytest.raises(SystemExit):
+        catalog(logger, str(tmp_path / "missing"), str(tmp_path / "catalog.csv"))
+
+
+def test_xlsx_catalog(logger, tree, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    output = str(tmp_path / "catalog.xlsx")
+    catalog(logger, tree, output)
+    sheet = openpyxl.load_workbook(output).active
+    rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+    assert rows[0] == list(CATALOG_HEADER)
+    assert len(rows) == 5
@@ -0,0 +1,81 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for copying the files of a sync on several threads.
+
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import write_file, read_file
+
+
+def tree_contents(root):
+    contents = {}
+    for directory, dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            contents[os.path.relpath(path, root)] = read_file(root, path)
+    return contents
+
+
+@pytest.fixture
+def counted_sync(make_sync, monkeypatch):
+    # Makes a sync that records the most files it copied at the same time. Files of 1000 bytes or more are large.
+    import timber_sync
+    monkeypatch.setattr(timber_sync, "LARGE_FILE_SIZE", 1000)
+
+    def make(jobs, fail=()):
+        sync = make_sync()
+        sync.jobs = jobs
+        real_copy_file = sync.copy_file
+        lock = threading.Lock()
+        running = [0]
+        sync.most_running = 0
+
+        def copy_file(source_file, destination_file, exists, size, index=None):
+            with lock:
+                running[0] += 1
+                sync.most_running = max(sync.most_running, running[0])
+            try:
+                time.sleep(0.001)
+                if os.path.basename(source_file) in fail:
+                    raise OSError("read error")
+                return real_copy_file(source_file, destination_file, exists, size, index)
+            finally:
+                with lock:
+                    running[0] -= 1
+        sync.copy_file = copy_file
+        return sync
+    return make
+
+
+@pytest.mark.parametrize("jobs", [2, 4])
+def test_concurrent_copy(trees, counted_sync, jobs):
+    source, destination = trees
+    for i in range(40):
+        write_file(source, "d%d/small%d.txt" % (i % 5, i), "small %d" % i)
+    for i in range(6):
+        write_file(source, "large/%d.bin" % i, bytes([i]) * (1000 + i))
+    for i in range(5):
+        write_file(destination, "d%d/small%d.txt" % (i, i), "stale")
+
+    sync = counted_sync(jobs)
+    sync.sync(source, destination, "", False)
+    assert tree_contents(destination) == tree_contents(source)
+    assert (sync.counts["copied"], sync.counts["updated"]) == (41, 5)
+    assert 1 < sync.most_running <= jobs
+
+
+def test_failed_copies_are_skipped(trees, counted_sync):
+    source, destination = trees
+    for i in range(10):
+        write_file(source, "%d.txt" % i, "file %d" % i)
+    write_file(source, "large.bin", b"x" * 2000)
+
+    sync = counted_sync(4, fail=("3.txt", "large.bin"))
+    sync.sync(source, destination, "", False)
+    assert sync.counts["copied"] == 9
+    assert sorted(os.listdir(destination)) == sorted("%d.txt" % i for i in range(10) if i != 3)
+    assert any("Error copying" in line and "3.txt" in line for line in sync.logger.lines)
@@ -0,0 +1,126 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for the tiered copy backend, which has to give the same result as shutil.copy and copy2.
+
+import os
+import random
+import shutil
+import stat
+
+import pytest
+
+import timber_copy
+from conftest import write_file, read_file
+from timber_copy import CopyBackend, COPY_TIERS, TIER_READINTO, TIER_REFLINK, UnsupportedTier, new_hasher
+
+SIZES = [0, 1, 4095, 4096, 4097, 3 * 1024 * 1024 + 17]
+
+
+def data(size):
+    return random.Random(size).randbytes(size)
+
+
+@pytest.mark.parametrize("tier", COPY_TIERS)
+@pytest.mark.parametrize("size", SIZES)
+def test_each_tier_copies_the_data(tmp_path, tier, size):
+    backend = CopyBackend(tiers=(tier, TIER_READINTO), buffer_size=4096)
+    if tier not in backend.tiers:
+        pytest.skip("%s isn't available here" % tier)
+    source = write_file(tmp_path, "source.bin", data(size))
+    destination = str(tmp_path / "destination.bin")
+    used = backend.copy(source, destination)
+    assert read_file(tmp_path, "destination.bin") == data(size)
+    assert used in (tier, TIER_READINTO)
+    assert backend.tier_counts[used] == 1
+
+
+def test_metadata_matches_shutil(tmp_path):
+    source = write_file(tmp_path, "source.txt", "contents", mtime=1300000000)
+    os.chmod(source, 0o640)
+    backend = CopyBackend()
+
+    backend.copy(source, str(tmp_path / "copy2.txt"), preserve_metadata=True)
+    shutil.copy2(source, str(tmp_path / "shutil_copy2.txt"))
+    for name in ("copy2.txt", "shutil_copy2.txt"):
+        st = os.stat(str(tmp_path / name))
+        assert st.st_mtime_ns == os.stat(source).st_mtime_ns
+        assert stat.S_IMODE(st.st_mode) == 0o640
+
+    backend.copy(source, str(tmp_path / "copy.txt"), preserve_metadata=False)
+    st = os.stat(str(tmp_path / "copy.txt"))
+    assert st.st_mtime_ns != os.stat(source).st_mtime_ns
+    assert stat.S_IMODE(st.st_mode) == 0o640
+
+
+def test_copy_into_a_directory_and_onto_itself(tmp_path):
+    source = write_file(tmp_path, "source.txt", "contents")
+    os.mkdir(str(tmp_path / "directory"))
+    backend = CopyBackend()
+    backend.copy(source, str(tmp_path / "directory"))
+    assert read_file(tmp_path, "directory/source.txt") == b"contents"
+    with pytest.raises(shutil.SameFileError):
+        backend.copy(source, source)
+
+
+def test_hashing_uses_the_readinto_tier(tmp_path):
+    source = write_file(tmp_path, "source.bin", data(100000))
+    hasher = new_hasher()
+    backend = CopyBackend(buffer_size=4096)
+    assert backend.copy(source, str(tmp_path / "destination.bin"), hasher=hasher) == TIER_READINTO
+    expected = new_hasher()
+    expected.update(data(100000))
+    assert hasher.digest() == expected.digest()
+    assert backend.hash_file(str(tmp_path / "destination.bin"), new_hasher()) == expected.digest()
+
+
+def test_unsupported_tier_falls_back_and_is_remembered(tmp_path, monkeypatch):
+    backend = CopyBackend(tiers=COPY_TIERS)
+    attempts = []
+
+    def unsupported(*args):
+        attempts.append(args)
+        raise UnsupportedTier()
+
+    monkeypatch.setattr(backend, "copy_with_tier",
+                        lambda tier, fsrc, fdst, size: unsupported() if tier != TIER_READINTO
+                        else backend.copy_readinto(fsrc, fdst))
+    for i in range(3):
+        source = write_file(tmp_path, "source%d.bin" % i, data(5000))
+        assert backend.copy(source, str(tmp_path / ("destination%d.bin" % i))) == TIER_READINTO
+        assert read_file(tmp_path, "destination%d.bin" % i) == data(5000)
+    # every faster tier was tried once, then skipped for this pair of devices
+    assert len(attempts) == len(backend.tiers) - 1
+    assert backend.tier_counts[TIER_READINTO] == 3
+
+
+def test_reflink_errors_that_arent_unsupported_are_raised(tmp_path, monkeypatch):
+    backend = CopyBackend(tiers=(TIER_REFLINK, TIER_READINTO))
+    if TIER_REFLINK not in backend.tiers:
+        pytest.skip("reflink isn't available here")
+
+    def ioctl(fd, request, argument):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(timber_copy.fcntl, "ioctl", ioctl)
+    source = write_file(tmp_path, "source.bin", data(10))
+    with pytest.raises(OSError):
+        backend.copy(source, str(tmp_path / "destination.bin"))
+
+
+@pytest.mark.parametrize("tier", COPY_TIERS)
+def test_sync_with_each_tier(trees, make_sync, tier):
+    source, destination = trees
+    for i, size in enumerate(SIZES):
+        write_file(source, "d%d/f%d.bin" % (i % 2, i), data(size), mtime=1300000000)
+    write_file(destination, "d0/f0.bin", b"old", mtime=1200000000)
+    sync = make_sync()
+    sync.copy_backend = CopyBackend(tiers=(tier, TIER_READINTO))
+    sync.jobs = 2
+    sync.sync(source, destination, "", False)
+    assert sync.counts["copied"] == len(SIZES) - 1
+    assert sync.counts["updated"] == 1
+    for i, size in enumerate(SIZES):
+        assert read_file(destination, "d%d/f%d.bin" % (i % 2, i)) == data(size)
+    # updated files keep the source's times, like shutil.copy2, and new files don't, like shutil.copy
+    assert os.stat(os.path.join(destination, "d0", "f0.bin")).st_mtime_ns == 1300000000 * 10 ** 9
+    assert os.stat(os.path.join(destination, "d1", "f1.bin")).st_mtime_ns != 1300000000 * 10 ** 9
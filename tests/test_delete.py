@@ -0,0 +1,77 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for deleting files and whole directory trees that are no longer in the source.
+
+import os
+
+import pytest
+
+from conftest import write_file, read_file
+
+
+def listing(root):
+    paths = []
+    for directory, dirs, files in os.walk(root):
+        paths.extend(os.path.relpath(os.path.join(directory, name), root) for name in dirs + files)
+    return sorted(paths)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_orphaned_trees_are_deleted(trees, make_sync, jobs):
+    source, destination = trees
+    write_file(source, "kept/a.txt")
+    write_file(destination, "kept/a.txt")
+    write_file(destination, "kept/orphan.txt")
+    for i in range(20):
+        write_file(destination, "old/%d/%d/file%d.txt" % (i % 4, i % 3, i))
+    write_file(destination, "old/top.txt")
+
+    sync = make_sync()
+    sync.jobs = jobs
+    sync.sync(source, destination, "", True)
+    assert listing(destination) == ["kept", os.path.join("kept", "a.txt")]
+    assert sync.counts["deleted"] == 22
+    # old, its 4 subdirectories and their 12 subdirectories
+    assert sync.counts["directories_deleted"] == 17
+
+
+def test_ignored_directories_in_an_orphaned_tree_are_kept(trees, make_sync):
+    source, destination = trees
+    write_file(source, "a.txt")
+    write_file(destination, "old/gone.txt")
+    write_file(destination, "old/sub/keep/notes.txt", "notes")
+    write_file(destination, "old/other/gone.txt")
+
+    sync = make_sync()
+    sync.sync(source, destination, "keep", True)
+    assert read_file(destination, "old/sub/keep/notes.txt") == b"notes"
+    assert not os.path.exists(os.path.join(destination, "old", "gone.txt"))
+    assert not os.path.exists(os.path.join(destination, "old", "other"))
+    assert sync.counts["deleted"] == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symbolic links")
+def test_links_to_directories_are_not_followed(trees, make_sync, tmp_path):
+    source, destination = trees
+    outside = tmp_path / "outside"
+    write_file(outside, "precious.txt", "precious")
+    write_file(destination, "old/gone.txt")
+    os.symlink(str(outside), os.path.join(destination, "old", "link"))
+
+    sync = make_sync()
+    sync.jobs = 2
+    sync.sync(source, destination, "", True)
+    assert read_file(outside, "precious.txt") == b"precious"
+    assert listing(destination) == []
+
+
+def test_nothing_is_deleted_without_delete(trees, make_sync):
+    source, destination = trees
+    write_file(source, "a.txt")
+    write_file(destination, "old/gone.txt")
+    write_file(destination, "orphan.txt")
+
+    sync = make_sync()
+    sync.sync(source, destination, "", False)
+    assert listing(destination) == sorted(["a.txt", "old", os.path.join("old", "gone.txt"), "orphan.txt"])
+    assert sync.counts["deleted"] == 0
@@ -0,0 +1,143 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for delta updates, which rewrite only the changed blocks of a destination file.
+
+import os
+
+import pytest
+
+import timber_copy
+from conftest import write_file, read_file
+from timber_copy import CopyBackend, DELTA_BLOCK_SIZE
+
+BLOCK_SIZE = 4096
+
+
+def pattern(size, seed=0):
+    return bytes((i * 7 + seed) % 251 for i in range(size))
+
+
+def delta(tmp_path, old, new, block_size=BLOCK_SIZE):
+    source = write_file(tmp_path, "source.bin", new, mtime=1500000000)
+    destination = write_file(tmp_path, "destination.bin", old, mtime=1400000000)
+    backend = CopyBackend()
+    written = backend.copy_delta(source, destination, block_size=block_size)
+    assert read_file(tmp_path, "destination.bin") == new
+    assert os.stat(destination).st_mtime_ns == os.stat(source).st_mtime_ns
+    return written, backend
+
+
+def test_only_the_changed_block_is_written(tmp_path):
+    old = pattern(3000000)
+    new = bytearray(old)
+    new[1500000:1500100] = b"x" * 100
+    written, backend = delta(tmp_path, old, bytes(new), block_size=1024 * 1024)
+    assert written == 1024 * 1024
+    assert backend.delta_bytes_written == written
+    assert backend.delta_bytes_skipped == 3000000 - written
+
+
+def test_unchanged_partial_last_block_isnt_rewritten(tmp_path):
+    # 10.5 blocks, with a change in the first block only
+    old = pattern(10 * BLOCK_SIZE + BLOCK_SIZE // 2)
+    new = b"y" + old[1:]
+    written, backend = delta(tmp_path, old, new)
+    assert written == BLOCK_SIZE
+
+
+def test_changed_partial_last_block_is_rewritten(tmp_path):
+    old = pattern(10 * BLOCK_SIZE + 100)
+    new = old[:-1] + b"z"
+    written, backend = delta(tmp_path, old, new)
+    assert written == 100
+
+
+def test_identical_files_write_nothing(tmp_path):
+    old = pattern(5 * BLOCK_SIZE + 1)
+    written, backend = delta(tmp_path, old, old)
+    assert written == 0
+
+
+@pytest.mark.parametrize("old_size, new_size", [
+    (10 * BLOCK_SIZE, 12 * BLOCK_SIZE + 5),
+    (12 * BLOCK_SIZE + 5, 10 * BLOCK_SIZE),
+    (12 * BLOCK_SIZE + 5, 3),
+    (0, 2 * BLOCK_SIZE),
+])
+def test_files_that_grow_or_shrink(tmp_path, old_size, new_size):
+    old = pattern(old_size)
+    new = pattern(new_size)
+    written, backend = delta(tmp_path, old, new)
+    # the blocks both files have are unchanged, so only the new tail is written
+    assert written == max(new_size - old_size, 0)
+
+
+def test_missing_destination_is_copied_whole(tmp_path):
+    source = write_file(tmp_path, "source.bin", pattern(10000))
+    destination = os.path.join(str(tmp_path), "destination.bin")
+    assert CopyBackend().copy_delta(source, destination, block_size=BLOCK_SIZE) == 10000
+    assert read_file(tmp_path, "destination.bin") == pattern(10000)
+
+
+def test_interrupted_update_doesnt_look_up_to_date(tmp_path, monkeypatch):
+    # An update that stops after rewriting a block leaves the destination one byte longer than the source, so the
+    # next sync sees a different size and redoes it even though the destination is now newer.
+    old = pattern(10 * BLOCK_SIZE)
+    new = b"y" + old[1:-1] + b"z"
+    source = write_file(tmp_path, "source.bin", new, mtime=1500000000)
+    destination = write_file(tmp_path, "destination.bin", old, mtime=1400000000)
+
+    real_open = open
+
+    class Interrupted(Exception):
+        pass
+
+    class StopAfterOneWrite:
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, data):
+            self.f.write(data)
+            raise Interrupted()
+
+        def __getattr__(self, name):
+            return getattr(self.f, name)
+
+        def __enter__(self):
+            self.f.__enter__()
+            return self
+
+        def __exit__(self, *args):
+            return self.f.__exit__(*args)
+
+    def interrupting_open(path, mode="r", *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        return StopAfterOneWrite(f) if mode == "r+b" else f
+
+    monkeypatch.setattr(timber_copy, "open", interrupting_open, raising=False)
+    with pytest.raises(Interrupted):
+        CopyBackend().copy_delta(source, destination, block_size=BLOCK_SIZE)
+    monkeypatch.undo()
+
+    assert os.path.getsize(destination) == len(new) + 1
+    assert CopyBackend().copy_delta(source, destination, block_size=BLOCK_SIZE) == BLOCK_SIZE
+    assert read_file(tmp_path, "destination.bin") == new
+
+
+def test_delta_updates_in_a_sync(trees, make_sync):
+    source, destination = trees
+    old = pattern(3 * DELTA_BLOCK_SIZE + 1000)
+    write_file(source, "big.bin", old, mtime=1400000000)
+    make_sync().sync(source, destination, "", False)
+    # new files are copied without their times, so the copy is set back to the source's time
+    os.utime(os.path.join(destination, "big.bin"), (1400000000, 1400000000))
+
+    new = old[:DELTA_BLOCK_SIZE] + b"changed" + old[DELTA_BLOCK_SIZE + 7:]
+    write_file(source, "big.bin", new, mtime=1500000000)
+    sync = make_sync()
+    sync.delta_min_size = DELTA_BLOCK_SIZE
+    sync.verify = True
+    sync.sync(source, destination, "", False)
+    assert sync.counts["updated"] == 1
+    assert read_file(destination, "big.bin") == new
+    assert sync.copy_backend.delta_bytes_written == DELTA_BLOCK_SIZE
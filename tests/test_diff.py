@@ -0,0 +1,172 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for the merge-join comparison of a source and destination tree.
+
+import os
+
+from conftest import ListLogger, write_file as write
+from timber_diff import TimberDiff
+from timber_exclude import compile_excludes
+from timber_scanner import TimberScanner
+
+
+def make_diff():
+    logger = ListLogger()
+    return TimberDiff(TimberScanner(logger), logger)
+
+
+def run(source, destination, ignored_directories=(), find_orphans=True):
+    diff = make_diff()
+    diff.diff(str(source), str(destination), list(ignored_directories), find_orphans)
+    return diff
+
+
+def paths(records):
+    return sorted(record.rel_path for record in records)
+
+
+def test_both_sides_empty(trees):
+    diff = run(*trees)
+    assert (diff.new_files, diff.updated_files, diff.orphaned_files, diff.orphaned_dirs) == ([], [], [], [])
+
+
+def test_empty_destination(trees):
+    source, destination = trees
+    write(source, "a.txt")
+    write(source, "dir/b.txt")
+    write(source, "dir/sub/c.txt")
+    diff = run(source, destination)
+    assert paths(diff.new_files) == sorted(["a.txt", os.path.join("dir", "b.txt"),
+                                           os.path.join("dir", "sub", "c.txt")])
+    assert diff.updated_files == diff.orphaned_files == diff.orphaned_dirs == []
+
+
+def test_empty_source(trees):
+    source, destination = trees
+    write(destination, "a.txt")
+    write(destination, "dir/sub/c.txt")
+    diff = run(source, destination)
+    assert diff.new_files == []
+    assert sorted(diff.orphaned_files) == sorted(["a.txt", os.path.join("dir", "sub", "c.txt")])
+    # children come before parents, so the directories can be removed in order
+    assert diff.orphaned_dirs == [os.path.join("dir", "sub"), "dir"]
+
+    diff = run(source, destination, find_orphans=False)
+    assert diff.orphaned_files == diff.orphaned_dirs == []
+
+
+def test_pruned_orphaned_directories_are_not_walked(trees):
+    source, destination = trees
+    write(destination, "dir/sub/c.txt")
+    diff = make_diff()
+    diff.prune_orphaned_dirs = True
+    diff.diff(str(source), str(destination), [])
+    assert diff.orphaned_subtrees == ["dir"]
+    assert diff.orphaned_files == diff.orphaned_dirs == []
+
+
+def test_newer_and_resized_files_are_updated(trees):
+    source, destination = trees
+    write(source, "same.txt")
+    write(destination, "same.txt")
+    write(source, "newer.txt", mtime=2000000000)
+    write(destination, "newer.txt")
+    write(source, "resized.txt", "longer data")
+    write(destination, "resized.txt")
+    write(source, "older.txt")
+    write(destination, "older.txt", mtime=2000000000)
+    diff = run(source, destination)
+    assert paths(diff.updated_files) == ["newer.txt", "resized.txt"]
+    assert diff.new_files == diff.orphaned_files == []
+
+
+def test_case_only_rename_on_a_case_sensitive_system(trees, monkeypatch):
+    source, destination = trees
+    monkeypatch.setattr(os.path, "normcase", lambda path: path)
+    write(source, "README.txt")
+    write(destination, "readme.txt")
+    write(source, "Zebra.txt")
+    write(destination, "apple.txt")
+    diff = run(source, destination)
+    # the renamed file is a different file, so it is copied and the old name is removed
+    assert paths(diff.new_files) == ["README.txt", "Zebra.txt"]
+    assert sorted(diff.orphaned_files) == ["apple.txt", "readme.txt"]
+
+
+def test_case_only_rename_on_a_case_insensitive_system(trees, monkeypatch):
+    source, destination = trees
+    # only files are renamed, since the tree under this test is really case-sensitive and a directory's new
+    # name couldn't be opened in the destination
+    monkeypatch.setattr(os.path, "normcase", lambda path: path.lower())
+    write(source, "README.txt")
+    write(destination, "readme.txt")
+    write(source, "b.txt")
+    write(destination, "A.txt")
+    diff = run(source, destination)
+    # the names sort the same way on both sides, so only the files that really differ are reported
+    assert paths(diff.new_files) == ["b.txt"]
+    assert diff.orphaned_files == ["A.txt"]
+    assert diff.updated_files == []
+    assert diff.orphaned_dirs == []
+
+
+def test_file_on_one_side_and_directory_on_the_other(trees):
+    source, destination = trees
+    write(source, "thing")
+    write(destination, "thing/inside.txt")
+    write(source, "other/inside.txt")
+    write(destination, "other")
+    write(source, "after.txt")
+    diff = run(source, destination)
+    # neither side is copied or deleted, and the merge carries on with the entries after them
+    assert paths(diff.new_files) == ["after.txt"]
+    assert diff.updated_files == diff.orphaned_files == diff.orphaned_dirs == []
+    assert sum("file on one side and a directory on the other" in line for line in diff.logger.lines) == 2
+
+
+def test_ignored_directories_and_excluded_files(trees):
+    source, destination = trees
+    write(source, "keep.txt")
+    write(source, "skip.tmp")
+    write(source, "cache/a.txt")
+    write(destination, "cache/b.txt")
+    write(destination, "old.tmp")
+    ignored = compile_excludes("cache", ["*.tmp"])
+    diff = make_diff()
+    diff.diff(str(source), str(destination), ignored)
+    assert paths(diff.new_files) == ["keep.txt"]
+    assert diff.orphaned_files == diff.orphaned_dirs == []
+
+
+def test_consumer_sees_every_directory_before_the_lists(trees):
+    source, destination = trees
+    write(source, "a.txt")
+    write(source, "dir/b.txt")
+    write(destination, "gone/c.txt")
+    diff = make_diff()
+    seen = []
+
+    def consumer(result):
+        seen.extend(record.rel_path for record in result.new_files)
+        seen.extend(result.orphaned_files)
+        result.new_files.clear()
+
+    diff.consumer = consumer
+    diff.diff(str(source), str(destination), [])
+    assert sorted(seen) == sorted(["a.txt", os.path.join("dir", "b.txt"), os.path.join("gone", "c.txt")])
+    assert diff.new_files == []
+    assert diff.orphaned_files == [os.path.join("gone", "c.txt")]
+
+
+def test_parallel_listing_gives_the_same_result(trees):
+    source, destination = trees
+    for i in range(20):
+        write(source, "dir%d/file.txt" % i)
+        write(destination, "dir%d/old.txt" % (i + 10))
+    serial = run(source, destination)
+    diff = make_diff()
+    diff.scanner.jobs = 4
+    diff.diff(str(source), str(destination), [])
+    assert diff.new_files == serial.new_files
+    assert diff.orphaned_files == serial.orphaned_files
+    assert diff.orphaned_dirs == serial.orphaned_dirs
@@ -0,0 +1,101 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for syncs that hard link or skip the duplicates found by a duplicates report.
+
+import os
+
+import pytest
+
+from conftest import write_file, read_file
+
+
+@pytest.fixture
+def dupes(trees, logger, tmp_path):
+    # Returns a function that writes a duplicates report for the source and returns its path.
+    from timber_dupes import TimberDupes
+    source, destination = trees
+
+    def make():
+        path = str(tmp_path / "dupes.json")
+        TimberDupes(logger).dupes(source, path)
+        return path
+    return make
+
+
+def sync_with(make_sync, source, destination, report, action, exclude=()):
+    sync = make_sync()
+    sync.dupes_in = report
+    sync.duplicate_action = action
+    sync.exclude_patterns = list(exclude)
+    sync.sync(source, destination, "", False)
+    return sync
+
+
+def test_link_hard_links_duplicates_to_the_first_copy(trees, make_sync, dupes):
+    source, destination = trees
+    write_file(source, "a.txt", "same contents")
+    write_file(source, "dir/b.txt", "same contents")
+    write_file(source, "c.txt", "different")
+    sync = sync_with(make_sync, source, destination, dupes(), "link")
+    assert sync.counts["copied"] == 3
+    a = os.stat(os.path.join(destination, "a.txt"))
+    b = os.stat(os.path.join(destination, "dir", "b.txt"))
+    assert (a.st_ino, a.st_dev) == (b.st_ino, b.st_dev)
+    assert read_file(destination, "dir/b.txt") == b"same contents"
+    assert os.stat(os.path.join(destination, "c.txt")).st_nlink == 1
+
+
+def test_skip_leaves_out_copies_made_by_this_sync(trees, make_sync, dupes):
+    source, destination = trees
+    write_file(source, "a.txt", "same contents")
+    write_file(source, "b.txt", "same contents")
+    sync = sync_with(make_sync, source, destination, dupes(), "skip")
+    assert sync.counts["copied"] == 1
+    assert sorted(os.listdir(destination)) in (["a.txt"], ["b.txt"])
+
+
+def test_skip_uses_an_up_to_date_copy_from_an_earlier_sync(trees, make_sync, dupes):
+    source, destination = trees
+    write_file(source, "a.txt", "same contents")
+    make_sync().sync(source, destination, "", False)
+
+    write_file(source, "b.txt", "same contents")
+    sync = sync_with(make_sync, source, destination, dupes(), "skip")
+    assert sync.counts["copied"] == 0
+    assert not os.path.exists(os.path.join(destination, "b.txt"))
+
+
+def test_skip_doesnt_trust_a_stale_copy_of_the_same_size(trees, make_sync, dupes):
+    # The destination's a.txt has the right size but old contents, and is excluded from this sync so it isn't
+    # updated. Skipping b.txt would leave no good copy of the contents anywhere in the destination.
+    source, destination = trees
+    write_file(destination, "a.txt", "old contents!", mtime=1000000000)
+    write_file(source, "a.txt", "same contents", mtime=1100000000)
+    write_file(source, "b.txt", "same contents", mtime=1100000000)
+    sync = sync_with(make_sync, source, destination, dupes(), "skip", exclude=["a.txt"])
+    assert sync.counts["copied"] == 1
+    assert read_file(destination, "b.txt") == b"same contents"
+
+
+def test_skip_doesnt_trust_a_copy_whose_source_changed(trees, make_sync, dupes):
+    source, destination = trees
+    write_file(source, "a.txt", "same contents", mtime=1100000000)
+    make_sync().sync(source, destination, "", False)
+    write_file(source, "b.txt", "same contents", mtime=1100000000)
+    report = dupes()
+
+    # a.txt changes after the report was made, but keeps its size
+    write_file(source, "a.txt", "new contents!", mtime=1200000000)
+    sync_with(make_sync, source, destination, report, "skip", exclude=["a.txt"])
+    assert read_file(destination, "b.txt") == b"same contents"
+
+
+def test_changed_files_arent_treated_as_duplicates(trees, make_sync, dupes):
+    source, destination = trees
+    write_file(source, "a.txt", "same contents")
+    write_file(source, "b.txt", "same contents")
+    report = dupes()
+    write_file(source, "b.txt", "changed since", mtime=1100000000)
+    sync_with(make_sync, source, destination, report, "link")
+    assert read_file(destination, "b.txt") == b"changed since"
+    assert os.stat(os.path.join(destination, "b.txt")).st_nlink == 1
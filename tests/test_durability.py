@@ -0,0 +1,158 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for atomic writes and the --fsync durability policies.
+
+import os
+
+import pytest
+
+import timber_copy
+from conftest import write_file, read_file
+from timber_copy import DurableWrites, DURABILITY_NONE, DURABILITY_FILE, DURABILITY_DIRECTORY, DURABILITY_END, \
+    TEMP_FILE_SUFFIX
+
+needs_proc = pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to name fsynced files")
+
+
+@pytest.fixture
+def events(monkeypatch):
+    # Records every fsync (by the path of the file or directory), rename and filesystem sync, in order.
+    events = []
+    real_fsync = os.fsync
+    real_replace = os.replace
+    real_rename = os.rename
+
+    def fsync(fd):
+        events.append(("fsync", os.readlink("/proc/self/fd/%d" % fd)))
+        real_fsync(fd)
+
+    def replace(source, destination, *args, **kwargs):
+        events.append(("rename", str(source)))
+        real_replace(source, destination, *args, **kwargs)
+
+    def rename(source, destination, *args, **kwargs):
+        events.append(("rename", str(source)))
+        real_rename(source, destination, *args, **kwargs)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    monkeypatch.setattr(os, "replace", replace)
+    monkeypatch.setattr(os, "rename", rename)
+    monkeypatch.setattr(timber_copy, "sync_filesystem", lambda path: events.append(("syncfs", path)))
+    return events
+
+
+def fsynced(events):
+    return [path for event, path in events if event == "fsync"]
+
+
+def make_tree(source, destination):
+    # two directories with new files, and one file to update
+    for i in range(3):
+        write_file(source, "a/new%d.txt" % i, "new %d" % i)
+        write_file(source, "b/new%d.txt" % i, "new %d" % i)
+    write_file(destination, "a/old.txt", "old contents", mtime=1000000000)
+    write_file(source, "a/old.txt", "new contents", mtime=1100000000)
+
+
+def run(make_sync, source, destination, policy, atomic, small_files=False):
+    sync = make_sync()
+    sync.durable_writes.policy = policy
+    sync.atomic_writes = atomic
+    sync.small_file_size = 64 * 1024 if small_files else None
+    sync.use_journal = False
+    sync.sync(source, destination, "", False)
+    assert read_file(destination, "a/old.txt") == b"new contents"
+    assert read_file(destination, "b/new2.txt") == b"new 2"
+    assert not [name for root, dirs, files in os.walk(destination) for name in files
+                if name.endswith(TEMP_FILE_SUFFIX)]
+    return sync
+
+
+@needs_proc
+@pytest.mark.parametrize("small_files", [False, True])
+def test_atomic_dir_policy_fsyncs_each_file_before_renaming_it(trees, make_sync, events, small_files):
+    source, destination = trees
+    make_tree(source, destination)
+    run(make_sync, source, destination, DURABILITY_DIRECTORY, True, small_files)
+
+    renamed = [os.path.basename(path) for event, path in events if event == "rename"]
+    assert len(renamed) == 7
+    for index, (event, path) in enumerate(events):
+        if event == "rename":
+            name = os.path.basename(path)
+            assert any(event == "fsync" and os.path.basename(synced) == name for event, synced in events[:index])
+
+    # the directories are only fsynced once, at the end, and the files aren't fsynced again
+    directories = [path for path in fsynced(events) if os.path.isdir(path)]
+    assert sorted(directories) == sorted(os.path.realpath(os.path.join(destination, name)) for name in "ab")
+    assert len(fsynced(events)) == 9
+
+
+@needs_proc
+def test_dir_policy_without_atomic_batches_the_files(trees, make_sync, events):
+    source, destination = trees
+    make_tree(source, destination)
+    run(make_sync, source, destination, DURABILITY_DIRECTORY, False)
+    # every file and directory is fsynced once, after all the files are written
+    assert [event for event, path in events][-9:] == ["fsync"] * 9
+    assert sorted(os.path.basename(path) for path in fsynced(events)) == \
+        sorted(["a", "b", "old.txt"] + ["new%d.txt" % i for i in range(3)] * 2)
+
+
+@needs_proc
+def test_file_policy_fsyncs_each_file_and_its_directory(trees, make_sync, events):
+    source, destination = trees
+    make_tree(source, destination)
+    run(make_sync, source, destination, DURABILITY_FILE, True)
+    assert len(fsynced(events)) == 14
+
+
+@needs_proc
+def test_none_and_end_policies(trees, make_sync, events):
+    source, destination = trees
+    make_tree(source, destination)
+    run(make_sync, source, destination, DURABILITY_NONE, True)
+    assert fsynced(events) == []
+    assert not [event for event, path in events if event == "syncfs"]
+
+    make_tree(source, destination)
+    run(make_sync, source, destination, DURABILITY_END, False)
+    assert fsynced(events) == []
+    assert [event for event, path in events if event == "syncfs"] == ["syncfs"]
+
+
+def test_durable_writes_batches(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(timber_copy, "fsync_path", synced.append)
+    durable = DurableWrites(DURABILITY_DIRECTORY, batch_size=3)
+    paths = [write_file(tmp_path, "d%d/f%d" % (i % 2, i)) for i in range(4)]
+    for path in paths[:2]:
+        durable.file_written(path)
+    assert synced == []
+    durable.file_written(paths[2])
+    assert synced == paths[:3] + sorted(set(os.path.dirname(path) for path in paths[:3]))
+
+    del synced[:]
+    durable.atomic = True
+    assert durable.sync_each_file
+    durable.file_written(paths[3])
+    durable.finish(str(tmp_path))
+    assert synced == [os.path.dirname(paths[3])]
+
+
+def test_failed_atomic_update_keeps_the_old_copy(trees, make_sync, monkeypatch):
+    source, destination = trees
+    write_file(destination, "file.txt", "old contents", mtime=1000000000)
+    write_file(source, "file.txt", "new contents", mtime=1100000000)
+    sync = make_sync()
+    sync.atomic_writes = True
+
+    def broken_copy(source_file, destination_file, *args, **kwargs):
+        with open(destination_file, "wb") as f:
+            f.write(b"new")
+        raise PermissionError("denied")
+
+    monkeypatch.setattr(sync.copy_backend, "copy", broken_copy)
+    sync.sync(source, destination, "", False)
+    assert sync.counts["updated"] == 0
+    assert read_file(destination, "file.txt") == b"old contents"
@@ -0,0 +1,142 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for the gitignore style exclude rules.
+
+import posixpath
+import re
+
+import pytest
+
+from timber_exclude import ExcludeMatcher, compile_excludes, glob_to_regex
+
+
+def matcher(*rules):
+    result = ExcludeMatcher()
+    for rule in rules:
+        result.add_rule(rule)
+    result.compile()
+    return result
+
+
+def excluded(rules, rel_path, is_dir=False):
+    return rules.excluded(posixpath.basename(rel_path), rel_path, is_dir)
+
+
+def test_names_match_at_any_depth():
+    rules = matcher("node_modules", "Thumbs.db")
+    assert excluded(rules, "node_modules", True)
+    assert excluded(rules, "a/b/node_modules", True)
+    assert excluded(rules, "photos/Thumbs.db")
+    assert not excluded(rules, "photos/Thumbs.db.bak")
+    assert not excluded(rules, "thumbs.db")
+
+
+def test_rules_with_a_slash_are_anchored_to_the_root():
+    rules = matcher("build/output", "/cache")
+    assert excluded(rules, "build/output", True)
+    assert not excluded(rules, "src/build/output", True)
+    assert excluded(rules, "cache", True)
+    assert not excluded(rules, "src/cache", True)
+
+
+def test_trailing_slash_only_matches_directories():
+    rules = matcher("logs/")
+    assert excluded(rules, "logs", True)
+    assert excluded(rules, "app/logs", True)
+    assert not excluded(rules, "logs")
+    assert not rules.has_file_rules
+
+
+def test_negation_includes_again_and_the_last_rule_decides():
+    rules = matcher("*.log", "!keep.log")
+    assert excluded(rules, "debug.log")
+    assert not excluded(rules, "keep.log")
+    assert not excluded(rules, "dir/keep.log")
+
+    # the same rules the other way around: the exclude comes last, so it wins
+    rules = matcher("!keep.log", "*.log")
+    assert excluded(rules, "keep.log")
+
+    # a later exclude of the exact path overrides an earlier include
+    rules = matcher("*.log", "!*.log", "dir/keep.log")
+    assert not excluded(rules, "keep.log")
+    assert excluded(rules, "dir/keep.log")
+
+
+def test_negated_literal_overrides_a_path_glob():
+    rules = matcher("docs/**", "!docs/readme.md")
+    assert excluded(rules, "docs/a/b.md")
+    assert not excluded(rules, "docs/readme.md")
+
+
+def test_endings_are_found_from_every_dot():
+    rules = matcher("*.gz", "*.tar.gz", "!*.keep.gz")
+    assert excluded(rules, "a.gz")
+    assert excluded(rules, "archive.tar.gz")
+    assert excluded(rules, "dir/.gz")
+    assert not excluded(rules, "a.keep.gz")
+    assert not excluded(rules, "gz")
+    assert not excluded(rules, "a.gzip")
+
+
+def test_star_does_not_cross_directories_and_double_star_does():
+    rules = matcher("src/*.tmp", "**/generated", "data/**/raw")
+    assert excluded(rules, "src/a.tmp")
+    assert not excluded(rules, "src/sub/a.tmp")
+    assert excluded(rules, "generated", True)
+    assert excluded(rules, "x/y/generated", True)
+    assert excluded(rules, "data/raw", True)
+    assert excluded(rules, "data/2024/01/raw", True)
+    assert not excluded(rules, "other/raw", True)
+
+
+def test_path_globs_under_a_glob_directory():
+    rules = matcher("*/cache/*.bin")
+    assert excluded(rules, "app/cache/x.bin")
+    assert not excluded(rules, "app/sub/cache/x.bin")
+
+
+def test_character_classes_and_question_marks():
+    rules = matcher("file?.txt", "[!a]*.dat", "report[0-9].csv")
+    assert excluded(rules, "file1.txt")
+    assert not excluded(rules, "file10.txt")
+    assert excluded(rules, "b.dat")
+    assert not excluded(rules, "a.dat")
+    assert excluded(rules, "report7.csv")
+    assert not excluded(rules, "reportX.csv")
+
+
+@pytest.mark.parametrize("pattern, text, matches", [
+    ("a/**", "a/b/c", True),
+    ("**/b", "b", True),
+    ("a/**/b", "a/b", True),
+    ("[abc", "[abc", True),
+    ("a.b", "axb", False),
+])
+def test_glob_to_regex(pattern, text, matches):
+    assert bool(re.fullmatch(glob_to_regex(pattern), text)) == matches
+
+
+def test_comments_blank_lines_and_rules_file(tmp_path):
+    rules_file = tmp_path / "rules.txt"
+    rules_file.write_text("# a comment\n\n*.bak  \n!important.bak\n", encoding="utf-8")
+    rules = compile_excludes("Temp,a/b", ["*.swp"], str(rules_file))
+    assert excluded(rules, "x.bak")
+    assert not excluded(rules, "important.bak")
+    assert excluded(rules, "x.swp")
+    assert excluded(rules, "Temp", True)
+    assert excluded(rules, "a/b", True)
+    assert excluded(rules, "$RECYCLE.BIN", True)
+    assert not excluded(rules, "# a comment")
+
+
+def test_ignored_directories_are_never_globs():
+    rules = compile_excludes("dir[1]")
+    assert excluded(rules, "dir[1]", True)
+    assert not excluded(rules, "dir1", True)
+
+
+def test_rules_added_after_compiling_are_used():
+    rules = matcher("*.tmp")
+    rules.add_rule("*.old")
+    assert excluded(rules, "a.old")
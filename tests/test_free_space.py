@@ -0,0 +1,82 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for checking that a sync fits on the destination before it copies anything.
+
+import collections
+import os
+import shutil
+
+import pytest
+
+from conftest import write_file
+
+DiskUsage = collections.namedtuple("DiskUsage", "total used free")
+
+
+@pytest.fixture
+def free_space(monkeypatch):
+    # Sets the free space the destination reports, past the reserve that is always kept free.
+    pytest.importorskip("tqdm")
+    from timber_sync import FREE_SPACE_RESERVE
+
+    def set_free(free):
+        monkeypatch.setattr(shutil, "disk_usage", lambda path: DiskUsage(0, 0, FREE_SPACE_RESERVE + free))
+    return set_free
+
+
+def test_sync_that_doesnt_fit_exits_before_copying(trees, make_sync, free_space, logger):
+    source, destination = trees
+    for i in range(3):
+        write_file(source, "%d.txt" % i)
+    free_space(2 * 4096)
+    with pytest.raises(SystemExit):
+        make_sync().sync(source, destination, "", False)
+    assert os.listdir(destination) == []
+    assert any(line.startswith("Not enough free space") for line in logger.lines)
+
+
+def test_updates_only_need_the_space_they_grow_by(trees, make_sync, free_space):
+    source, destination = trees
+    for i in range(3):
+        write_file(destination, "%d.txt" % i, "old")
+        write_file(source, "%d.txt" % i, "new version", mtime=1100000000)
+    write_file(source, "new.txt")
+    free_space(4096)
+    sync = make_sync()
+    sync.sync(source, destination, "", False)
+    assert (sync.counts["copied"], sync.counts["updated"]) == (1, 3)
+
+
+def make_room_trees(trees):
+    source, destination = trees
+    write_file(source, "a.txt")
+    write_file(source, "b.txt")
+    write_file(destination, "orphan.txt")
+    write_file(destination, "old/1.txt")
+    return source, destination
+
+
+def test_deletions_are_done_first_to_make_room(trees, make_sync, free_space, logger):
+    source, destination = make_room_trees(trees)
+    free_space(4096)
+    make_sync().sync(source, destination, "", True)
+    assert sorted(os.listdir(destination)) == ["a.txt", "b.txt"]
+    assert any("Deleting files before copying to make room" in line for line in logger.lines)
+
+
+def test_room_isnt_made_without_delete(trees, make_sync, free_space):
+    source, destination = make_room_trees(trees)
+    free_space(4096)
+    with pytest.raises(SystemExit):
+        make_sync().sync(source, destination, "", False)
+    assert sorted(os.listdir(destination)) == ["old", "orphan.txt"]
+
+
+def test_space_check_can_be_turned_off(trees, make_sync, free_space):
+    source, destination = trees
+    write_file(source, "a.txt")
+    free_space(0)
+    sync = make_sync()
+    sync.space_check = False
+    sync.sync(source, destination, "", False)
+    assert sync.counts["copied"] == 1
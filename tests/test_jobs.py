@@ -0,0 +1,146 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for running several syncs from a job file with shared copy budgets.
+
+import json
+import threading
+
+import pytest
+
+from conftest import write_file, read_file
+from timber_copy import CopyBudget
+from timber_jobs import TimberJobs, JobLogger, JobCopyBudget, job_arguments
+
+
+def write_job_file(tmp_path, job_file):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps(job_file), encoding="utf-8")
+    return str(path)
+
+
+def test_job_arguments():
+    options = {"source": "/a", "destination": "/b", "delete": True, "verify": False, "exclude": ["*.tmp", "*.bak"],
+               "jobs": 4, "exclude_from": None}
+    assert job_arguments(options) == ["--source", "/a", "--destination", "/b", "--delete", "--exclude", "*.tmp",
+                                      "--exclude", "*.bak", "--jobs", "4"]
+
+
+def test_job_logger_prefixes_lines(logger):
+    job_logger = JobLogger(logger, "photos")
+    job_logger.log("Copied %d files", 3)
+    job_logger.log("100% done")
+    assert logger.lines == ["[photos] Copied 3 files", "[photos] 100% done"]
+    assert job_logger.path == logger.path
+
+
+def test_load(logger, tmp_path):
+    path = write_job_file(tmp_path, {"parallel": 2, "max_copies": 8, "device_in_flight_mb": 10,
+                                     "jobs": [{"name": "photos", "source": "/a", "destination": "/b"},
+                                              {"source": "/c", "destination": "/d", "delete": True}]})
+    runner = TimberJobs(logger)
+    jobs = runner.load(path)
+    assert jobs == [("photos", {"source": "/a", "destination": "/b"}),
+                    ("job 2", {"source": "/c", "destination": "/d", "delete": True})]
+    assert (runner.parallel, runner.max_copies, runner.device_in_flight_bytes) == (2, 8, 10000000)
+
+
+@pytest.mark.parametrize("job_file", [
+    {"jobs": []},
+    {"parallel": 2},
+    {"jobs": [{"source": "/a", "destination": "/b", "log_dir": "/logs"}]},
+    {"parallel": "many", "jobs": [{"source": "/a", "destination": "/b"}]},
+    {"jobs": ["/a"]},
+])
+def test_load_rejects_invalid_job_files(logger, tmp_path, job_file):
+    with pytest.raises(SystemExit):
+        TimberJobs(logger).load(write_job_file(tmp_path, job_file))
+
+
+def test_load_rejects_invalid_json(logger, tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        TimberJobs(logger).load(str(path))
+
+
+def test_add_rejects_two_jobs_with_one_destination(logger, tmp_path):
+    runner = TimberJobs(logger)
+    runner.add("a", None, "/a", str(tmp_path / "out"), "", False)
+    with pytest.raises(SystemExit):
+        runner.add("b", None, "/b", str(tmp_path / "x" / ".." / "out"), "", False)
+
+
+def test_copy_budget_always_admits_one_file():
+    budget = CopyBudget(max_bytes=10, max_files=2)
+    budget.acquire(100)
+    assert (budget.files_in_flight, budget.bytes_in_flight) == (1, 100)
+    budget.release(100)
+    assert (budget.files_in_flight, budget.bytes_in_flight) == (0, 0)
+
+
+def test_job_copy_budget_waits_for_every_budget():
+    device = CopyBudget(max_bytes=1000, max_files=1)
+    shared = CopyBudget(max_bytes=1000, max_files=10)
+    first = JobCopyBudget([device, shared])
+    second = JobCopyBudget([device, shared])
+    first.acquire(10)
+    assert (device.files_in_flight, shared.files_in_flight) == (1, 1)
+
+    acquired = threading.Event()
+
+    def copy():
+        second.acquire(10)
+        acquired.set()
+    thread = threading.Thread(target=copy)
+    thread.start()
+    # the device only copies one file at a time, so the second job waits without holding the shared budget
+    assert not acquired.wait(0.2)
+    assert shared.files_in_flight == 1
+    first.release(10)
+    assert acquired.wait(5)
+    thread.join()
+    assert (device.files_in_flight, shared.files_in_flight) == (1, 1)
+    second.release(10)
+    assert (device.bytes_in_flight, shared.bytes_in_flight) == (0, 0)
+
+
+def test_jobs_on_one_device_share_its_budget(logger, tmp_path):
+    runner = TimberJobs(logger)
+
+    class Sync:
+        copy_budget = None
+    for name in ("a", "b"):
+        runner.add(name, Sync(), str(tmp_path), str(tmp_path / name), "", False)
+    assert runner.set_budgets() == 1
+    first, second = (job["sync"].copy_budget.budgets for job in runner.jobs)
+    assert len(first) == 2
+    assert first[0] is second[0] and first[1] is second[1]
+
+
+def test_run_jobs(logger, tmp_path):
+    pytest.importorskip("tqdm")
+    from timber_sync import TimberSync
+    runner = TimberJobs(logger)
+    runner.parallel = 2
+    runner.metrics_out = str(tmp_path / "metrics.json")
+    for name in ("photos", "music"):
+        source = tmp_path / name
+        for i in range(3):
+            write_file(source, "%s/%d.txt" % (name, i), "%s %d" % (name, i))
+        runner.add(name, TimberSync(JobLogger(logger, name)), str(source), str(tmp_path / "backup" / name), "",
+                   False)
+    runner.add("missing", TimberSync(JobLogger(logger, "missing")), str(tmp_path / "missing"),
+               str(tmp_path / "backup" / "missing"), "", False)
+
+    assert runner.run() is False
+    assert [job["status"] for job in runner.jobs] == ["complete", "complete", "failed"]
+    assert read_file(tmp_path / "backup" / "music", "music/2.txt") == b"music 2"
+    assert any(line.startswith("[photos] ") for line in logger.lines)
+    summary = [line for line in logger.lines if line.startswith("All jobs finished")][0]
+    assert "2 of 3 jobs complete | 6 files copied" in summary
+
+    with open(runner.metrics_out, encoding="utf-8") as f:
+        report = json.load(f)
+    assert [job["name"] for job in report["jobs"]] == ["photos", "music", "missing"]
+    assert report["copy"]["files"] == 6
+    assert report["limits"]["parallel"] == 2
@@ -0,0 +1,76 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for the background logger and its per-run log files.
+
+import glob
+import os
+import time
+
+import timber_logger
+from timber_logger import TimberLogger
+
+
+def contents(logger):
+    with open(logger.path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_lines_are_written_once_the_log_is_idle(tmp_path, monkeypatch):
+    monkeypatch.setattr(timber_logger, "FLUSH_INTERVAL", 0.1)
+    logger = TimberLogger(str(tmp_path))
+    try:
+        logger.log("the last line before a long copy")
+        deadline = time.monotonic() + 5
+        while "the last line" not in contents(logger) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert "the last line before a long copy" in contents(logger)
+    finally:
+        logger.close_log()
+
+
+def test_lines_are_batched_until_the_log_is_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(timber_logger, "FLUSH_INTERVAL", 60)
+    logger = TimberLogger(str(tmp_path))
+    logger.log("line %d of %s", 1, "many")
+    logger.detail("a file")
+    time.sleep(0.2)
+    assert "line 1 of many" not in contents(logger)
+    logger.close_log()
+    assert "line 1 of many" in contents(logger)
+    assert "a file" in contents(logger)
+
+    # closing twice is safe
+    logger.close_log()
+
+
+def test_quiet_logs_leave_out_file_details(tmp_path):
+    logger = TimberLogger(str(tmp_path), verbose=False)
+    logger.detail("Copying %s", "a file")
+    logger.log("Sync complete.")
+    logger.close_log()
+    assert "a file" not in contents(logger)
+    assert "Sync complete." in contents(logger)
+
+
+def test_only_the_newest_run_logs_are_kept(tmp_path):
+    for i in range(5):
+        path = tmp_path / ("timber_2020010%d_000000.log" % i)
+        path.write_text("old run %d\n" % i)
+        os.utime(str(path), (1000000000 + i, 1000000000 + i))
+    (tmp_path / "other.log").write_text("not a run log\n")
+
+    logger = TimberLogger(str(tmp_path), keep_logs=3)
+    logger.close_log()
+    logs = sorted(os.path.basename(path) for path in glob.glob(str(tmp_path / "timber_*.log")))
+    assert len(logs) == 3
+    assert "timber_20200104_000000.log" in logs and "timber_20200103_000000.log" in logs
+    assert os.path.basename(logger.path) in logs
+    assert (tmp_path / "other.log").exists()
+
+
+def test_runs_in_the_same_second_get_their_own_logs(tmp_path):
+    first = TimberLogger(str(tmp_path))
+    second = TimberLogger(str(tmp_path))
+    assert first.path != second.path
+    first.close_log()
+    second.close_log()
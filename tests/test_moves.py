@@ -0,0 +1,103 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for finding files moved in the source and renaming them in the destination.
+
+import os
+
+import pytest
+
+from conftest import ListLogger, write_file, read_file
+from timber_copy import new_hasher, CopyBackend
+from timber_diff import TimberDiff, MOVE_MIN_SIZE
+from timber_scanner import TimberScanner
+
+SIZE = MOVE_MIN_SIZE
+
+
+def find_moves(source, destination, hash_moves=False):
+    logger = ListLogger()
+    diff = TimberDiff(TimberScanner(logger), logger)
+    diff.diff(source, destination, [])
+    hash_file = (lambda path: CopyBackend().hash_file(path, new_hasher())) if hash_moves else None
+    return [(orphan, record.rel_path) for orphan, record in diff.find_moves(source, destination,
+                                                                            hash_file=hash_file)], diff
+
+
+def test_renamed_file_keeps_its_time_and_is_matched(trees):
+    source, destination = trees
+    write_file(source, "new/name.bin", b"a" * SIZE, mtime=1500000000)
+    write_file(destination, "old/name.bin", b"a" * SIZE, mtime=1500000000)
+    moves, diff = find_moves(source, destination)
+    assert moves == [(os.path.join("old", "name.bin"), os.path.join("new", "name.bin"))]
+    assert diff.new_files == [] and diff.orphaned_files == []
+
+
+def test_older_file_of_the_same_size_is_not_matched(trees):
+    # The orphan is newer than the new file. A rename would have kept the time, so they are different files, and
+    # renaming the orphan would leave a destination file that later syncs think is up to date.
+    source, destination = trees
+    write_file(source, "report.bin", b"a" * SIZE, mtime=1500000000)
+    write_file(destination, "unrelated.bin", b"b" * SIZE, mtime=1600000000)
+    moves, diff = find_moves(source, destination)
+    assert moves == []
+    assert [record.rel_path for record in diff.new_files] == ["report.bin"]
+    assert diff.orphaned_files == ["unrelated.bin"]
+
+
+def test_coarse_timestamps_still_match(trees):
+    source, destination = trees
+    write_file(source, "b.bin", b"a" * SIZE, mtime=1500000001)
+    write_file(destination, "a.bin", b"a" * SIZE, mtime=1500000000)
+    moves, diff = find_moves(source, destination)
+    assert moves == [("a.bin", "b.bin")]
+
+
+def test_small_files_and_ambiguous_matches_are_copied(trees):
+    source, destination = trees
+    write_file(source, "small_new.txt", "same", mtime=1500000000)
+    write_file(destination, "small_old.txt", "same", mtime=1500000000)
+    write_file(source, "one.bin", b"a" * SIZE, mtime=1500000000)
+    write_file(source, "two.bin", b"b" * SIZE, mtime=1500000000)
+    write_file(destination, "three.bin", b"a" * SIZE, mtime=1500000000)
+    moves, diff = find_moves(source, destination)
+    assert moves == []
+
+
+def test_hashes_tell_files_of_the_same_size_apart(trees):
+    source, destination = trees
+    write_file(source, "one.bin", b"a" * SIZE, mtime=1500000000)
+    write_file(source, "two.bin", b"b" * SIZE, mtime=1500000000)
+    write_file(destination, "old_two.bin", b"b" * SIZE, mtime=1600000000)
+    write_file(destination, "old_unrelated.bin", b"c" * SIZE, mtime=1500000000)
+    moves, diff = find_moves(source, destination, hash_moves=True)
+    assert moves == [("old_two.bin", "two.bin")]
+
+
+@pytest.mark.parametrize("use_manifest, hash_moves, moved", [
+    (True, False, 1),
+    (False, True, 1),
+    # Timber copied the file as a new file, so it doesn't have the source's time and can't be told from another
+    # file of the same size without hashing. It is copied again instead.
+    (False, False, 0),
+])
+def test_sync_renames_moved_files(trees, make_sync, use_manifest, hash_moves, moved):
+    source, destination = trees
+    write_file(source, "a/big.bin", b"a" * SIZE, mtime=1500000000)
+    write_file(source, "keep.txt", "keep")
+    sync = make_sync()
+    sync.use_manifest = use_manifest
+    sync.sync(source, destination, "", True)
+
+    # the file is moved in the source, and a same sized file that isn't a copy of it is added
+    os.renames(os.path.join(source, "a", "big.bin"), os.path.join(source, "b", "big.bin"))
+    write_file(source, "other.bin", b"z" * SIZE, mtime=1400000000)
+    sync = make_sync()
+    sync.use_manifest = use_manifest
+    sync.detect_moves = True
+    sync.hash_moves = hash_moves
+    sync.sync(source, destination, "", True)
+    assert sync.counts["moved"] == moved
+    assert sync.counts["copied"] == 2 - moved
+    assert read_file(destination, "b/big.bin") == b"a" * SIZE
+    assert read_file(destination, "other.bin") == b"z" * SIZE
+    assert not os.path.exists(os.path.join(destination, "a"))
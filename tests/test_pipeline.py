@@ -0,0 +1,74 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for pipelined syncs, which copy files while the trees are still being compared.
+
+import os
+
+import pytest
+
+from conftest import write_file, read_file
+from timber_diff import MOVE_MIN_SIZE
+
+
+def tree_contents(root):
+    contents = {}
+    for directory, dirs, files in os.walk(root):
+        for name in files:
+            if not name.startswith(".timber"):
+                path = os.path.join(directory, name)
+                contents[os.path.relpath(path, root)] = read_file(root, path)
+    return contents
+
+
+def sync(make_sync, source, destination, delete, jobs=1, **settings):
+    timber = make_sync()
+    timber.pipeline = True
+    timber.jobs = jobs
+    for name, value in settings.items():
+        setattr(timber, name, value)
+    timber.sync(source, destination, "", delete)
+    return timber
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_pipelined_sync_matches_the_source(trees, make_sync, jobs):
+    source, destination = trees
+    for i in range(30):
+        write_file(source, "d%d/e%d/f%d.txt" % (i % 3, i % 5, i), "file %d" % i)
+    write_file(destination, "d0/old.txt", "orphan")
+    write_file(destination, "gone/old.txt", "orphan")
+    write_file(destination, "d1/e1/f1.txt", "stale", mtime=1)
+    timber = sync(make_sync, source, destination, True, jobs)
+    assert timber.counts["copied"] == 29
+    assert timber.counts["updated"] == 1
+    assert tree_contents(destination) == tree_contents(source)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_pipelined_sync_detects_moves(trees, make_sync, jobs):
+    source, destination = trees
+    big = b"m" * MOVE_MIN_SIZE
+    write_file(source, "old/big.bin", big, mtime=1500000000)
+    for i in range(10):
+        write_file(source, "small/f%d.txt" % i, "small %d" % i)
+    sync(make_sync, source, destination, True, jobs, use_manifest=True)
+
+    os.renames(os.path.join(source, "old", "big.bin"), os.path.join(source, "new", "deeper", "big.bin"))
+    write_file(source, "other.bin", b"o" * MOVE_MIN_SIZE, mtime=1400000000)
+    write_file(source, "small/f10.txt", "small 10")
+    timber = sync(make_sync, source, destination, True, jobs, use_manifest=True, detect_moves=True)
+    assert timber.counts["moved"] == 1
+    assert timber.counts["copied"] == 2
+    assert tree_contents(destination) == tree_contents(source)
+
+
+def test_pipelined_sync_detects_moves_without_a_manifest(trees, make_sync):
+    source, destination = trees
+    write_file(source, "old/big.bin", b"m" * MOVE_MIN_SIZE, mtime=1500000000)
+    sync(make_sync, source, destination, True)
+
+    os.renames(os.path.join(source, "old", "big.bin"), os.path.join(source, "new", "big.bin"))
+    timber = sync(make_sync, source, destination, True, 2, detect_moves=True, hash_moves=True)
+    assert timber.counts["moved"] == 1
+    assert timber.counts["copied"] == 0
+    assert tree_contents(destination) == tree_contents(source)
@@ -0,0 +1,118 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for the sync plan's spilling and its JSON lines save and load.
+
+import json
+
+import pytest
+
+from timber_plan import PlanColumns, SyncPlan
+
+
+def test_columns_keep_order_across_spills():
+    columns = PlanColumns(spill_threshold=3)
+    for i in range(8):
+        columns.append(i % 2, "file_%d" % i, i * 10, i * 100, i % 2)
+
+    # 6 entries were spilled in two batches, and 2 are still in memory
+    assert columns.spill_file is not None
+    assert columns.spilled_count == 6
+    assert len(columns) == 8
+    assert len(columns.done) == 8
+    assert list(columns) == [(i, i % 2, "file_%d" % i, i * 10, i * 100, i % 2) for i in range(8)]
+
+    # iterating twice reads the spilled entries again from the start
+    assert len(list(columns)) == 8
+    columns.close()
+
+
+def test_columns_spill_names_that_are_not_utf8():
+    columns = PlanColumns(spill_threshold=1)
+    name = b"caf\xe9.txt".decode("utf-8", "surrogateescape")
+    columns.append(0, name)
+    columns.append(0, "plain.txt")
+    assert [entry[2] for entry in columns] == [name, "plain.txt"]
+    columns.close()
+
+
+def make_plan(spill_threshold):
+    plan = SyncPlan("/src", "/dst", spill_threshold=spill_threshold)
+    plan.delete_preference = True
+    plan.add_move("old/a.bin", "new/a.bin", 5000000, 111)
+    plan.add_copy("top.txt", 10, 1000, False)
+    plan.add_copy("dir/one.txt", 20, 2000, True)
+    plan.add_copy("dir/two.txt", 30, 3000, False)
+    plan.add_copy("dir/sub/three.txt", 40, 4000, True)
+    plan.add_deletion("dir/stale.txt")
+    plan.add_deletion("gone.txt")
+    plan.add_dir_deletion("empty/inner")
+    plan.add_dir_deletion("empty")
+    plan.add_subtree_deletion("orphaned_tree")
+    return plan
+
+
+@pytest.mark.parametrize("spill_threshold", [2, 1000])
+def test_save_and_load_round_trip(tmp_path, spill_threshold):
+    plan = make_plan(spill_threshold)
+    path = str(tmp_path / "plan.jsonl")
+    plan.save(path)
+
+    loaded = SyncPlan(spill_threshold=spill_threshold)
+    loaded.load(path)
+    assert (loaded.source, loaded.destination, loaded.delete_preference) == ("/src", "/dst", True)
+    assert loaded.moves == [("old/a.bin", "new/a.bin", 5000000, 111)]
+    assert list(loaded.iter_copy_records()) == list(plan.iter_copy_records())
+    assert list(loaded.iter_deletions()) == list(plan.iter_deletions())
+    assert loaded.dirs_to_delete == ["empty/inner", "empty"]
+    assert loaded.subtrees_to_delete == ["orphaned_tree"]
+    assert loaded.copy_size == 100
+    assert not any(loaded.copies.done)
+    plan.close()
+    loaded.close()
+
+
+def test_deletions_are_only_saved_with_the_delete_preference(tmp_path):
+    plan = make_plan(1000)
+    plan.delete_preference = False
+    path = str(tmp_path / "plan.jsonl")
+    plan.save(path)
+
+    loaded = SyncPlan()
+    loaded.load(path)
+    assert len(loaded.copies) == 4
+    assert len(loaded.deletions) == 0
+    assert loaded.dirs_to_delete == []
+    assert loaded.subtrees_to_delete == []
+
+
+def test_load_reads_journal_progress(tmp_path):
+    plan = make_plan(2)
+    path = str(tmp_path / "plan.jsonl")
+    plan.save(path)
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in (["moved", 0], ["copied", 0], ["partial", 1, 4096, 2000], ["partial", 2, 8192, 3000],
+                      ["copied", 2], ["deleted", 1], ["deleted_tree", 0]):
+            f.write(json.dumps(entry) + "\n")
+        # the last line of an interrupted journal is cut off, and is ignored
+        f.write('["copied", 3')
+
+    loaded = SyncPlan(spill_threshold=2)
+    loaded.load(path)
+    assert list(loaded.moves_done) == [1]
+    assert list(loaded.copies.done) == [1, 0, 1, 0]
+    assert loaded.partial == {1: (4096, 2000)}
+    assert list(loaded.deletions.done) == [0, 1]
+    assert list(loaded.subtrees_done) == [1]
+    loaded.close()
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "not_a_plan.jsonl"
+    path.write_text('{"something": 1}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        SyncPlan().load(str(path))
+
+    path.write_text('{"timber_plan": 1, "source": "a", "destination": "b", "delete": false}\n["copy", "x"]\n',
+                    encoding="utf-8")
+    with pytest.raises(ValueError):
+        SyncPlan().load(str(path))
@@ -0,0 +1,172 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for journaled syncs that are interrupted and resumed.
+
+import os
+import random
+
+import pytest
+
+from conftest import write_file, read_file
+
+PIECE = 1024 * 1024
+
+
+class Interrupted(BaseException):
+    # Stands in for the sync being killed. It isn't an Exception, so nothing in the sync catches it.
+    pass
+
+
+def tree_contents(root):
+    contents = {}
+    for directory, dirs, files in os.walk(root):
+        for name in files:
+            if not name.startswith(".timber"):
+                path = os.path.join(directory, name)
+                contents[os.path.relpath(path, root)] = read_file(root, path)
+    return contents
+
+
+def interrupt_after(sync, count):
+    # Makes the sync stop while copying its file number count + 1, then flushes the journal like the process
+    # exiting would.
+    real_copy_file = sync.copy_file
+    copied = []
+
+    def copy_file(source_file, destination_file, *args, **kwargs):
+        if len(copied) == count:
+            raise Interrupted()
+        copied.append(source_file)
+        return real_copy_file(source_file, destination_file, *args, **kwargs)
+
+    sync.copy_file = copy_file
+    return copied
+
+
+def test_resume_finishes_an_interrupted_sync(trees, make_sync):
+    source, destination = trees
+    for i in range(10):
+        write_file(source, "d%d/f%d.txt" % (i % 3, i), "file %d" % i)
+    write_file(destination, "orphan.txt", "orphan")
+    sync = make_sync()
+    interrupt_after(sync, 4)
+    with pytest.raises(Interrupted):
+        sync.sync(source, destination, "", True)
+    sync.journal.close()
+    assert sync.journal.exists(destination)
+
+    sync = make_sync()
+    sync.resume = True
+    copied = interrupt_after(sync, 100)
+    sync.sync(source, destination, "", False)
+    # only the files that weren't copied before are copied, and deletions come from the journal's plan
+    assert len(copied) == 6
+    assert sync.counts["deleted"] == 1
+    assert tree_contents(destination) == tree_contents(source)
+    assert not sync.journal.exists(destination)
+
+
+def test_resume_without_a_journal_runs_a_full_sync(trees, make_sync, logger):
+    source, destination = trees
+    write_file(source, "a.txt")
+    sync = make_sync()
+    sync.resume = True
+    sync.sync(source, destination, "", False)
+    assert sync.counts["copied"] == 1
+    assert any("no interrupted sync to resume" in line for line in logger.lines)
+
+
+def test_journal_from_another_source_is_refused(trees, make_sync, tmp_path):
+    source, destination = trees
+    write_file(source, "a.txt")
+    write_file(source, "b.txt")
+    sync = make_sync()
+    interrupt_after(sync, 1)
+    with pytest.raises(Interrupted):
+        sync.sync(source, destination, "", False)
+    sync.journal.close()
+
+    other = tmp_path / "other"
+    other.mkdir()
+    sync = make_sync()
+    sync.resume = True
+    with pytest.raises(SystemExit):
+        sync.sync(str(other), destination, "", False)
+
+
+@pytest.fixture
+def large_file_sync(trees, make_sync, monkeypatch):
+    # Makes a large file copy in 1 MB pieces, and stops it after the second piece is recorded.
+    import timber_sync
+    monkeypatch.setattr(timber_sync, "RESUMABLE_MIN_SIZE", PIECE)
+    source, destination = trees
+    data = random.Random(1).randbytes(5 * PIECE + 123)
+    write_file(source, "big.bin", data, mtime=1500000000)
+
+    def make(stop_after=None):
+        sync = make_sync()
+        real_copy_resumable = sync.copy_backend.copy_resumable
+        offsets = []
+
+        def copy_resumable(source_file, destination_file, offset=0, checkpoint=None, *args, **kwargs):
+            offsets.append(offset)
+
+            def record(n):
+                checkpoint(n)
+                if stop_after is not None and n >= stop_after:
+                    raise Interrupted()
+            kwargs["checkpoint_size"] = PIECE
+            return real_copy_resumable(source_file, destination_file, offset, record, *args, **kwargs)
+
+        sync.copy_backend.copy_resumable = copy_resumable
+        return sync, offsets
+    return source, destination, data, make
+
+
+@pytest.mark.parametrize("policy", ["none", "file"])
+def test_large_copy_resumes_from_its_last_piece(large_file_sync, policy):
+    source, destination, data, make = large_file_sync
+    sync, offsets = make(stop_after=2 * PIECE)
+    sync.durable_writes.policy = policy
+    with pytest.raises(Interrupted):
+        sync.sync(source, destination, "", False)
+    sync.journal.close()
+
+    sync, offsets = make()
+    sync.resume = True
+    sync.sync(source, destination, "", False)
+    assert offsets == [2 * PIECE]
+    assert read_file(destination, "big.bin") == data
+
+
+def test_large_copy_starts_over_if_the_source_changed(large_file_sync):
+    source, destination, data, make = large_file_sync
+    sync, offsets = make(stop_after=2 * PIECE)
+    with pytest.raises(Interrupted):
+        sync.sync(source, destination, "", False)
+    sync.journal.close()
+
+    # the same size, but a new modification time
+    data = data[:-1] + b"!"
+    write_file(source, "big.bin", data, mtime=1600000000)
+    sync, offsets = make()
+    sync.resume = True
+    sync.sync(source, destination, "", False)
+    assert offsets == [0]
+    assert read_file(destination, "big.bin") == data
+
+
+def test_large_copy_with_verify_hashes_the_whole_file(large_file_sync):
+    source, destination, data, make = large_file_sync
+    sync, offsets = make(stop_after=3 * PIECE)
+    with pytest.raises(Interrupted):
+        sync.sync(source, destination, "", False)
+    sync.journal.close()
+
+    sync, offsets = make()
+    sync.resume = True
+    sync.verify = True
+    sync.sync(source, destination, "", False)
+    assert offsets == [3 * PIECE]
+    assert sync.counts["copied"] == 1
+    assert read_file(destination, "big.bin") == data
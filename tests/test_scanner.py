@@ -0,0 +1,130 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for scanning trees, with directories listed one at a time or in parallel.
+
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from conftest import write_file
+from timber_exclude import compile_excludes
+from timber_scanner import TimberScanner
+
+
+def fake_tree(depth, width):
+    # children of each node of a synthetic tree, keyed by its path
+    children = {}
+    pending = [""]
+    while pending:
+        node = pending.pop()
+        level = node.count("/") + 1 if node else 0
+        children[node] = ["%s/%d" % (node, i) if node else str(i) for i in range(width)] if level < depth else []
+        pending.extend(children[node])
+    return children
+
+
+def expected_order(children):
+    order = []
+    pending = [""]
+    while pending:
+        node = pending.pop()
+        order.append(node)
+        pending.extend(reversed(children[node]))
+    return order
+
+
+@pytest.mark.parametrize("method", ["walk_tree", "iter_tree"])
+@pytest.mark.parametrize("jobs", [1, 2, 8])
+def test_results_come_back_in_depth_first_order(logger, method, jobs):
+    children = fake_tree(3, 4)
+    rng = random.Random(jobs)
+    delays = dict((node, rng.random() * 0.002) for node in children)
+    running = [0, 0]
+    lock = threading.Lock()
+
+    def visit(node):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        # random delays make the directories finish out of order
+        time.sleep(delays[node])
+        with lock:
+            running[0] -= 1
+        return node, children[node]
+
+    scanner = TimberScanner(logger)
+    scanner.jobs = jobs
+    assert list(getattr(scanner, method)(visit, "")) == expected_order(children)
+    assert running[1] <= jobs
+    if jobs > 1:
+        assert running[1] > 1
+
+
+def test_jobs_argument_overrides_the_scanner(logger):
+    children = fake_tree(2, 3)
+    scanner = TimberScanner(logger)
+    scanner.jobs = 8
+    threads = set()
+
+    def visit(node):
+        threads.add(threading.get_ident())
+        return node, children[node]
+
+    assert scanner.walk_tree(visit, "", jobs=1) == expected_order(children)
+    assert threads == {threading.get_ident()}
+
+
+def make_tree(root):
+    for i in range(4):
+        for j in range(3):
+            write_file(root, "d%d/e%d/f.txt" % (i, j), "x" * (i + j))
+    write_file(root, "top.txt")
+    write_file(root, "skip/inside.txt")
+    write_file(root, "d1/cache/inside.txt")
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_scan_finds_every_file_once(tmp_path, logger, jobs):
+    make_tree(tmp_path)
+    scanner = TimberScanner(logger)
+    scanner.jobs = jobs
+    files, dirs = scanner.scan(str(tmp_path), compile_excludes("skip,cache"))
+    assert sorted(files) == sorted([os.path.join("d%d" % i, "e%d" % j, "f.txt") for i in range(4) for j in range(3)]
+                                   + ["top.txt"])
+    assert files[os.path.join("d2", "e1", "f.txt")].size == 3
+    # parents come before their children
+    for index, rel_dir in enumerate(dirs):
+        assert os.path.dirname(rel_dir) in [""] + dirs[:index]
+    assert "skip" not in dirs and os.path.join("d1", "cache") not in dirs
+    # only the files are stat'ed, and each directory is listed once
+    assert scanner.stat_count == 13
+    assert scanner.list_count == 1 + 4 + 12
+
+
+def test_parallel_scan_gives_the_same_result(tmp_path, logger):
+    make_tree(tmp_path)
+    serial = TimberScanner(logger).scan(str(tmp_path), [])
+    scanner = TimberScanner(logger)
+    scanner.jobs = 4
+    assert scanner.scan(str(tmp_path), []) == serial
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symbolic links")
+def test_symbolic_links_to_directories_arent_followed(tmp_path, logger):
+    write_file(tmp_path, "real/file.txt")
+    try:
+        os.symlink(str(tmp_path / "real"), str(tmp_path / "link"))
+    except OSError:
+        pytest.skip("can't make symbolic links here")
+    files, dirs = TimberScanner(logger).scan(str(tmp_path), [])
+    assert sorted(files) == [os.path.join("real", "file.txt")]
+    assert sorted(dirs) == ["link", "real"]
+
+
+def test_missing_directory_is_logged_and_skipped(tmp_path, logger):
+    scanner = TimberScanner(logger)
+    assert scanner.list_directory(str(tmp_path / "missing")) == []
+    assert any("was not found" in line for line in logger.lines)
@@ -0,0 +1,119 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for copying small files relative to open directories.
+
+import os
+import stat
+
+import pytest
+
+from conftest import write_file, read_file
+from timber_copy import SMALL_FILE_BATCH
+
+needs_dir_fd = pytest.mark.skipif(not hasattr(os, "O_DIRECTORY") or os.open not in os.supports_dir_fd,
+                                  reason="needs directory descriptors")
+
+
+@pytest.fixture
+def small_sync(make_sync):
+    # Makes a sync with the small file path on, which counts the files it copies.
+    def make(**settings):
+        sync = make_sync()
+        sync.small_file_size = 1000
+        for key, value in settings.items():
+            setattr(sync, key, value)
+        real_copy_small_file = sync.copy_small_file
+        sync.small_copies = []
+
+        def copy_small_file(source_fd, destination_fd, source_dir, destination_dir, index, name, size, exists):
+            sync.small_copies.append(name)
+            return real_copy_small_file(source_fd, destination_fd, source_dir, destination_dir, index, name, size,
+                                        exists)
+        sync.copy_small_file = copy_small_file
+        return sync
+    return make
+
+
+def tree_contents(root):
+    contents = {}
+    for directory, dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            contents[os.path.relpath(path, root)] = read_file(root, path)
+    return contents
+
+
+@needs_dir_fd
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_small_files_are_copied_in_batches(trees, small_sync, jobs):
+    source, destination = trees
+    for i in range(SMALL_FILE_BATCH + 10):
+        write_file(source, "many/%d.txt" % i, "file %d" % i)
+    write_file(source, "a/b/c/deep.txt", "deep")
+    write_file(source, "large.bin", b"x" * 5000)
+    write_file(source, "empty.txt", "")
+    os.chmod(os.path.join(source, "a/b/c/deep.txt"), 0o640)
+
+    sync = small_sync(jobs=jobs)
+    sync.sync(source, destination, "", False)
+    assert tree_contents(destination) == tree_contents(source)
+    assert len(sync.small_copies) == SMALL_FILE_BATCH + 12
+    assert "large.bin" not in sync.small_copies
+    assert sync.counts["copied"] == SMALL_FILE_BATCH + 13
+    assert sync.counts["directories_created"] == 2
+    assert stat.S_IMODE(os.stat(os.path.join(destination, "a/b/c/deep.txt")).st_mode) == 0o640
+
+
+@needs_dir_fd
+@pytest.mark.parametrize("atomic", [False, True])
+def test_updated_small_file_gets_the_source_times_and_mode(trees, small_sync, atomic):
+    source, destination = trees
+    write_file(destination, "d/a.txt", "old", mtime=1000000000)
+    path = write_file(source, "d/a.txt", "new version", mtime=1200000000)
+    os.chmod(path, 0o600)
+
+    sync = small_sync(atomic_writes=atomic)
+    sync.sync(source, destination, "", False)
+    assert sync.small_copies == ["a.txt"]
+    assert sync.counts["updated"] == 1
+    assert read_file(destination, "d/a.txt") == b"new version"
+    st = os.stat(os.path.join(destination, "d/a.txt"))
+    assert st.st_mtime_ns == 1200000000 * 1000000000
+    assert stat.S_IMODE(st.st_mode) == 0o600
+    assert os.listdir(os.path.join(destination, "d")) == ["a.txt"]
+
+
+@needs_dir_fd
+def test_failed_small_copy_falls_back_to_copy_file(trees, small_sync, monkeypatch):
+    source, destination = trees
+    write_file(source, "a.txt", "a")
+    write_file(source, "b.txt", "b")
+    real_fchmod = os.fchmod
+    failures = []
+
+    def fchmod(fd, mode):
+        if not failures:
+            failures.append(fd)
+            raise OSError("fchmod failed")
+        return real_fchmod(fd, mode)
+    monkeypatch.setattr(os, "fchmod", fchmod)
+
+    sync = small_sync()
+    sync.sync(source, destination, "", False)
+    assert failures
+    assert sync.counts["copied"] == 2
+    assert tree_contents(destination) == tree_contents(source)
+
+
+def test_small_file_path_is_not_used_with_verify_or_delta(make_sync):
+    sync = make_sync()
+    assert not sync.small_files_supported()
+    sync.small_file_size = 1000
+    sync.verify = True
+    assert not sync.small_files_supported()
+
+    sync.delta_min_size = 100
+    assert sync.is_small_file(500, False)
+    assert not sync.is_small_file(500, True)
+    assert sync.is_small_file(50, True)
+    assert not sync.is_small_file(1000, False)
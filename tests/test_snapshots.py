@@ -0,0 +1,106 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for snapshot syncs, which link unchanged files to the previous snapshot.
+
+import os
+import time
+
+import pytest
+
+from conftest import write_file, read_file
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Gives each snapshot its own day, so they get different names.
+    days = [0]
+    real_strftime = time.strftime
+
+    def strftime(format, t=None):
+        return real_strftime(format, time.gmtime(1700000000 + days[0] * 86400))
+    monkeypatch.setattr(time, "strftime", strftime)
+    return days
+
+
+def snapshot(make_sync, source, destination):
+    sync = make_sync()
+    sync.snapshot = True
+    sync.sync(source, destination, "", False)
+    return sync
+
+
+def snapshots(destination):
+    return sorted(name for name in os.listdir(destination) if not name.startswith("."))
+
+
+def test_first_snapshot_copies_everything(trees, make_sync, clock):
+    source, destination = trees
+    write_file(source, "a.txt", "a")
+    write_file(source, "d/b.txt", "b")
+    sync = snapshot(make_sync, source, destination)
+    assert snapshots(destination) == ["2023-1114"]
+    assert read_file(destination, "2023-1114/a.txt") == b"a"
+    assert read_file(destination, "2023-1114/d/b.txt") == b"b"
+    assert sync.counts == {"copied": 2, "updated": 0, "linked": 0}
+
+
+def test_next_snapshot_links_unchanged_files(trees, make_sync, clock):
+    source, destination = trees
+    write_file(source, "same.txt", "same")
+    write_file(source, "d/changed.txt", "old")
+    write_file(source, "removed.txt", "removed")
+    snapshot(make_sync, source, destination)
+
+    clock[0] += 1
+    write_file(source, "d/changed.txt", "new version", mtime=time.time() + 100)
+    os.remove(os.path.join(source, "removed.txt"))
+    write_file(source, "added.txt", "added")
+    sync = snapshot(make_sync, source, destination)
+    old, new = snapshots(destination)
+    assert (old, new) == ("2023-1114", "2023-1115")
+    assert sync.counts == {"copied": 1, "updated": 1, "linked": 1}
+
+    assert os.path.samefile(os.path.join(destination, old, "same.txt"), os.path.join(destination, new, "same.txt"))
+    assert read_file(destination, "2023-1115/d/changed.txt") == b"new version"
+    assert read_file(destination, "2023-1115/added.txt") == b"added"
+    assert not os.path.exists(os.path.join(destination, new, "removed.txt"))
+    # the earlier snapshot is never changed
+    assert read_file(destination, "2023-1114/d/changed.txt") == b"old"
+    assert read_file(destination, "2023-1114/removed.txt") == b"removed"
+    assert not os.path.exists(os.path.join(destination, old, "added.txt"))
+
+
+def test_second_snapshot_on_the_same_day_gets_the_time(trees, make_sync, clock):
+    source, destination = trees
+    write_file(source, "a.txt", "a")
+    snapshot(make_sync, source, destination)
+    snapshot(make_sync, source, destination)
+    assert snapshots(destination) == ["2023-1114", "2023-1114_221320"]
+    assert os.path.samefile(os.path.join(destination, "2023-1114/a.txt"),
+                            os.path.join(destination, "2023-1114_221320/a.txt"))
+
+
+def test_incomplete_snapshot_is_not_used_as_a_base(trees, make_sync, clock):
+    source, destination = trees
+    write_file(source, "a.txt", "a")
+    write_file(destination, "2023-1113.incomplete/a.txt", "partial", mtime=time.time() + 100)
+    sync = snapshot(make_sync, source, destination)
+    assert sync.counts["copied"] == 1
+    assert read_file(destination, "2023-1114/a.txt") == b"a"
+
+
+def test_unlinkable_file_is_copied_instead(trees, make_sync, clock, monkeypatch):
+    source, destination = trees
+    write_file(source, "a.txt", "a")
+    snapshot(make_sync, source, destination)
+
+    def link(source_file, destination_file):
+        raise OSError("too many links")
+    monkeypatch.setattr(os, "link", link)
+    clock[0] += 1
+    sync = snapshot(make_sync, source, destination)
+    assert sync.counts["linked"] == 0
+    assert sync.counts["copied"] + sync.counts["updated"] == 1
+    assert read_file(destination, "2023-1115/a.txt") == b"a"
+    assert not os.path.samefile(os.path.join(destination, "2023-1114/a.txt"),
+                                os.path.join(destination, "2023-1115/a.txt"))
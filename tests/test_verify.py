@@ -0,0 +1,137 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Tests for verified copies and the digests they save in the manifest.
+
+import os
+
+from conftest import ListLogger, write_file, read_file
+from timber_copy import new_hasher
+from timber_diff import MOVE_MIN_SIZE
+from timber_manifest import TimberManifest
+from timber_scanner import FileRecord
+
+
+def digest(data):
+    hasher = new_hasher()
+    hasher.update(data)
+    return hasher.digest()
+
+
+def test_copy_that_fails_verification_is_redone(trees, make_sync, monkeypatch):
+    source, destination = trees
+    write_file(source, "file.bin", b"good data")
+    sync = make_sync()
+    sync.verify = True
+    real_copy = sync.copy_backend.copy
+    attempts = []
+
+    def flaky_copy(source_file, destination_file, *args, **kwargs):
+        real_copy(source_file, destination_file, *args, **kwargs)
+        attempts.append(destination_file)
+        if len(attempts) == 1:
+            # the same size, so only the hash can tell
+            with open(destination_file, "r+b") as f:
+                f.write(b"bad!")
+
+    monkeypatch.setattr(sync.copy_backend, "copy", flaky_copy)
+    sync.sync(source, destination, "", False)
+    assert len(attempts) == 2
+    assert read_file(destination, "file.bin") == b"good data"
+    assert sync.counts["copied"] == 1
+
+
+def test_copy_that_never_verifies_isnt_counted(trees, make_sync, monkeypatch):
+    source, destination = trees
+    write_file(source, "file.bin", b"good data")
+    sync = make_sync()
+    sync.verify = True
+    real_copy = sync.copy_backend.copy
+
+    def broken_copy(source_file, destination_file, *args, **kwargs):
+        real_copy(source_file, destination_file, *args, **kwargs)
+        with open(destination_file, "r+b") as f:
+            f.write(b"bad!")
+
+    monkeypatch.setattr(sync.copy_backend, "copy", broken_copy)
+    sync.sync(source, destination, "", False)
+    assert sync.counts["copied"] == 0
+
+
+def test_verified_sync_saves_digests_in_the_manifest(trees, make_sync, logger):
+    source, destination = trees
+    write_file(source, "a.txt", "first")
+    write_file(source, "dir/b.txt", "second")
+    sync = make_sync()
+    sync.verify = True
+    sync.use_manifest = True
+    sync.sync(source, destination, "", False)
+
+    manifest = TimberManifest(logger)
+    assert manifest.load(source, destination)
+    assert manifest.hashes[os.path.normcase("a.txt")] == digest(b"first")
+    assert manifest.hashes[os.path.normcase(os.path.join("dir", "b.txt"))] == digest(b"second")
+
+    # an update without verify drops the digest, which no longer matches the file
+    write_file(source, "a.txt", "changed", mtime=1100000000)
+    sync = make_sync()
+    sync.use_manifest = True
+    sync.sync(source, destination, "", False)
+    assert manifest.load(source, destination)
+    assert os.path.normcase("a.txt") not in manifest.hashes
+    assert manifest.hashes[os.path.normcase(os.path.join("dir", "b.txt"))] == digest(b"second")
+
+
+def test_hash_moves_uses_the_manifest_digests(trees, make_sync):
+    source, destination = trees
+    write_file(source, "old/big.bin", b"m" * MOVE_MIN_SIZE, mtime=1500000000)
+    sync = make_sync()
+    sync.verify = True
+    sync.use_manifest = True
+    sync.sync(source, destination, "", True)
+
+    os.renames(os.path.join(source, "old", "big.bin"), os.path.join(source, "new", "big.bin"))
+    sync = make_sync()
+    sync.use_manifest = True
+    sync.detect_moves = True
+    sync.hash_moves = True
+    hashed = []
+    real_hash_file = sync.copy_backend.hash_file
+
+    def hash_file(path, hasher, *args):
+        hashed.append(path)
+        return real_hash_file(path, hasher, *args)
+
+    sync.copy_backend.hash_file = hash_file
+    sync.sync(source, destination, "", True)
+    assert sync.counts["moved"] == 1
+    # only the source file was read; the orphan's digest came from the manifest
+    assert hashed == [os.path.join(source, "new", "big.bin")]
+    assert read_file(destination, "new/big.bin") == b"m" * MOVE_MIN_SIZE
+
+
+def test_manifest_round_trip(tmp_path):
+    logger = ListLogger()
+    manifest = TimberManifest(logger)
+    name = b"caf\xe9.txt".decode("utf-8", "surrogateescape")
+    records = [FileRecord("a.txt", 5, 1000), FileRecord(os.path.join("dir", name), 7, 2000),
+               FileRecord("unknown.txt", -1, -1)]
+    hashes = {os.path.normcase("a.txt"): digest(b"a")}
+    assert manifest.save("/source", str(tmp_path), records, hashes)
+
+    loaded = TimberManifest(logger)
+    assert loaded.load("/source", str(tmp_path))
+    assert sorted(loaded.records.values()) == sorted(FileRecord(*record[:3]) for record in records)
+    assert loaded.hashes == hashes
+    assert not loaded.load("/other source", str(tmp_path))
+
+
+def test_corrupt_manifest_is_ignored(tmp_path):
+    logger = ListLogger()
+    manifest = TimberManifest(logger)
+    manifest.save("/source", str(tmp_path), [FileRecord("a.txt", 5, 1000)])
+    path = manifest.manifest_path(str(tmp_path))
+    with open(path, "r+b") as f:
+        f.seek(12)
+        f.write(b"\xff\xff\xff\xff")
+    assert not manifest.load("/source", str(tmp_path))
+    assert manifest.records == {}
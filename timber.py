@@ -5,8 +5,46 @@
 import argparse
 import sys
 
+from timber_catalog import TimberCatalog
+from timber_copy import DURABILITY_POLICIES, DURABILITY_NONE
+from timber_dupes import TimberDupes, DUPLICATE_ACTIONS, DUPLICATES_LINK
+from timber_jobs import TimberJobs, JobLogger, job_arguments
+from timber_logger import TimberLogger, DEFAULT_KEEP_LOGS
 from timber_sync import TimberSync
 
+
+def configure_sync(sync, args):
+    # Sets the options of a sync from its command line arguments, or from a job in a job file.
+    sync.use_manifest = args.manifest
+    sync.exclude_patterns = args.exclude
+    sync.exclude_from = args.exclude_from
+    sync.rescan = args.rescan
+    sync.jobs = max(args.jobs, 1)
+    sync.scanner.jobs = max(args.scan_jobs, 1)
+    sync.pipeline = args.pipeline
+    sync.plan_out = args.plan_out
+    sync.plan_in = args.plan_in
+    sync.resume = args.resume
+    sync.use_journal = not args.no_journal
+    sync.verify = args.verify or args.verify_uncached
+    sync.verify_uncached = args.verify_uncached
+    sync.metrics_out = args.metrics
+    sync.detect_moves = args.detect_moves or args.hash_moves
+    sync.hash_moves = args.hash_moves
+    sync.snapshot = args.snapshot
+    sync.space_check = not args.no_space_check
+    sync.copy_backend.drop_cache = args.drop_cache
+    sync.copy_backend.read_ahead = args.read_ahead
+    sync.atomic_writes = args.atomic
+    sync.durable_writes.policy = args.fsync
+    sync.dupes_in = args.dupes_in
+    sync.duplicate_action = args.dupes_action
+    if args.small_files is not None:
+        sync.small_file_size = args.small_files * 1000
+    if args.delta is not None:
+        sync.delta_min_size = args.delta * 1000000
+
+
 if __name__ == "__main__":
 
     # if there are no arguments, exit
@@ -14,8 +52,8 @@ if __name__ == "__main__":
         sys.exit()
 
     parser = argparse.ArgumentParser(description="Timber: A file cataloging and backup utility")
-    parser.add_argument("-s", "--source", dest="source", required=True,
-                        help="Required. The source directory to catalog or synchronize.")
+    parser.add_argument("-s", "--source", dest="source",
+                        help="Required unless --job-file is used. The source directory to catalog or synchronize.")
     parser.add_argument("-d", "--destination", dest="destination",
                         help="The destination directory to synchronize.")
     parser.add_argument("-x", "--delete", action="store_true",
@@ -23,9 +61,131 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--ignore", dest="ignore", type=str, default="",
                         help="A comma-separated list of directories to ignore when cataloging or synchronizing."
                              "Example: -i temp,documents\\finances,documents\\project\\images")
+    parser.add_argument("--exclude", dest="exclude", action="append", default=[], metavar="PATTERN",
+                        help="Leave out files and directories matching a gitignore style pattern, like '*.tmp', "
+                             "'cache/' or 'photos/**/*.raw'. Can be given more than once.")
+    parser.add_argument("--exclude-from", dest="exclude_from", default="", metavar="FILE",
+                        help="Read exclude patterns from FILE, one per line, in the same format as a .gitignore "
+                             "file. Patterns starting with ! include files again.")
+    parser.add_argument("--catalog", dest="catalog", default="", metavar="FILE",
+                        help="Write a catalog of every file in the source to FILE instead of synchronizing. The "
+                             "format is chosen by the extension: .csv, .jsonl or .xlsx (needs openpyxl).")
+    parser.add_argument("--dupes", dest="dupes", default="", metavar="FILE",
+                        help="Find files with the same contents in the source and save them to FILE instead of "
+                             "synchronizing. Files are hashed on -j processes.")
+    parser.add_argument("--dupes-in", dest="dupes_in", default="", metavar="FILE",
+                        help="Use a duplicates report made with --dupes for the source to hard link or skip new "
+                             "files that duplicate a file already in the destination.")
+    parser.add_argument("--dupes-action", dest="dupes_action", choices=DUPLICATE_ACTIONS, default=DUPLICATES_LINK,
+                        help="What --dupes-in does with duplicates: link them to the first copy (the default) or "
+                             "skip them.")
+    parser.add_argument("--job-file", dest="job_file", default="", metavar="FILE",
+                        help="Run the syncs listed in the JSON job FILE at the same time, with shared limits on the "
+                             "copies made to each disk. --metrics saves one report for all of them.")
+    parser.add_argument("-m", "--manifest", action="store_true",
+                        help="Keep a manifest of synced files in the destination and compare against it "
+                             "instead of scanning the destination on later syncs.")
+    parser.add_argument("--rescan", action="store_true",
+                        help="Scan the destination even if a manifest exists, and rebuild the manifest.")
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1,
+                        help="The number of files to copy at the same time. Default: 1")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Start copying files as soon as they are found instead of waiting for the analysis "
+                             "to finish.")
+    parser.add_argument("--scan-jobs", dest="scan_jobs", type=int, default=1,
+                        help="The number of directories to list at the same time during analysis. Default: 1")
+    parser.add_argument("--delta", dest="delta", type=int, default=None, metavar="MB",
+                        help="Update changed files of at least this many megabytes by rewriting only the blocks "
+                             "that changed, instead of copying the whole file again.")
+    parser.add_argument("--small-files", dest="small_files", type=int, default=None, metavar="KB",
+                        help="Copy files smaller than this many kilobytes with a faster method for trees with many "
+                             "small files. Not used with --verify or on Windows.")
+    parser.add_argument("--detect-moves", dest="detect_moves", action="store_true",
+                        help="Used with -x. Rename files in the destination that were moved or renamed in the source, "
+                             "instead of copying them again and deleting the old copies.")
+    parser.add_argument("--hash-moves", dest="hash_moves", action="store_true",
+                        help="Like --detect-moves, but confirm each moved file by comparing hashes of both copies.")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Make a new dated snapshot of the source inside the destination on each run. Files that "
+                             "haven't changed since the last snapshot are hard linked to it instead of copied.")
+    parser.add_argument("--no-space-check", dest="no_space_check", action="store_true",
+                        help="Don't check that the files to copy fit in the free space on the destination.")
+    parser.add_argument("--verify", action="store_true",
+                        help="Hash files while copying them and read back the destination to check the copy. "
+                             "With -m, the hashes are saved in the manifest.")
+    parser.add_argument("--verify-uncached", dest="verify_uncached", action="store_true",
+                        help="Like --verify, but drop the destination from the cache before reading it back.")
+    parser.add_argument("--plan-out", dest="plan_out", default="", metavar="FILE",
+                        help="Analyze the directories and save the plan of files to copy and delete to FILE "
+                             "without copying or deleting anything.")
+    parser.add_argument("--plan-in", dest="plan_in", default="", metavar="FILE",
+                        help="Carry out a plan saved with --plan-out instead of analyzing the directories again.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted sync from its journal without analyzing the directories again.")
+    parser.add_argument("--no-journal", dest="no_journal", action="store_true",
+                        help="Don't keep a journal in the destination, so an interrupted sync can't be resumed.")
+    parser.add_argument("--metrics", dest="metrics", default="", metavar="FILE",
+                        help="Measure the time spent in each phase and on each file copy, and save a JSON report "
+                             "to FILE.")
+    parser.add_argument("--log-dir", dest="log_dir", default="", metavar="DIR",
+                        help="Write a separate log file for each run to DIR instead of appending to timber.log.")
+    parser.add_argument("--keep-logs", dest="keep_logs", type=int, default=DEFAULT_KEEP_LOGS, metavar="N",
+                        help="Used with --log-dir. The number of run logs to keep. Default: %d" % DEFAULT_KEEP_LOGS)
+    parser.add_argument("--quiet-log", dest="quiet_log", action="store_true",
+                        help="Don't log each file copied or deleted. Errors and the summary are still logged.")
+    parser.add_argument("--read-ahead", dest="read_ahead", action="store_true",
+                        help="Ask the system to start reading each source file while the one before it is copied. "
+                             "Helps on local hard disks; on network shares it costs an extra open per file.")
+    parser.add_argument("--drop-cache", dest="drop_cache", action="store_true",
+                        help="Drop copied files from the system's file cache after copying them, so the sync doesn't "
+                             "push out data other programs have cached.")
+    parser.add_argument("--atomic", action="store_true",
+                        help="Copy each file to a temporary file and rename it into place, so an interrupted update "
+                             "never leaves the destination without a complete copy of the file.")
+    parser.add_argument("--fsync", dest="fsync", choices=DURABILITY_POLICIES, default=DURABILITY_NONE,
+                        help="How copied files are flushed to the disk: none, each file, in batches with each "
+                             "directory once per batch (dir), or the whole filesystem once at the end. Default: none")
     args = parser.parse_args()
+    if not args.source and not args.job_file:
+        parser.error("the following arguments are required: -s/--source")
+
+    logger = TimberLogger(args.log_dir, args.keep_logs, verbose=not args.quiet_log)
+    if args.catalog:
+        catalog = TimberCatalog(logger)
+        catalog.scanner.jobs = max(args.scan_jobs, 1)
+        catalog.exclude_patterns = args.exclude
+        catalog.exclude_from = args.exclude_from
+        catalog.catalog(args.source, args.catalog, args.ignore)
+        sys.exit()
+    if args.dupes:
+        dupes = TimberDupes(logger)
+        dupes.jobs = max(args.jobs, 1)
+        dupes.scanner.jobs = max(args.scan_jobs, 1)
+        dupes.exclude_patterns = args.exclude
+        dupes.exclude_from = args.exclude_from
+        dupes.dupes(args.source, args.dupes, args.ignore)
+        sys.exit()
+    if args.job_file:
+        runner = TimberJobs(logger)
+        runner.metrics_out = args.metrics
+        for name, options in runner.load(args.job_file):
+            try:
+                job_args = parser.parse_args(job_arguments(options))
+            except SystemExit:
+                msg = "Job %s in %s has invalid options. Exiting..." % (name, args.job_file)
+                print(msg), logger.log(msg)
+                sys.exit(1)
+            if not job_args.source or not job_args.destination:
+                msg = "Job %s in %s needs a source and a destination. Exiting..." % (name, args.job_file)
+                print(msg), logger.log(msg)
+                sys.exit(1)
+            job_sync = TimberSync(JobLogger(logger, name))
+            configure_sync(job_sync, job_args)
+            runner.add(name, job_sync, job_args.source, job_args.destination, job_args.ignore, job_args.delete)
+        sys.exit(0 if runner.run() else 1)
 
-    sync = TimberSync()
+    sync = TimberSync(logger)
+    configure_sync(sync, args)
     sync.sync(args.source, args.destination, args.ignore, args.delete)
 
     sys.exit()
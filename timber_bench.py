@@ -0,0 +1,493 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for benchmarking Timber's copy backend, the phases of a sync and the durability policies.
+
+import argparse
+import contextlib
+import filecmp
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from timber_copy import CopyBackend, COPY_TIERS, DURABILITY_POLICIES, sync_filesystem
+from timber_sync import TimberSync
+
+# Synthetic source trees. Each profile's size is multiplied by --scale.
+PROFILES = ("tiny", "deep", "huge", "mixed")
+
+# The phases timed by the phase benchmark, in the order they run.
+PHASES = ("analyze_copy", "copy", "analyze_delete", "delete", "sync", "sync_noop", "sync_update")
+
+# Time differences smaller than this are treated as noise when comparing with a baseline.
+NOISE_FLOOR = 0.05
+
+RESULTS_VERSION = 1
+
+
+def make_file(path, size, chunk_size=1024 * 1024):
+    # Writes a file of random data. Random data keeps compressing or deduplicating filesystems honest.
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(os.urandom(min(chunk_size, remaining)))
+            remaining -= chunk_size
+
+
+def same_as_copy2(source_file, destination_file, reference_file):
+    # Checks that a copy has the same contents, mode and modification time as a copy made by shutil.copy2.
+    if not filecmp.cmp(source_file, destination_file, shallow=False):
+        return False
+    destination_stat = os.stat(destination_file)
+    reference_stat = os.stat(reference_file)
+    return destination_stat.st_mode == reference_stat.st_mode and \
+        destination_stat.st_mtime_ns == reference_stat.st_mtime_ns
+
+
+def benchmark_copy_tiers(directory, size, repeat):
+    # This function copies one file of the given size with shutil.copy2 and then with each copy tier on its own.
+    # It returns a dictionary of tier name to the best time in seconds, or to a string if the tier couldn't run.
+    results = {}
+    source_file = os.path.join(directory, "source.bin")
+    reference_file = os.path.join(directory, "reference.bin")
+    destination_file = os.path.join(directory, "destination.bin")
+    make_file(source_file, size)
+    shutil.copy2(source_file, reference_file)
+
+    for tier in ("shutil.copy2",) + COPY_TIERS:
+        if tier == "shutil.copy2":
+            copy_function = shutil.copy2
+        else:
+            backend = CopyBackend(tiers=(tier,))
+            if tier not in backend.tiers:
+                results[tier] = "not available on this platform"
+                continue
+            copy_function = backend.copy
+
+        times = []
+        try:
+            for i in range(repeat):
+                if os.path.exists(destination_file):
+                    os.remove(destination_file)
+                start = time.perf_counter()
+                copy_function(source_file, destination_file)
+                times.append(time.perf_counter() - start)
+        except OSError as e:
+            results[tier] = "not supported on this filesystem (%s)" % e
+            continue
+
+        if not same_as_copy2(source_file, destination_file, reference_file):
+            results[tier] = "copy does not match shutil.copy2"
+            continue
+        results[tier] = min(times)
+
+    return results
+
+
+def print_results(results, size):
+    for tier, result in results.items():
+        if isinstance(result, float):
+            print("%-16s %8.3f s  %8.1f MB/s" % (tier, result, size / 1000000 / result if result else 0))
+        else:
+            print("%-16s %s" % (tier, result))
+
+
+def write_random(path, size, rng):
+    with open(path, "wb") as f:
+        f.write(rng.randbytes(size))
+
+
+def write_large(path, size, rng, block_size=1024 * 1024):
+    # Writes a large file from one random block. Each block starts with its offset, so no two blocks are the same
+    # and deduplicating filesystems can't skip them, but only one block of random data has to be made.
+    block = bytearray(rng.randbytes(block_size))
+    with open(path, "wb") as f:
+        offset = 0
+        while offset < size:
+            struct.pack_into("<q", block, 0, offset)
+            f.write(block[:min(block_size, size - offset)])
+            offset += block_size
+
+
+def generate_tree(root, profile, scale, seed):
+    # This function fills root with a synthetic tree. The same profile, scale and seed always make the same
+    # tree, so benchmark runs on different versions of Timber can be compared.
+    # tiny: a million files of up to 512 bytes, 1000 files per directory
+    # deep: 2000 directory chains 32 levels deep, with 4 small files on every level
+    # huge: 4 files of 1 GB
+    # mixed: 200,000 files with mostly small and a few large sizes, in a randomly branching tree
+    rng = random.Random(seed)
+    os.makedirs(root)
+
+    if profile == "tiny":
+        for i in range(max(int(1000000 * scale), 1)):
+            directory = os.path.join(root, "d%03d" % (i // 100000), "d%03d" % (i // 1000 % 100))
+            if i % 1000 == 0:
+                os.makedirs(directory, exist_ok=True)
+            write_random(os.path.join(directory, "file%06d.txt" % i), rng.randint(0, 512), rng)
+
+    elif profile == "deep":
+        for branch in range(max(int(2000 * scale), 1)):
+            directory = os.path.join(root, "branch%04d" % branch)
+            for level in range(32):
+                directory = os.path.join(directory, "level%02d" % level)
+                os.makedirs(directory)
+                for i in range(4):
+                    write_random(os.path.join(directory, "file%d.dat" % i), rng.randint(0, 4096), rng)
+
+    elif profile == "huge":
+        for i in range(4):
+            write_large(os.path.join(root, "huge%d.bin" % i), max(int(1000000000 * scale), 1024 * 1024), rng)
+
+    elif profile == "mixed":
+        directories = [root]
+        for i in range(max(int(200000 * scale), 1)):
+            if rng.random() < 0.05:
+                parent = rng.choice(directories)
+                if parent.count(os.sep) - root.count(os.sep) < 12:
+                    directories.append(os.path.join(parent, "dir%05d" % len(directories)))
+                    os.makedirs(directories[-1])
+            path = os.path.join(rng.choice(directories), "file%06d.dat" % i)
+            size = min(int(rng.lognormvariate(8, 2.5)), 512 * 1024 * 1024)
+            if size > 16 * 1024 * 1024:
+                write_large(path, size, rng)
+            else:
+                write_random(path, size, rng)
+
+    else:
+        raise ValueError("Unknown profile %s" % profile)
+
+
+def source_tree(directory, profile, scale, seed):
+    # Returns the path of the profile's source tree in directory, generating it if it isn't there yet.
+    # A finished tree is marked by an empty file next to it, so a tree left half-written by an interrupted run
+    # is generated again.
+    root = os.path.join(directory, "source_%s_%s_%d" % (profile, scale, seed))
+    if not os.path.exists(root + ".complete"):
+        if os.path.exists(root):
+            shutil.rmtree(root)
+        print("Generating the %s tree..." % profile)
+        generate_tree(root, profile, scale, seed)
+        open(root + ".complete", "w").close()
+    return root
+
+
+def tree_files(root):
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, name) for name in sorted(filenames))
+    return paths
+
+
+def make_orphans(destination, count, rng):
+    # Adds files and directories to the destination that aren't in the source, for the delete phase.
+    for i in range(count):
+        directory = os.path.join(destination, "orphans", "dir%03d" % (i // 100))
+        if i % 100 == 0:
+            os.makedirs(directory, exist_ok=True)
+        write_random(os.path.join(directory, "orphan%06d.dat" % i), rng.randint(0, 4096), rng)
+
+
+def change_destination(destination, fraction, rng):
+    # Truncates a fraction of the destination files, so the next sync finds them changed and updates them.
+    paths = tree_files(destination)
+    for path in rng.sample(paths, max(int(len(paths) * fraction), 1) if paths else 0):
+        with open(path, "r+b") as f:
+            f.truncate(max(os.fstat(f.fileno()).st_size // 2 - 1, 0))
+
+
+def drop_caches(paths):
+    # This function empties the page cache before a cold cache run. It returns how the cache was dropped, or
+    # None if it couldn't be. Writing to /proc/sys/vm/drop_caches needs root on Linux. Otherwise every file is
+    # dropped with posix_fadvise, which leaves directory entries and inodes cached.
+    if hasattr(os, "sync"):
+        os.sync()
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return "drop_caches"
+    except OSError:
+        pass
+
+    if not hasattr(os, "posix_fadvise"):
+        return None
+    for root in paths:
+        for path in tree_files(root):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return "posix_fadvise"
+
+
+def benchmark_phases(directory, source, cold, jobs, scan_jobs, seed):
+    # This function times each phase of a sync on its own, then whole syncs: into an empty destination, with
+    # nothing to do, and with 1% of the destination files changed. It returns a dictionary of phase name to
+    # seconds. With cold, the cache is dropped before each phase.
+    destination = os.path.join(directory, "destination")
+    rng = random.Random(seed)
+    results = {}
+
+    def new_sync():
+        sync = TimberSync()
+        sync.jobs = jobs
+        sync.scanner.jobs = scan_jobs
+        return sync
+
+    def timed(phase, function, *args):
+        if cold:
+            drop_caches([source, destination])
+        start = time.perf_counter()
+        function(*args)
+        results[phase] = time.perf_counter() - start
+
+    if os.path.exists(destination):
+        shutil.rmtree(destination)
+    os.makedirs(destination)
+
+    # the phases on their own
+    sync = new_sync()
+    timed("analyze_copy", sync.file_analyze_for_copy_update, source, destination, [])
+    timed("copy", sync.file_copy, source, destination, [])
+    make_orphans(destination, max(len(sync.plan.copies) // 10, 1), rng)
+    timed("analyze_delete", sync.file_analyze_for_deletion, source, destination, [])
+    timed("delete", sync.file_delete, source, destination, [])
+    sync.logger.close_log()
+
+    # whole syncs
+    shutil.rmtree(destination)
+    timed("sync", new_sync().sync, source, destination, "", True)
+    timed("sync_noop", new_sync().sync, source, destination, "", True)
+    change_destination(destination, 0.01, rng)
+    timed("sync_update", new_sync().sync, source, destination, "", True)
+
+    return results
+
+
+def run_phase_benchmarks(directory, profiles, scale, seed, repeat, modes, jobs, scan_jobs):
+    # Runs the phase benchmark for each profile and cache mode and keeps the best time of each phase.
+    results = {"version": RESULTS_VERSION, "scale": scale, "seed": seed, "jobs": jobs, "scan_jobs": scan_jobs,
+               "platform": platform.platform(), "python": platform.python_version(), "profiles": {}}
+
+    if "cold" in modes:
+        method = drop_caches([])
+        if method is None:
+            print("The cache can't be dropped on this platform. Skipping cold cache runs.")
+            modes = [mode for mode in modes if mode != "cold"]
+        else:
+            print("Cold cache runs drop the cache with %s." % method)
+            results["cold_cache_method"] = method
+
+    work_directory = os.path.join(directory, "work")
+    os.makedirs(work_directory, exist_ok=True)
+
+    for profile in profiles:
+        source = source_tree(directory, profile, scale, seed)
+        results["profiles"][profile] = {}
+        for mode in modes:
+            print("Running the %s profile with a %s cache..." % (profile, mode))
+            best = {}
+            for i in range(repeat):
+                # Timber's output and timber.log go to the work directory, not the terminal
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                        contextlib.redirect_stderr(devnull), working_directory(work_directory):
+                    times = benchmark_phases(work_directory, source, mode == "cold", jobs, scan_jobs, seed)
+                for phase, seconds in times.items():
+                    best[phase] = min(best.get(phase, seconds), seconds)
+            results["profiles"][profile][mode] = best
+            print_phase_results(best)
+
+    return results
+
+
+def benchmark_durability(directory, source, jobs):
+    # This function times copying source into an empty destination with each durability policy, with and without
+    # atomic writes. The trees are analyzed first and the filesystem is synced before each copy, so only the copy
+    # and the flushing its policy asks for are timed. It returns a dictionary of "policy" or "policy+atomic" to
+    # seconds.
+    destination = os.path.join(directory, "destination")
+    results = {}
+    for policy in DURABILITY_POLICIES:
+        for atomic in (False, True):
+            if os.path.exists(destination):
+                shutil.rmtree(destination)
+            os.makedirs(destination)
+            sync = TimberSync()
+            sync.jobs = jobs
+            sync.atomic_writes = atomic
+            sync.durable_writes.policy = policy
+            sync.file_analyze_for_copy_update(source, destination, [])
+            sync_filesystem(destination)
+            start = time.perf_counter()
+            sync.file_copy(source, destination, [])
+            results[policy + ("+atomic" if atomic else "")] = time.perf_counter() - start
+            sync.logger.close_log()
+    return results
+
+
+def run_durability_benchmarks(directory, profile, scale, seed, repeat, jobs):
+    # Runs the durability benchmark on one profile and keeps the best time of each policy.
+    source = source_tree(directory, profile, scale, seed)
+    work_directory = os.path.join(directory, "work")
+    os.makedirs(work_directory, exist_ok=True)
+    print("Copying the %s tree with each durability policy..." % profile)
+    best = {}
+    for i in range(repeat):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull), working_directory(work_directory):
+            times = benchmark_durability(work_directory, source, jobs)
+        for name, seconds in times.items():
+            best[name] = min(best.get(name, seconds), seconds)
+
+    files = len(list(tree_files(source)))
+    for name, seconds in best.items():
+        print("  %-16s %8.3f s  %10.1f files/s" % (name, seconds, files / seconds if seconds else 0))
+    return best
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def print_phase_results(times):
+    for phase in PHASES:
+        if phase in times:
+            print("  %-16s %8.3f s" % (phase, times[phase]))
+
+
+def compare_results(results, baseline, threshold):
+    # This function compares each phase time with the baseline and returns a list of the phases that got slower
+    # by more than threshold (a fraction, like 0.1 for 10%) and by more than NOISE_FLOOR seconds.
+    regressions = []
+    print("Phase                               Baseline      Now   Change")
+    for profile, modes in results["profiles"].items():
+        for mode, times in modes.items():
+            for phase in PHASES:
+                try:
+                    base = baseline["profiles"][profile][mode][phase]
+                    seconds = times[phase]
+                except KeyError:
+                    continue
+                change = (seconds - base) / base if base else 0.0
+                regressed = seconds > base * (1 + threshold) and seconds - base > NOISE_FLOOR
+                name = "%s/%s/%s" % (profile, mode, phase)
+                print("%-32s %9.3f %8.3f %+7.1f%%%s" % (name, base, seconds, change * 100,
+                                                        "  REGRESSION" if regressed else ""))
+                if regressed:
+                    regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timber: copy and sync benchmarks")
+    parser.add_argument("--dir", dest="directory", default=None,
+                        help="The directory to run the benchmarks in. Use a directory on the filesystem you want "
+                             "to measure. Default: a temporary directory")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    tiers_parser = subparsers.add_parser("tiers", help="Time each copy method on one file.")
+    tiers_parser.add_argument("--size-mb", dest="size_mb", type=int, default=256,
+                              help="The size of the file to copy, in MB. Default: 256")
+    tiers_parser.add_argument("--repeat", dest="repeat", type=int, default=3,
+                              help="The number of times to copy the file with each method. Default: 3")
+
+    phases_parser = subparsers.add_parser("phases", help="Time the analysis, copy and delete phases of a sync "
+                                                         "on synthetic trees.")
+    phases_parser.add_argument("--profile", dest="profiles", action="append", choices=PROFILES,
+                               help="A tree to benchmark. Can be given more than once. Default: all profiles")
+    phases_parser.add_argument("--scale", dest="scale", type=float, default=1.0,
+                               help="Multiplies the number of files (or the file size, for huge) in each tree. "
+                                    "Default: 1")
+    phases_parser.add_argument("--seed", dest="seed", type=int, default=1,
+                               help="The seed used to generate the trees. Default: 1")
+    phases_parser.add_argument("--repeat", dest="repeat", type=int, default=3,
+                               help="The number of times to run each benchmark. The best time is kept. Default: 3")
+    phases_parser.add_argument("--cache", dest="cache", choices=("warm", "cold", "both"), default="both",
+                               help="Run with a warm cache, a cold cache or both. Default: both")
+    phases_parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1,
+                               help="The number of files to copy at the same time. Default: 1")
+    phases_parser.add_argument("--scan-jobs", dest="scan_jobs", type=int, default=1,
+                               help="The number of directories to list at the same time. Default: 1")
+    phases_parser.add_argument("--output", dest="output", default=None, metavar="FILE",
+                               help="Save the results to FILE as JSON. Use this to make a baseline.")
+    phases_parser.add_argument("--baseline", dest="baseline", default=None, metavar="FILE",
+                               help="Compare the results with a baseline saved with --output, and exit with "
+                                    "status 1 if any phase got slower.")
+    phases_parser.add_argument("--threshold", dest="threshold", type=float, default=10.0, metavar="PERCENT",
+                               help="How much slower than the baseline a phase can be before it counts as a "
+                                    "regression. Default: 10")
+
+    durability_parser = subparsers.add_parser("durability", help="Time copying a synthetic tree with each "
+                                                                 "--fsync policy, with and without --atomic.")
+    durability_parser.add_argument("--profile", dest="profile", choices=PROFILES, default="mixed",
+                                   help="The tree to copy. Default: mixed")
+    durability_parser.add_argument("--scale", dest="scale", type=float, default=0.05,
+                                   help="Multiplies the number of files in the tree. Default: 0.05")
+    durability_parser.add_argument("--seed", dest="seed", type=int, default=1,
+                                   help="The seed used to generate the tree. Default: 1")
+    durability_parser.add_argument("--repeat", dest="repeat", type=int, default=1,
+                                   help="The number of times to copy the tree with each policy. The best time is "
+                                        "kept. Default: 1")
+    durability_parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1,
+                                   help="The number of files to copy at the same time. Default: 1")
+    args = parser.parse_args()
+
+    if args.benchmark == "tiers":
+        with tempfile.TemporaryDirectory(dir=args.directory) as bench_directory:
+            size = args.size_mb * 1000000
+            print("Copying a %d MB file %d times with each method..." % (args.size_mb, args.repeat))
+            print_results(benchmark_copy_tiers(bench_directory, size, args.repeat), size)
+        sys.exit()
+
+    if args.benchmark == "durability":
+        with contextlib.ExitStack() as stack:
+            bench_directory = args.directory or stack.enter_context(tempfile.TemporaryDirectory())
+            run_durability_benchmarks(os.path.abspath(bench_directory), args.profile, args.scale, args.seed,
+                                      max(args.repeat, 1), max(args.jobs, 1))
+        sys.exit()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("version"), baseline.get("scale"), baseline.get("seed")) != \
+                (RESULTS_VERSION, args.scale, args.seed):
+            print("The baseline %s was made with a different version, scale or seed. Exiting..." % args.baseline)
+            sys.exit(1)
+
+    modes = ["warm", "cold"] if args.cache == "both" else [args.cache]
+    # generated trees are kept when --dir is given, so later runs can reuse them
+    with contextlib.ExitStack() as stack:
+        bench_directory = args.directory or stack.enter_context(tempfile.TemporaryDirectory())
+        results = run_phase_benchmarks(os.path.abspath(bench_directory), args.profiles or PROFILES, args.scale,
+                                       args.seed, args.repeat, modes, max(args.jobs, 1), max(args.scan_jobs, 1))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("Results saved to %s" % args.output)
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.threshold / 100)
+        if regressions:
+            print("%d phases are slower than the baseline." % len(regressions))
+            sys.exit(1)
+        print("No phases are slower than the baseline.")
+
+    sys.exit()
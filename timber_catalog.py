@@ -0,0 +1,196 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for the Timber catalog, a list of every file in a directory tree.
+
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+from tqdm import tqdm
+from timber_exclude import compile_excludes
+from timber_logger import TimberLogger
+from timber_scanner import TimberScanner
+
+CATALOG_HEADER = ("Directory", "Filename", "Size", "Modified")
+CATALOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Files and directories starting with a period are left out of catalogs, like they always have been.
+# An exclude pattern like !.config brings one back.
+HIDDEN_PATTERN = ".*"
+
+# An Excel sheet holds at most this many rows. Larger catalogs continue on another sheet.
+XLSX_MAX_ROWS = 1048576
+
+# colors used by the Excel catalog
+XLSX_HEADER_COLOR = "D9E1F2"
+XLSX_BAND_COLOR = "E0E0E0"
+
+
+class CsvCatalogWriter:
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(CATALOG_HEADER)
+
+    def write_rows(self, rows):
+        self.writer.writerows((directory, name, size, time.strftime(CATALOG_TIME_FORMAT, time.localtime(mtime)))
+                              for directory, name, size, mtime in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlCatalogWriter:
+    # One JSON object per file, with the size in bytes and the modification time in seconds and as text.
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write_rows(self, rows):
+        self.file.writelines(json.dumps({"directory": directory, "name": name, "size": size, "mtime": mtime,
+                                         "modified": time.strftime(CATALOG_TIME_FORMAT, time.localtime(mtime))})
+                             + "\n" for directory, name, size, mtime in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxCatalogWriter:
+    # Writes the catalog with an openpyxl write-only workbook, which streams rows to disk instead of keeping every
+    # cell in memory. The rows are banded with one conditional format instead of styling each cell.
+
+    def __init__(self, path):
+        # openpyxl is only needed for Excel catalogs
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.formatting.rule import FormulaRule
+        from openpyxl.styles import PatternFill
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.WriteOnlyCell = WriteOnlyCell
+        self.FormulaRule = FormulaRule
+        self.PatternFill = PatternFill
+        self.sheet = None
+        self.sheet_count = 0
+        self.row_count = 0
+        self.add_sheet()
+
+    def add_sheet(self):
+        self.sheet_count += 1
+        title = "Catalog" if self.sheet_count == 1 else "Catalog %d" % self.sheet_count
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.freeze_panes = "A2"
+        for column, width in zip("ABCD", (40, 40, 15, 20)):
+            self.sheet.column_dimensions[column].width = width
+        band = self.PatternFill(start_color=XLSX_BAND_COLOR, end_color=XLSX_BAND_COLOR, fill_type="solid")
+        self.sheet.conditional_formatting.add("A2:D%d" % XLSX_MAX_ROWS,
+                                              self.FormulaRule(formula=["MOD(ROW(),2)=1"], fill=band))
+
+        header_fill = self.PatternFill(start_color=XLSX_HEADER_COLOR, end_color=XLSX_HEADER_COLOR,
+                                       fill_type="solid")
+        header = []
+        for title in CATALOG_HEADER:
+            cell = self.WriteOnlyCell(self.sheet, value=title)
+            cell.fill = header_fill
+            header.append(cell)
+        self.sheet.append(header)
+        self.row_count = 1
+
+    def write_rows(self, rows):
+        for directory, name, size, mtime in rows:
+            if self.row_count >= XLSX_MAX_ROWS:
+                self.add_sheet()
+            self.sheet.append((directory, name, size, time.strftime(CATALOG_TIME_FORMAT, time.localtime(mtime))))
+            self.row_count += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+# catalog writers by file extension
+CATALOG_WRITERS = {".csv": CsvCatalogWriter, ".jsonl": JsonlCatalogWriter, ".xlsx": XlsxCatalogWriter}
+
+
+class TimberCatalog:
+
+    def __init__(self, logger=None):
+        self.logger = logger or TimberLogger()
+        self.logger.log("Timber Catalog initialized.")
+        self.scanner = TimberScanner(self.logger)
+
+        # Files and directories matching exclude_patterns or the rules in the exclude_from file are left out,
+        # like they are in a sync.
+        self.exclude_patterns = []
+        self.exclude_from = ""
+
+    def catalog(self, directory, output, ignored_directories=""):
+        # This function writes a catalog of every file under directory to output. The format is chosen by the
+        # extension of output: .csv, .jsonl or .xlsx. The tree is walked once and each directory's rows are
+        # written as soon as it is listed, so memory use doesn't grow with the number of files.
+        if not os.path.isdir(directory):
+            msg = "Invalid source directory. Exiting..."
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        writer_class = CATALOG_WRITERS.get(os.path.splitext(output)[1].lower())
+        if writer_class is None:
+            msg = "Unknown catalog format %s. Use a file name ending in %s. Exiting..." \
+                  % (output, ", ".join(sorted(CATALOG_WRITERS)))
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        try:
+            ignored = compile_excludes(ignored_directories, [HIDDEN_PATTERN] + self.exclude_patterns,
+                                       self.exclude_from)
+        except (OSError, UnicodeDecodeError, re.error) as e:
+            msg = "Could not read the exclude rules: %s. Exiting..." % e
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        try:
+            writer = writer_class(output)
+        except ImportError:
+            msg = "Excel catalogs need the openpyxl package. Install it, or use a .csv or .jsonl file. Exiting..."
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        except OSError as e:
+            msg = "Could not write the catalog %s: %s. Exiting..." % (output, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        def visit(rel_dir):
+            rows = []
+            subdirs = []
+            for entry in self.scanner.list_directory(os.path.join(directory, rel_dir) if rel_dir else directory):
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if self.scanner.entry_is_dir(entry):
+                    if not entry.is_symlink() and not self.scanner.is_ignored(entry.name, rel_path, ignored):
+                        subdirs.append(rel_path)
+                elif not self.scanner.is_ignored_file(entry.name, rel_path, ignored):
+                    record = self.scanner.stat_entry(entry, rel_path)
+                    if record is not None:
+                        rows.append((rel_dir, entry.name, record.size, record.mtime_ns // 1000000000))
+            return rows, subdirs
+
+        print("Cataloging files...")
+        file_count = 0
+        try:
+            with tqdm(unit="file") as pbar:
+                for rows in self.scanner.iter_tree(visit, ""):
+                    writer.write_rows(rows)
+                    file_count += len(rows)
+                    pbar.update(len(rows))
+            writer.close()
+        except OSError as e:
+            msg = "Could not write the catalog %s: %s. Exiting..." % (output, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        msg = "Catalog of %d files saved to %s" % (file_count, output)
+        print(msg), self.logger.log(msg)
+        self.logger.close_log()
@@ -0,0 +1,611 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for the Timber file copy backend and copy concurrency limits.
+
+import errno
+import hashlib
+import os
+import shutil
+import sys
+import threading
+
+# Default limits for concurrent copies. A single file larger than the byte limit is still copied,
+# but only when nothing else is in flight.
+DEFAULT_MAX_IN_FLIGHT_BYTES = 256 * 1024 * 1024
+DEFAULT_FILES_PER_JOB = 4
+
+# The number of files waiting to be copied per copy worker when copying while the scan is still running.
+PIPELINE_QUEUE_PER_JOB = 64
+
+# With two or more copy jobs, while smaller files are being copied at most half of the workers copy files of at
+# least LARGE_FILE_SIZE bytes, so large files keep the disk streaming while the other workers keep working through
+# small files. Any worker can copy either kind, so a tree of only small or only large files uses every worker.
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+
+# Small files in the same directory are copied in batches of up to this many files, so each batch opens the
+# directories once.
+SMALL_FILE_BATCH = 256
+
+
+class CopyBudget:
+    # Limits the number of files and bytes being copied at the same time. It is shared by all copy workers
+    # and can be shared by several syncs.
+
+    def __init__(self, max_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES, max_files=DEFAULT_FILES_PER_JOB):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.bytes_in_flight = 0
+        self.files_in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        # Blocks until the file fits in the budget.
+        with self.condition:
+            while self.files_in_flight > 0 and (self.files_in_flight >= self.max_files or
+                                                self.bytes_in_flight + size > self.max_bytes):
+                self.condition.wait()
+            self.files_in_flight += 1
+            self.bytes_in_flight += size
+
+    def release(self, size):
+        with self.condition:
+            self.files_in_flight -= 1
+            self.bytes_in_flight -= size
+            self.condition.notify_all()
+
+
+# Copy tiers, from fastest to slowest. Not every tier is available on every platform or filesystem;
+# the backend falls back to the next tier when one isn't supported.
+TIER_REFLINK = "reflink"
+TIER_COPY_FILE_RANGE = "copy_file_range"
+TIER_SENDFILE = "sendfile"
+TIER_READINTO = "readinto"
+COPY_TIERS = (TIER_REFLINK, TIER_COPY_FILE_RANGE, TIER_SENDFILE, TIER_READINTO)
+
+# The buffer size used by the readinto tier. Each copy worker keeps its own buffer and reuses it.
+COPY_BUFFER_SIZE = 16 * 1024 * 1024
+
+# The largest chunk passed to copy_file_range and sendfile in one call.
+KERNEL_CHUNK_SIZE = 1024 * 1024 * 1024
+
+# The block size used to compare files for delta updates.
+DELTA_BLOCK_SIZE = 1024 * 1024
+
+# The size of the blake2b digests used to verify copies and stored in the manifest.
+HASH_DIGEST_SIZE = 16
+
+# With --read-ahead, the upcoming source files at least this large are read ahead while the file before them is
+# being copied.
+# Only the first PREFETCH_LENGTH bytes are read ahead, so a huge file doesn't push everything else out of the cache.
+PREFETCH_MIN_SIZE = 64 * 1024
+PREFETCH_LENGTH = 8 * 1024 * 1024
+
+# While a sync is journaled, files of at least RESUMABLE_MIN_SIZE bytes are copied in pieces of CHECKPOINT_SIZE
+# bytes, with the same copy tiers as any other copy, and each piece is recorded, so an interrupted copy can
+# continue from there. The pieces are only flushed to disk before they are recorded with an --fsync policy.
+RESUMABLE_MIN_SIZE = 256 * 1024 * 1024
+CHECKPOINT_SIZE = 256 * 1024 * 1024
+
+# How copied files are made durable on the destination:
+# none: left to the operating system, which writes them out in its own time
+# file: each file is fsynced before it is closed, and its directory right after it is in place
+# dir: copied files are fsynced in batches of DURABLE_BATCH_SIZE, then each of their directories once per batch.
+#      The batches are counted in files across all directories, not per directory, because a copy worker can't
+#      tell when a directory is finished. With atomic writes, each file is fsynced before it is renamed over its
+#      old version instead, and only the directories are left for the batch.
+# end: the destination filesystem is synced once, when all files are copied
+DURABILITY_NONE = "none"
+DURABILITY_FILE = "file"
+DURABILITY_DIRECTORY = "dir"
+DURABILITY_END = "end"
+DURABILITY_POLICIES = (DURABILITY_NONE, DURABILITY_FILE, DURABILITY_DIRECTORY, DURABILITY_END)
+DURABLE_BATCH_SIZE = 1000
+
+# With atomic writes, each file is copied to its name plus TEMP_FILE_SUFFIX and renamed over the old version.
+TEMP_FILE_SUFFIX = ".timber-tmp"
+
+# ioctl request number for FICLONE on Linux (btrfs, XFS and other filesystems with reflink support)
+FICLONE = 0x40049409
+
+# errors that mean a tier isn't supported for a pair of files, rather than the copy failing
+UNSUPPORTED_ERRNOS = set(getattr(errno, name) for name in
+                         ("ENOSYS", "ENOTSUP", "EOPNOTSUPP", "EXDEV", "EINVAL", "ENOTTY", "EBADF", "ETXTBSY")
+                         if hasattr(errno, name))
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# syncfs(2) syncs one filesystem. It is Linux only and not in the os module, so it is called through libc.
+try:
+    import ctypes
+    syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+except (ImportError, OSError, TypeError, AttributeError):
+    syncfs = None
+
+
+class UnsupportedTier(Exception):
+    pass
+
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+
+
+def fsync_path(path):
+    # Opens path (a file or a directory) and fsyncs it. Directories can't be opened on Windows and some
+    # filesystems don't support fsyncing them, so errors are ignored.
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def sync_filesystem(path):
+    # Flushes everything written to the filesystem path is on. Without syncfs, every filesystem is synced.
+    if syncfs is not None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            if syncfs(fd) == 0:
+                return
+        finally:
+            os.close(fd)
+    if hasattr(os, "sync"):
+        os.sync()
+
+
+class DurableWrites:
+    # Makes copied files durable according to one of the DURABILITY_POLICIES. The copy functions fsync each file
+    # themselves when sync_each_file is True. file_written is called once a copied file is in place, and finish
+    # once all files are copied. It is safe to call from several copy workers at once.
+
+    def __init__(self, policy=DURABILITY_NONE, batch_size=DURABLE_BATCH_SIZE):
+        self.policy = policy
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = threading.Lock()
+
+        # atomic is set when files are written to a temporary file and renamed over the old version. A renamed file
+        # whose data wasn't flushed yet could replace a good copy with a broken one after a crash, so every file is
+        # then fsynced before it is renamed.
+        self.atomic = False
+
+    @property
+    def sync_each_file(self):
+        return self.policy == DURABILITY_FILE or (self.policy == DURABILITY_DIRECTORY and self.atomic)
+
+    def file_written(self, path):
+        if self.policy == DURABILITY_FILE:
+            fsync_path(os.path.dirname(path))
+        elif self.policy == DURABILITY_DIRECTORY:
+            batch = None
+            with self.lock:
+                self.pending.append(path)
+                if len(self.pending) >= self.batch_size:
+                    batch = self.pending
+                    self.pending = []
+            if batch is not None:
+                self.sync_batch(batch)
+
+    def sync_batch(self, paths):
+        # The files were written a while ago, so most of their data is already on its way to the disk and each
+        # fsync has little left to wait for. Each directory is then fsynced once for the whole batch. Files that
+        # were already fsynced before they were renamed only need their directories.
+        directories = set()
+        for path in paths:
+            if not self.sync_each_file:
+                fsync_path(path)
+            directories.add(os.path.dirname(path))
+        for directory in sorted(directories):
+            fsync_path(directory)
+
+    def finish(self, destination):
+        if self.policy == DURABILITY_DIRECTORY:
+            with self.lock:
+                batch = self.pending
+                self.pending = []
+            self.sync_batch(batch)
+        elif self.policy == DURABILITY_END:
+            sync_filesystem(destination)
+
+
+class CopyBackend:
+    # Copies file data using the fastest tier available for each pair of files, then copies the metadata the
+    # same way shutil.copy (mode only) or shutil.copy2 (mode, times and other stats) would.
+
+    def __init__(self, tiers=COPY_TIERS, buffer_size=COPY_BUFFER_SIZE):
+        self.tiers = [tier for tier in tiers if self.tier_available(tier)]
+        self.buffer_size = buffer_size
+
+        # With drop_cache, the source and destination are dropped from the page cache after each copy, so a large
+        # backup doesn't push the cached data of other programs out of memory.
+        self.drop_cache = False
+
+        # With read_ahead, prefetch asks the kernel to start reading upcoming source files. It opens each file an
+        # extra time, which costs a round trip per file on network shares, so it is off unless asked for.
+        self.read_ahead = False
+
+        # tiers found to be unsupported for a (source device, destination device) pair are skipped for that pair
+        self.unsupported = {}
+        self.tier_counts = dict((tier, 0) for tier in COPY_TIERS)
+
+        # bytes written and bytes left untouched by delta updates
+        self.delta_bytes_written = 0
+        self.delta_bytes_skipped = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def tier_available(self, tier):
+        if tier == TIER_REFLINK:
+            return fcntl is not None and sys.platform.startswith("linux")
+        if tier == TIER_COPY_FILE_RANGE:
+            return hasattr(os, "copy_file_range")
+        if tier == TIER_SENDFILE:
+            # sendfile can only write to regular files on Linux
+            return hasattr(os, "sendfile") and sys.platform.startswith("linux")
+        return tier == TIER_READINTO
+
+    def copy(self, source_file, destination_file, preserve_metadata=True, hasher=None, durable=False):
+        # This function copies source_file to destination_file and returns the name of the tier that was used.
+        # With preserve_metadata the result is the same as shutil.copy2, otherwise it is the same as shutil.copy.
+        # If a hasher (like hashlib.blake2b()) is given, the data is hashed as it is copied. The kernel tiers never
+        # pass the data through Python, so hashing always uses the readinto tier.
+        # With durable, the destination is fsynced before it is closed.
+        if os.path.isdir(destination_file):
+            destination_file = os.path.join(destination_file, os.path.basename(source_file))
+        if os.path.exists(destination_file) and os.path.samefile(source_file, destination_file):
+            raise shutil.SameFileError("%s and %s are the same file" % (source_file, destination_file))
+
+        with open(source_file, "rb") as fsrc:
+            self.advise(fsrc, "POSIX_FADV_SEQUENTIAL")
+            with open(destination_file, "wb") as fdst:
+                tier = self.copy_data(fsrc, fdst, hasher)
+                if durable:
+                    fdst.flush()
+                    os.fsync(fdst.fileno())
+                if self.drop_cache:
+                    self.advise(fsrc, "POSIX_FADV_DONTNEED")
+                    self.advise(fdst, "POSIX_FADV_DONTNEED")
+
+        if preserve_metadata:
+            shutil.copystat(source_file, destination_file)
+        else:
+            shutil.copymode(source_file, destination_file)
+        return tier
+
+    def advise(self, f, advice, length=0):
+        # Passes a hint about how an open file will be used to the kernel, where posix_fadvise is available.
+        # The hints only affect caching, so errors are ignored.
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, length, getattr(os, advice))
+            except OSError:
+                pass
+
+    def prefetch(self, path, size):
+        # Asks the kernel to start reading the start of a file that is about to be copied, so it is in the cache
+        # by the time the copy gets to it. Small files are read in one go anyway, so they are skipped.
+        if not self.read_ahead or size < PREFETCH_MIN_SIZE or not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            with open(path, "rb") as f:
+                self.advise(f, "POSIX_FADV_WILLNEED", PREFETCH_LENGTH)
+        except OSError:
+            pass
+
+    def copy_data(self, fsrc, fdst, hasher=None):
+        # Copies the contents of one open file to another using the best tier for this pair of devices.
+        if hasher is not None:
+            self.copy_readinto(fsrc, fdst, hasher)
+            with self.lock:
+                self.tier_counts[TIER_READINTO] += 1
+            return TIER_READINTO
+
+        source_stat = os.fstat(fsrc.fileno())
+        device_pair = (source_stat.st_dev, os.fstat(fdst.fileno()).st_dev)
+        unsupported = self.unsupported.get(device_pair, ())
+
+        for tier in self.tiers:
+            if tier in unsupported:
+                continue
+            try:
+                self.copy_with_tier(tier, fsrc, fdst, source_stat.st_size)
+            except UnsupportedTier:
+                with self.lock:
+                    self.unsupported.setdefault(device_pair, set()).add(tier)
+                continue
+            with self.lock:
+                self.tier_counts[tier] += 1
+            return tier
+
+        # the readinto tier is always supported, so this is only reached if tiers was limited by the caller
+        raise OSError("No copy tier is available for %s" % fsrc.name)
+
+    def copy_with_tier(self, tier, fsrc, fdst, size):
+        if tier == TIER_REFLINK:
+            self.copy_reflink(fsrc, fdst)
+        elif tier == TIER_COPY_FILE_RANGE:
+            self.copy_kernel(os.copy_file_range, fsrc, fdst, size)
+        elif tier == TIER_SENDFILE:
+            self.copy_kernel(self.sendfile, fsrc, fdst, size)
+        else:
+            self.copy_readinto(fsrc, fdst)
+
+    def copy_reflink(self, fsrc, fdst):
+        # Shares the source's blocks with the destination. Nothing is copied until one of them is modified.
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno in UNSUPPORTED_ERRNOS:
+                raise UnsupportedTier()
+            raise
+
+    def sendfile(self, in_fd, out_fd, count):
+        # os.sendfile takes its arguments in a different order than os.copy_file_range
+        return os.sendfile(out_fd, in_fd, None, count)
+
+    def copy_kernel(self, copy_function, fsrc, fdst, size):
+        # Copies the data inside the kernel, so it never passes through Python buffers.
+        # If the first call fails because the tier isn't supported, nothing has been written yet and the
+        # next tier can take over. Errors after that are real copy errors.
+        in_fd = fsrc.fileno()
+        out_fd = fdst.fileno()
+        offset = 0
+        chunk = max(min(size, KERNEL_CHUNK_SIZE), 8 * 1024 * 1024)
+
+        while True:
+            try:
+                copied = copy_function(in_fd, out_fd, chunk)
+            except OSError as e:
+                if offset == 0 and e.errno in UNSUPPORTED_ERRNOS:
+                    raise UnsupportedTier()
+                raise
+            if copied == 0:
+                break
+            offset += copied
+
+        # some filesystems report success without copying anything; let the next tier handle those
+        if offset == 0 and size > 0:
+            raise UnsupportedTier()
+
+    def copy_readinto(self, fsrc, fdst, hasher=None):
+        # Copies the data through one reusable buffer per thread, so no new bytes object is made per read.
+        buffer = self.copy_buffer()
+
+        while True:
+            length = fsrc.readinto(buffer)
+            if not length:
+                break
+            fdst.write(buffer[:length])
+            if hasher is not None:
+                hasher.update(buffer[:length])
+
+    def copy_buffer(self):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None or len(buffer) != self.buffer_size:
+            buffer = memoryview(bytearray(self.buffer_size))
+            self.local.buffer = buffer
+        return buffer
+
+    def hash_file(self, path, hasher, drop_cache=False):
+        # This function reads a file and returns its digest. With drop_cache, the file's pages are flushed and
+        # dropped from the page cache first (where posix_fadvise is available), so the data is read back from
+        # the disk or server instead of from memory.
+        buffer = self.copy_buffer()
+        with open(path, "rb") as f:
+            if drop_cache and hasattr(os, "posix_fadvise"):
+                try:
+                    os.fsync(f.fileno())
+                except OSError:
+                    pass
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            while True:
+                length = f.readinto(buffer)
+                if not length:
+                    break
+                hasher.update(buffer[:length])
+        return hasher.digest()
+
+    def copy_delta(self, source_file, destination_file, block_size=DELTA_BLOCK_SIZE, hasher=None, durable=False):
+        # This function updates an existing destination file in place by comparing it with the source one block
+        # at a time and rewriting only the blocks that differ. The file is then truncated to the source size and
+        # the source's metadata is copied, like shutil.copy2. If the destination doesn't exist, it is copied whole.
+        # Writing a block sets the destination's modification time to now, which would make a partly updated file
+        # look newer than the source. So before the first block is written, the destination is made one byte
+        # longer than the source, and only truncated to the source size at the end. An interrupted update has the
+        # wrong size, and is found and redone next sync.
+        # Every source block is read, so a hasher can be given to hash the source as it is compared.
+        # With durable, the destination is fsynced before it is closed. Returns the number of bytes written.
+        try:
+            fdst = open(destination_file, "r+b")
+        except FileNotFoundError:
+            self.copy(source_file, destination_file, preserve_metadata=True, hasher=hasher, durable=durable)
+            return os.path.getsize(destination_file)
+
+        source_buffer, destination_buffer = self.delta_buffers(block_size)
+        source_view = memoryview(source_buffer)
+        destination_view = memoryview(destination_buffer)
+        offset = 0
+        written = 0
+        marked = False
+
+        with open(source_file, "rb") as fsrc, fdst:
+            self.advise(fsrc, "POSIX_FADV_SEQUENTIAL")
+            self.advise(fdst, "POSIX_FADV_SEQUENTIAL")
+            source_size = os.fstat(fsrc.fileno()).st_size
+            while True:
+                source_length = fsrc.readinto(source_buffer)
+                if not source_length:
+                    break
+                if hasher is not None:
+                    hasher.update(source_view[:source_length])
+                # Only as much of the destination as the source block is read, so the last block still compares
+                # equal when the destination is longer, like it is once it has been marked.
+                destination_length = fdst.readinto(destination_view[:source_length])
+
+                if source_length == block_size and destination_length == block_size:
+                    same = source_buffer == destination_buffer
+                else:
+                    same = source_length == destination_length and \
+                        source_buffer[:source_length] == destination_buffer[:source_length]
+
+                if not same:
+                    if not marked:
+                        fdst.truncate(source_size + 1)
+                        marked = True
+                    fdst.seek(offset)
+                    fdst.write(source_view[:source_length])
+                    written += source_length
+                offset += source_length
+
+            fdst.truncate(offset)
+            if durable:
+                fdst.flush()
+                os.fsync(fdst.fileno())
+            if self.drop_cache:
+                self.advise(fsrc, "POSIX_FADV_DONTNEED")
+                self.advise(fdst, "POSIX_FADV_DONTNEED")
+
+        shutil.copystat(source_file, destination_file)
+
+        with self.lock:
+            self.delta_bytes_written += written
+            self.delta_bytes_skipped += offset - written
+        return written
+
+    def copy_resumable(self, source_file, destination_file, offset=0, checkpoint=None, preserve_metadata=True,
+                       hasher=None, durable=False, checkpoint_size=CHECKPOINT_SIZE, sync_checkpoints=True):
+        # This function copies source_file in pieces of checkpoint_size bytes, calling checkpoint(offset) after
+        # each one with the number of bytes copied so far. With sync_checkpoints, each piece is fsynced before
+        # it is recorded, so the checkpoints hold even if the system goes down. Without it, they only hold if the
+        # sync is stopped or killed. With an offset, the first offset bytes of the destination are kept and the
+        # copy continues after them. Anything in the destination past the offset is thrown away. If a hasher is
+        # given, the first offset bytes are read from the source to hash them, so the hash still covers the
+        # whole file. With durable, the end of the file is fsynced too.
+        # A whole file is cloned with a reflink where the filesystem can, which needs no checkpoints. Otherwise
+        # each piece is copied by the fastest tier for this pair of devices, at explicit offsets.
+        with open(source_file, "rb") as fsrc:
+            self.advise(fsrc, "POSIX_FADV_SEQUENTIAL")
+            size = os.fstat(fsrc.fileno()).st_size
+            if hasher is not None:
+                buffer = self.copy_buffer()
+                remaining = offset
+                while remaining:
+                    length = fsrc.readinto(buffer[:min(len(buffer), remaining)])
+                    if not length:
+                        break
+                    hasher.update(buffer[:length])
+                    remaining -= length
+
+            with open(destination_file, "r+b" if offset else "wb") as fdst:
+                fdst.truncate(offset)
+                device_pair = (os.fstat(fsrc.fileno()).st_dev, os.fstat(fdst.fileno()).st_dev)
+                tier = None
+                if offset == 0 and hasher is None and TIER_REFLINK in self.tiers and \
+                        TIER_REFLINK not in self.unsupported.get(device_pair, ()):
+                    try:
+                        self.copy_reflink(fsrc, fdst)
+                        tier = TIER_REFLINK
+                        offset = size
+                    except UnsupportedTier:
+                        with self.lock:
+                            self.unsupported.setdefault(device_pair, set()).add(TIER_REFLINK)
+
+                while offset < size:
+                    count = min(checkpoint_size, size - offset)
+                    tier, copied = self.copy_range(fsrc, fdst, offset, count, device_pair, hasher)
+                    offset += copied
+                    if copied < count:
+                        # the source got shorter while it was being copied
+                        break
+                    if checkpoint is not None and offset < size:
+                        if sync_checkpoints:
+                            os.fsync(fdst.fileno())
+                        checkpoint(offset)
+
+                if durable:
+                    os.fsync(fdst.fileno())
+                if self.drop_cache:
+                    self.advise(fsrc, "POSIX_FADV_DONTNEED")
+                    self.advise(fdst, "POSIX_FADV_DONTNEED")
+
+        if preserve_metadata:
+            shutil.copystat(source_file, destination_file)
+        else:
+            shutil.copymode(source_file, destination_file)
+        with self.lock:
+            self.tier_counts[tier or TIER_READINTO] += 1
+
+    def copy_range(self, fsrc, fdst, offset, count, device_pair, hasher=None):
+        # Copies count bytes at offset in one open file to the same offset in another. The kernel tiers are tried
+        # first, unless a hasher needs to see the data. Returns the tier used and the number of bytes copied,
+        # which is less than count only if the source ended early.
+        if hasher is None:
+            for tier in (TIER_COPY_FILE_RANGE, TIER_SENDFILE):
+                if tier not in self.tiers or tier in self.unsupported.get(device_pair, ()):
+                    continue
+                try:
+                    return tier, self.copy_kernel_range(tier, fsrc, fdst, offset, count)
+                except UnsupportedTier:
+                    with self.lock:
+                        self.unsupported.setdefault(device_pair, set()).add(tier)
+
+        buffer = self.copy_buffer()
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        copied = 0
+        while copied < count:
+            length = fsrc.readinto(buffer[:min(len(buffer), count - copied)])
+            if not length:
+                break
+            fdst.write(buffer[:length])
+            if hasher is not None:
+                hasher.update(buffer[:length])
+            copied += length
+        fdst.flush()
+        return TIER_READINTO, copied
+
+    def copy_kernel_range(self, tier, fsrc, fdst, offset, count):
+        # Like copy_kernel, but for one range of the file at an explicit offset, so the range can be copied
+        # again from the same place if the sync is interrupted.
+        in_fd = fsrc.fileno()
+        out_fd = fdst.fileno()
+        copied = 0
+        while copied < count:
+            length = min(count - copied, KERNEL_CHUNK_SIZE)
+            try:
+                if tier == TIER_COPY_FILE_RANGE:
+                    length = os.copy_file_range(in_fd, out_fd, length, offset + copied, offset + copied)
+                else:
+                    os.lseek(out_fd, offset + copied, os.SEEK_SET)
+                    length = os.sendfile(out_fd, in_fd, offset + copied, length)
+            except OSError as e:
+                if copied == 0 and e.errno in UNSUPPORTED_ERRNOS:
+                    raise UnsupportedTier()
+                raise
+            if length == 0:
+                break
+            copied += length
+
+        # the range is inside the source, so copying nothing means the filesystem doesn't support the tier
+        if copied == 0 and count > 0:
+            raise UnsupportedTier()
+        return copied
+
+    def delta_buffers(self, block_size):
+        # Two reusable buffers per thread, one for each side of the comparison.
+        buffers = getattr(self.local, "delta_buffers", None)
+        if buffers is None or len(buffers[0]) != block_size:
+            buffers = (bytearray(block_size), bytearray(block_size))
+            self.local.delta_buffers = buffers
+        return buffers
+
+    def tier_summary(self):
+        return ", ".join("%s: %d" % (tier, self.tier_counts[tier]) for tier in COPY_TIERS if self.tier_counts[tier])
@@ -0,0 +1,366 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for comparing a source and destination tree in a single merge-join traversal.
+
+import os
+
+# Only new files of at least this size are matched with orphans to find moves. Smaller files are cheap to copy,
+# and many small files share the same size.
+MOVE_MIN_SIZE = 1000000
+
+# A renamed file keeps its modification time, so an orphan only matches a new file with the same time. Some file
+# systems (like FAT) only store times to the nearest 2 seconds, so times this close count as the same.
+MOVE_MTIME_TOLERANCE_NS = 2000000000
+
+
+class DirectoryResult:
+    # The differences found in one directory. Each directory gets its own result, so directories can be
+    # compared on several threads and the results joined in order afterwards.
+    __slots__ = ("new_files", "updated_files", "orphaned_files", "orphaned_dirs", "orphaned_subtrees",
+                 "unchanged_files", "legacy_stat_count")
+
+    def __init__(self):
+        self.new_files = []
+        self.updated_files = []
+        self.orphaned_files = []
+        self.orphaned_dirs = []
+        self.orphaned_subtrees = []
+        self.unchanged_files = []
+        self.legacy_stat_count = 0
+
+
+class TimberDiff:
+
+    def __init__(self, scanner, logger):
+        self.scanner = scanner
+        self.logger = logger
+
+        # new_files and updated_files hold source FileRecords.
+        # orphaned_files and orphaned_dirs hold destination paths relative to the destination root.
+        # orphaned_dirs is ordered children before parents, so it can be removed in order.
+        self.new_files = []
+        self.updated_files = []
+        self.orphaned_files = []
+        self.orphaned_dirs = []
+
+        # With prune_orphaned_dirs, a directory that only exists in the destination isn't walked. It is added to
+        # orphaned_subtrees instead, and the files inside it aren't listed until it is deleted.
+        self.prune_orphaned_dirs = False
+        self.orphaned_subtrees = []
+
+        # unchanged_files holds the source FileRecords of files that are already in sync.
+        # It is only filled when record_unchanged is True, because it is only needed to rebuild the manifest.
+        self.record_unchanged = False
+        self.unchanged_files = []
+
+        # destination paths that belong to Timber itself (like the manifest) and are never orphaned
+        self.excluded_paths = set()
+
+        # If set, listener is called with each directory's DirectoryResult as soon as that directory is compared,
+        # possibly from a scan worker thread. The listener may take files out of the result to handle them itself.
+        self.listener = None
+
+        # If set, consumer is called with each DirectoryResult on the thread running diff, in depth-first order,
+        # before the result is added to the lists above. Like the listener, it may take files out of the result,
+        # so the differences of a large tree never have to be held all at once.
+        self.consumer = None
+
+    def clear(self):
+        self.new_files.clear()
+        self.updated_files.clear()
+        self.orphaned_files.clear()
+        self.orphaned_dirs.clear()
+        self.orphaned_subtrees.clear()
+        self.unchanged_files.clear()
+
+    def diff(self, source, destination, ignored_directories, find_orphans=True):
+        # This function walks the source and destination trees together. Each directory that exists on both sides
+        # is listed once per side and the sorted entries are merge-joined by name, so no path is ever checked
+        # with os.path.exists. Directories that only exist in the source are walked on the source side only.
+        # Directories that only exist in the destination are walked for orphans if find_orphans is True.
+
+        # Directories are visited with the scanner's iter_tree, so they can be listed in parallel. Each result
+        # comes back in depth-first order as soon as it is ready, no matter how many scan jobs are used.
+
+        self.clear()
+
+        def visit(item):
+            # item is (relative directory, side), where side is "both", "source" or "destination"
+            rel_dir, side = item
+            result = DirectoryResult()
+            if side == "both":
+                subdirs = self.diff_directory(source, destination, rel_dir, ignored_directories, find_orphans, result)
+            elif side == "source":
+                subdirs = self.diff_source_directory(source, rel_dir, ignored_directories, result)
+            else:
+                subdirs = self.diff_orphaned_directory(destination, rel_dir, ignored_directories, result)
+            if self.listener is not None:
+                self.listener(result)
+            return result, subdirs
+
+        legacy_stat_count = 0
+        for result in self.scanner.iter_tree(visit, ("", "both")):
+            if self.consumer is not None:
+                self.consumer(result)
+            self.new_files.extend(result.new_files)
+            self.updated_files.extend(result.updated_files)
+            self.orphaned_files.extend(result.orphaned_files)
+            self.orphaned_dirs.extend(result.orphaned_dirs)
+            self.orphaned_subtrees.extend(result.orphaned_subtrees)
+            self.unchanged_files.extend(result.unchanged_files)
+            legacy_stat_count += result.legacy_stat_count
+        self.scanner.legacy_stat_count += legacy_stat_count
+
+        # orphaned directories were found parents first, so reverse them to remove children first
+        self.orphaned_dirs.reverse()
+
+    def diff_manifest(self, source, manifest_records, ignored_directories):
+        # This function compares the source tree with a manifest of the destination instead of walking the
+        # destination. manifest_records maps normalized relative paths to the FileRecords Timber last synced.
+        # Orphans are always found, because they cost nothing here and the manifest needs them.
+
+        self.clear()
+
+        source_files, source_dirs = self.scanner.scan(source, ignored_directories)
+        source_keys = set()
+
+        for rel_path, source_record in source_files.items():
+            key = os.path.normcase(rel_path)
+            source_keys.add(key)
+            manifest_record = manifest_records.get(key)
+
+            # the old analysis checked exists and stat'd both sides (or the source only, for new files)
+            self.scanner.legacy_stat_count += 3 if manifest_record is None else 5
+
+            if manifest_record is None or manifest_record.size < 0:
+                self.new_files.append(source_record)
+            elif source_record.mtime_ns != manifest_record.mtime_ns or source_record.size != manifest_record.size:
+                self.updated_files.append(source_record)
+            else:
+                self.unchanged_files.append(source_record)
+
+        source_keys.update(os.path.normcase(rel_path) for rel_path in source_dirs)
+
+        orphaned_dirs = set()
+        for key, manifest_record in manifest_records.items():
+            if key in source_keys or self.is_ignored_path(manifest_record.rel_path, ignored_directories):
+                continue
+            self.orphaned_files.append(manifest_record.rel_path)
+
+            # any parent directory that is no longer in the source is orphaned too
+            parent = os.path.dirname(manifest_record.rel_path)
+            while parent and os.path.normcase(parent) not in source_keys and parent not in orphaned_dirs:
+                orphaned_dirs.add(parent)
+                parent = os.path.dirname(parent)
+
+        # sort deepest first, so children are removed before their parents
+        self.orphaned_dirs.extend(sorted(orphaned_dirs, key=lambda path: (-path.count(os.sep), path)))
+
+    def find_moves(self, source, destination, manifest_records=None, hash_file=None, manifest_hashes=None):
+        # This function matches new source files with orphaned destination files that hold the same data, so the
+        # orphans can be renamed instead of copying the new files and deleting the orphans. It returns a list of
+        # (orphan path, new file's FileRecord) and takes the matched files out of new_files and orphaned_files.
+        # Files are matched by size, then:
+        # - if the orphan is in manifest_records, by the source modification time recorded for it
+        # - otherwise, by the orphan's own modification time, which a rename keeps. Files Timber copied as new files
+        #   don't keep the source's time, so without a manifest they can only be matched with hash_file.
+        # Without hash_file, a file is only matched if there is exactly one candidate on each side. With hash_file
+        # (a function that returns a file's digest), every candidate is hashed and files are matched by digest.
+        # An orphan with a digest in manifest_hashes (saved by a verified sync) isn't read again.
+        candidates = {}
+        for record in self.new_files:
+            if record.size >= MOVE_MIN_SIZE:
+                candidates.setdefault(record.size, ([], []))[0].append(record)
+        if not candidates:
+            return []
+
+        for rel_path in self.orphaned_files:
+            manifest_record = manifest_records.get(os.path.normcase(rel_path)) if manifest_records else None
+            if manifest_record is not None and manifest_record.size >= 0:
+                orphan = (rel_path, manifest_record.size, manifest_record.mtime_ns, True)
+            else:
+                self.scanner.stat_count += 1
+                try:
+                    st = os.stat(os.path.join(destination, rel_path))
+                except OSError:
+                    continue
+                orphan = (rel_path, st.st_size, st.st_mtime_ns, False)
+            if orphan[1] in candidates:
+                candidates[orphan[1]][1].append(orphan)
+
+        moves = []
+        for size, (new_records, orphans) in candidates.items():
+            if not orphans:
+                continue
+            if hash_file is not None:
+                orphans_by_hash = {}
+                for orphan in orphans:
+                    digest = manifest_hashes.get(os.path.normcase(orphan[0])) if manifest_hashes and orphan[3] else None
+                    if digest is None:
+                        digest = self.hash_or_none(hash_file, os.path.join(destination, orphan[0]))
+                    if digest is not None:
+                        orphans_by_hash.setdefault(digest, []).append(orphan)
+                for record in new_records:
+                    matching = orphans_by_hash.get(self.hash_or_none(hash_file, os.path.join(source, record.rel_path)))
+                    if matching:
+                        moves.append((matching.pop()[0], record))
+            else:
+                for record in new_records:
+                    matching = [orphan for orphan in orphans if self.could_be_copy(orphan, record)]
+                    if len(matching) == 1 and \
+                            sum(1 for other in new_records if self.could_be_copy(matching[0], other)) == 1:
+                        orphans.remove(matching[0])
+                        moves.append((matching[0][0], record))
+
+        moved_orphans = set(orphan for orphan, record in moves)
+        moved_files = set(record.rel_path for orphan, record in moves)
+        self.orphaned_files = [rel_path for rel_path in self.orphaned_files if rel_path not in moved_orphans]
+        self.new_files = [record for record in self.new_files if record.rel_path not in moved_files]
+        return moves
+
+    def could_be_copy(self, orphan, record):
+        rel_path, size, mtime_ns, from_manifest = orphan
+        if from_manifest:
+            return mtime_ns == record.mtime_ns
+        return abs(mtime_ns - record.mtime_ns) <= MOVE_MTIME_TOLERANCE_NS
+
+    def hash_or_none(self, hash_file, path):
+        try:
+            return hash_file(path)
+        except OSError as e:
+            self.logger.log("Could not read %s to look for moved files: %s" % (path, e))
+            return None
+
+    def is_ignored_path(self, rel_path, ignored_directories):
+        # Returns True if the file at rel_path, or any directory it is in, is ignored.
+        if self.scanner.is_ignored_file(os.path.basename(rel_path), rel_path, ignored_directories):
+            return True
+        parent = os.path.dirname(rel_path)
+        while parent:
+            if self.scanner.is_ignored(os.path.basename(parent), parent, ignored_directories):
+                return True
+            parent = os.path.dirname(parent)
+        return False
+
+    def diff_directory(self, source, destination, rel_dir, ignored_directories, find_orphans, result):
+        # Merge-join one directory that exists on both sides. Returns the subdirectories to visit next.
+        source_entries = self.scanner.list_directory(os.path.join(source, rel_dir) if rel_dir else source)
+        destination_entries = self.scanner.list_directory(
+            os.path.join(destination, rel_dir) if rel_dir else destination)
+        subdirs = []
+
+        i = 0
+        j = 0
+        while i < len(source_entries) or j < len(destination_entries):
+            source_key = os.path.normcase(source_entries[i].name) if i < len(source_entries) else None
+            destination_key = os.path.normcase(destination_entries[j].name) if j < len(destination_entries) else None
+
+            if destination_key is None or (source_key is not None and source_key < destination_key):
+                # only in the source
+                entry = source_entries[i]
+                i += 1
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if self.scanner.entry_is_dir(entry):
+                    if not self.scanner.is_ignored(entry.name, rel_path, ignored_directories) \
+                            and not entry.is_symlink():
+                        subdirs.append((rel_path, "source"))
+                elif not self.scanner.is_ignored_file(entry.name, rel_path, ignored_directories):
+                    self.add_new_file(entry, rel_path, result)
+
+            elif source_key is None or destination_key < source_key:
+                # only in the destination
+                entry = destination_entries[j]
+                j += 1
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if self.scanner.entry_is_dir(entry):
+                    if find_orphans and not self.scanner.is_ignored(entry.name, rel_path, ignored_directories):
+                        result.legacy_stat_count += 1
+                        if self.prune_orphaned_dirs and not entry.is_symlink():
+                            result.orphaned_subtrees.append(rel_path)
+                        else:
+                            result.orphaned_dirs.append(rel_path)
+                            if not entry.is_symlink():
+                                subdirs.append((rel_path, "destination"))
+                elif find_orphans and rel_path not in self.excluded_paths \
+                        and not self.scanner.is_ignored_file(entry.name, rel_path, ignored_directories):
+                    result.legacy_stat_count += 1
+                    result.orphaned_files.append(rel_path)
+
+            else:
+                # on both sides
+                source_entry = source_entries[i]
+                destination_entry = destination_entries[j]
+                i += 1
+                j += 1
+                rel_path = os.path.join(rel_dir, source_entry.name) if rel_dir else source_entry.name
+                source_is_dir = self.scanner.entry_is_dir(source_entry)
+                destination_is_dir = self.scanner.entry_is_dir(destination_entry)
+
+                if source_is_dir != destination_is_dir:
+                    msg = "Error: %s is a file on one side and a directory on the other. Skipping." % rel_path
+                    print(msg), self.logger.log(msg)
+                elif source_is_dir:
+                    if find_orphans:
+                        result.legacy_stat_count += 1
+                    if not self.scanner.is_ignored(source_entry.name, rel_path, ignored_directories) \
+                            and not source_entry.is_symlink():
+                        subdirs.append((rel_path, "both"))
+                elif not self.scanner.is_ignored_file(source_entry.name, rel_path, ignored_directories):
+                    self.compare_files(source_entry, destination_entry, rel_path, find_orphans, result)
+
+        return subdirs
+
+    def diff_source_directory(self, source, rel_dir, ignored_directories, result):
+        # Every file in a directory that only exists in the source is new.
+        subdirs = []
+        for entry in self.scanner.list_directory(os.path.join(source, rel_dir)):
+            rel_path = os.path.join(rel_dir, entry.name)
+            if self.scanner.entry_is_dir(entry):
+                if not self.scanner.is_ignored(entry.name, rel_path, ignored_directories) and not entry.is_symlink():
+                    subdirs.append((rel_path, "source"))
+            elif not self.scanner.is_ignored_file(entry.name, rel_path, ignored_directories):
+                self.add_new_file(entry, rel_path, result)
+        return subdirs
+
+    def diff_orphaned_directory(self, destination, rel_dir, ignored_directories, result):
+        # Every file and directory inside a directory that only exists in the destination is orphaned.
+        subdirs = []
+        for entry in self.scanner.list_directory(os.path.join(destination, rel_dir)):
+            rel_path = os.path.join(rel_dir, entry.name)
+            result.legacy_stat_count += 1
+            if self.scanner.entry_is_dir(entry):
+                if self.scanner.is_ignored(entry.name, rel_path, ignored_directories):
+                    continue
+                result.orphaned_dirs.append(rel_path)
+                if not entry.is_symlink():
+                    subdirs.append((rel_path, "destination"))
+            elif not self.scanner.is_ignored_file(entry.name, rel_path, ignored_directories):
+                result.orphaned_files.append(rel_path)
+        return subdirs
+
+    def add_new_file(self, entry, rel_path, result):
+        record = self.scanner.stat_entry(entry, rel_path)
+        if record is not None:
+            # the old analysis checked exists twice, then getsize on the source file
+            result.legacy_stat_count += 3
+            result.new_files.append(record)
+
+    def compare_files(self, source_entry, destination_entry, rel_path, find_orphans, result):
+        # If the source file is newer than the destination file, mark it for update.
+        # If the source and destination file have the same timestamp, but the sizes are different,
+        # mark it for update.
+        source_record = self.scanner.stat_entry(source_entry, rel_path)
+        if source_record is None:
+            return
+        destination_record = self.scanner.stat_entry(destination_entry, rel_path)
+        if destination_record is None:
+            return
+
+        # the old analysis checked exists, then getmtime and getsize on both files,
+        # and checked exists again on the source when looking for files to delete
+        result.legacy_stat_count += 6 if find_orphans else 5
+
+        if source_record.mtime_ns > destination_record.mtime_ns or source_record.size != destination_record.size:
+            result.updated_files.append(source_record)
+        elif self.record_unchanged:
+            result.unchanged_files.append(source_record)
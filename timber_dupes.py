@@ -0,0 +1,242 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for finding duplicate files in a directory tree.
+
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from tqdm import tqdm
+from timber_copy import new_hasher
+from timber_exclude import compile_excludes
+from timber_logger import TimberLogger
+from timber_scanner import TimberScanner
+
+DUPES_VERSION = 1
+
+# Files of the same size are first compared by a hash of their first and last PARTIAL_HASH_SIZE bytes. Files up to
+# twice that size are read whole by that hash, so only larger files are ever hashed in full.
+PARTIAL_HASH_SIZE = 64 * 1024
+
+# The buffer size used to hash whole files.
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# The number of files sent to each hashing process at a time.
+HASH_CHUNK_SIZE = 16
+
+# What a sync using a duplicates report does with a new file that duplicates one already in the destination:
+# hard link it to that file, or leave it out of the destination.
+DUPLICATES_LINK = "link"
+DUPLICATES_SKIP = "skip"
+DUPLICATE_ACTIONS = (DUPLICATES_LINK, DUPLICATES_SKIP)
+
+
+def partial_hash(path, size):
+    # Returns the hex digest of the first and last PARTIAL_HASH_SIZE bytes of a file, or None if it can't be read.
+    hasher = new_hasher()
+    try:
+        with open(path, "rb") as f:
+            if size <= 2 * PARTIAL_HASH_SIZE:
+                hasher.update(f.read())
+            else:
+                hasher.update(f.read(PARTIAL_HASH_SIZE))
+                f.seek(size - PARTIAL_HASH_SIZE)
+                hasher.update(f.read(PARTIAL_HASH_SIZE))
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+
+def full_hash(path):
+    # Returns the hex digest of a whole file, or None if it can't be read. It runs in the hashing processes, so it
+    # can't use the copy backend's per-thread buffers.
+    hasher = new_hasher()
+    buffer = memoryview(bytearray(HASH_BUFFER_SIZE))
+    try:
+        with open(path, "rb") as f:
+            while True:
+                length = f.readinto(buffer)
+                if not length:
+                    break
+                hasher.update(buffer[:length])
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+
+class TimberDupes:
+    # Finds files with the same contents in three stages, each only looking at the files the last one couldn't
+    # tell apart: files are grouped by size, then by a hash of their ends, then by a hash of the whole file.
+    # Most files have a unique size or unique ends, so most files are never read, and only the files that still
+    # match are read in full, on a pool of processes.
+
+    def __init__(self, logger=None):
+        self.logger = logger or TimberLogger()
+        self.logger.log("Timber Dupes initialized.")
+        self.scanner = TimberScanner(self.logger)
+
+        # jobs is the number of files hashed at the same time. Files smaller than min_size are left out, so empty
+        # files aren't reported as duplicates of each other.
+        self.jobs = 1
+        self.min_size = 1
+
+        # Files and directories matching exclude_patterns or the rules in the exclude_from file are left out,
+        # like they are in a sync.
+        self.exclude_patterns = []
+        self.exclude_from = ""
+
+        # the number of files at each stage, for the summary
+        self.files_scanned = 0
+        self.files_partially_hashed = 0
+        self.files_fully_hashed = 0
+
+    def find(self, directory, ignored_directories):
+        # This function returns the groups of duplicate files under directory as a list of (size, hash, records),
+        # where records are the FileRecords of the files in the group, largest wasted space first. Hard links to
+        # the same file are already sharing their data, so only one of them is considered.
+        files, dirs = self.scanner.scan(directory, ignored_directories)
+        self.files_scanned = len(files)
+
+        by_size = {}
+        inodes = set()
+        for record in files.values():
+            if record.size < self.min_size:
+                continue
+            if record.inode:
+                if (record.size, record.inode) in inodes:
+                    continue
+                inodes.add((record.size, record.inode))
+            by_size.setdefault(record.size, []).append(record)
+        del files, inodes
+
+        candidates = [group for group in by_size.values() if len(group) > 1]
+        del by_size
+
+        # compare the ends of files with the same size
+        records = [record for group in candidates for record in group]
+        self.files_partially_hashed = len(records)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            hashes = self.hash_all(pool.map(partial_hash, [os.path.join(directory, record.rel_path)
+                                                           for record in records],
+                                            [record.size for record in records]),
+                                   len(records), "Comparing the ends of files")
+        groups = self.group_by_hash(records, hashes)
+
+        # Files up to twice PARTIAL_HASH_SIZE were read whole, so their groups are final. The others are hashed in
+        # full, and split again.
+        duplicates = [(size, digest, group) for size, digest, group in groups if size <= 2 * PARTIAL_HASH_SIZE]
+        records = [record for size, digest, group in groups if size > 2 * PARTIAL_HASH_SIZE for record in group]
+        self.files_fully_hashed = len(records)
+        if records:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                hashes = self.hash_all(pool.map(full_hash, [os.path.join(directory, record.rel_path)
+                                                            for record in records], chunksize=HASH_CHUNK_SIZE),
+                                       len(records), "Comparing whole files")
+            duplicates.extend(self.group_by_hash(records, hashes))
+
+        duplicates.sort(key=lambda group: (-group[0] * (len(group[2]) - 1), group[2][0].rel_path))
+        return duplicates
+
+    def hash_all(self, results, count, description):
+        print("%s..." % description)
+        hashes = []
+        with tqdm(total=count, unit="file") as pbar:
+            for digest in results:
+                hashes.append(digest)
+                pbar.update(1)
+        return hashes
+
+    def group_by_hash(self, records, hashes):
+        # Groups records by (size, hash) and returns the groups with more than one file as (size, hash, records).
+        # Files that couldn't be read have no hash and are left out.
+        groups = {}
+        for record, digest in zip(records, hashes):
+            if digest is not None:
+                groups.setdefault((record.size, digest), []).append(record)
+        return [(size, digest, sorted(group, key=lambda record: record.rel_path))
+                for (size, digest), group in groups.items() if len(group) > 1]
+
+    def save(self, path, directory, duplicates):
+        # Writes the duplicates as JSON. Each file is saved with its modification time, so a sync using the report
+        # can tell whether a file has changed since it was hashed.
+        report = {
+            "timber_dupes": DUPES_VERSION,
+            "directory": directory,
+            "groups": [{"size": size, "hash": digest,
+                        "files": [[record.rel_path, record.mtime_ns] for record in group]}
+                       for size, digest, group in duplicates],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+    def dupes(self, directory, output, ignored_directories=""):
+        # This function finds the duplicate files under directory, prints a summary and saves them to output.
+        if not os.path.isdir(directory):
+            msg = "Invalid source directory. Exiting..."
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        try:
+            ignored = compile_excludes(ignored_directories, self.exclude_patterns, self.exclude_from)
+        except (OSError, UnicodeDecodeError, re.error) as e:
+            msg = "Could not read the exclude rules: %s. Exiting..." % e
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        print("Looking for duplicate files in %s..." % directory)
+        duplicates = self.find(directory, ignored)
+
+        wasted = sum(size * (len(group) - 1) for size, digest, group in duplicates)
+        msg = "Found %d groups of duplicate files, with %d copies taking up %d bytes that could be saved.\n" \
+              "Scanned %d files, compared the ends of %d and hashed %d in full." \
+              % (len(duplicates), sum(len(group) - 1 for size, digest, group in duplicates), wasted,
+                 self.files_scanned, self.files_partially_hashed, self.files_fully_hashed)
+        print(msg), self.logger.log(msg)
+
+        try:
+            self.save(output, directory, duplicates)
+        except OSError as e:
+            msg = "Could not write the duplicates to %s: %s. Exiting..." % (output, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        print("Duplicates saved to %s" % output)
+        self.logger.close_log()
+
+
+class DuplicateIndex:
+    # The groups of a saved duplicates report, looked up by relative path. A sync uses it to hard link or skip
+    # files that are duplicates of a file it has already copied.
+
+    def __init__(self):
+        self.directory = ""
+
+        # files maps each normalized relative path to (group number, mtime_ns when it was hashed).
+        # groups holds (size, relative paths) for each group number.
+        self.files = {}
+        self.groups = []
+
+    def load(self, path):
+        # Raises ValueError if the file isn't a duplicates report.
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        if report.get("timber_dupes") != DUPES_VERSION:
+            raise ValueError("%s is not a Timber duplicates report" % path)
+        self.directory = report["directory"]
+        self.files.clear()
+        self.groups = []
+        for group_number, group in enumerate(report["groups"]):
+            self.groups.append((group["size"], [rel_path for rel_path, mtime_ns in group["files"]]))
+            for rel_path, mtime_ns in group["files"]:
+                self.files[os.path.normcase(rel_path)] = (group_number, mtime_ns)
+
+    def contains(self, rel_path):
+        return os.path.normcase(rel_path) in self.files
+
+    def group_of(self, rel_path, mtime_ns):
+        # Returns the group number of a file, or None if it isn't a duplicate or has changed since it was hashed.
+        entry = self.files.get(os.path.normcase(rel_path))
+        if entry is None or entry[1] != mtime_ns:
+            return None
+        return entry[0]
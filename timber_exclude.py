@@ -0,0 +1,185 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for matching files and directories against Timber's exclude rules.
+
+import os
+import re
+
+# characters that make a rule a glob pattern instead of a literal name or path
+GLOB_CHARACTERS = "*?["
+
+
+def is_literal(text):
+    return not any(character in text for character in GLOB_CHARACTERS)
+
+
+def glob_to_regex(pattern):
+    # This function translates a gitignore style glob into a regular expression for paths with forward slashes.
+    # * and ? never match a slash, **/ matches any number of directories (including none), a trailing /** matches
+    # everything inside a directory, and [...] is a character class ([!...] is negated).
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                parts.append("\\[")
+                i += 1
+                continue
+            characters = pattern[i + 1:j].replace("\\", "\\\\")
+            if characters[0] in "!^":
+                characters = "^" + characters[1:]
+            parts.append("[%s]" % characters)
+            i = j + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+def compile_excludes(ignored_directories="", patterns=(), rules_file=""):
+    # This function builds and compiles an ExcludeMatcher from Timber's options: the comma separated ignored
+    # directories (with $RECYCLE.BIN), then the patterns, then the rules in rules_file. Raises OSError or
+    # UnicodeDecodeError if the file can't be read, and re.error if a pattern is invalid.
+    matcher = ExcludeMatcher()
+    if ignored_directories != "":
+        for path in ignored_directories.split(","):
+            matcher.add_directory(path)
+        matcher.add_directory("$RECYCLE.BIN")
+    for pattern in patterns:
+        matcher.add_rule(pattern)
+    if rules_file:
+        matcher.load(rules_file)
+    matcher.compile()
+    return matcher
+
+
+class ExcludeMatcher:
+    # Decides which files and directories a sync leaves alone, from gitignore style rules:
+    #   name         excludes files and directories with this name, at any depth
+    #   dir/name     excludes this path, relative to the root of the sync (a leading / means the same)
+    #   name/        only matches directories
+    #   !rule        includes what an earlier rule excluded
+    #   *, ?, [abc]  match within one name, and ** matches across directories (**/name, dir/**, a/**/b)
+    # The last rule that matches decides. An excluded directory is never listed, so nothing in it can be included
+    # again. compile sorts the rules by shape so the common ones cost a dictionary lookup however many there are:
+    # literal names and paths are looked up whole, *.ext globs by the name's endings, and path globs that start
+    # with a literal directory only by the paths under that directory. The remaining globs are joined into one
+    # regular expression per kind, which the regex engine still tries one alternative at a time.
+
+    def __init__(self):
+        # each rule is (pattern, include, directory only, anchored to the root, literal)
+        self.rules = []
+        self.compiled = False
+        self.has_file_rules = False
+
+    def add_rule(self, line):
+        # Adds one rule written like a line of a .gitignore file. Blank lines and lines starting with # are skipped.
+        line = line.rstrip("\r\n").rstrip(" ")
+        if not line or line.startswith("#"):
+            return
+        include = line.startswith("!")
+        if include:
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            return
+        self.rules.append((line, include, directory_only, anchored, is_literal(line)))
+        self.compiled = False
+
+    def add_directory(self, path):
+        # Adds a directory name or path to ignore, as given with -i. These are never treated as globs.
+        path = path.replace("\\", "/").strip("/")
+        if path:
+            self.rules.append((path, False, True, "/" in path, True))
+            self.compiled = False
+
+    def load(self, path):
+        # Adds the rules in a file, one per line. Raises OSError if the file can't be read.
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                self.add_rule(line)
+
+    def compile(self):
+        # Each table is a pair, for files and for directories. Dictionaries map a literal name, path or ending to
+        # the index of the last rule with it, since a later rule overwrites an earlier one. The other globs are
+        # joined into one alternation per kind (and per first directory, for path globs), newest rule first, so
+        # the first alternative that matches is the rule that decides, and its group name gives its index.
+        self.names = ({}, {})
+        self.paths = ({}, {})
+        self.endings = ({}, {})
+        name_globs = ([], [])
+        path_globs = ({}, {})
+        for index, (pattern, include, directory_only, anchored, literal) in enumerate(self.rules):
+            for is_dir in ((True,) if directory_only else (False, True)):
+                if literal:
+                    (self.paths if anchored else self.names)[is_dir][pattern] = index
+                elif not anchored and pattern.startswith("*.") and is_literal(pattern[1:]):
+                    self.endings[is_dir][pattern[1:]] = index
+                elif anchored:
+                    # globs under a literal first directory are only tried on paths under it
+                    first = pattern.split("/", 1)[0]
+                    path_globs[is_dir].setdefault(first if is_literal(first) else None, []).insert(
+                        0, "(?P<r%d>%s)" % (index, glob_to_regex(pattern)))
+                else:
+                    name_globs[is_dir].insert(0, "(?P<r%d>%s)" % (index, glob_to_regex(pattern)))
+
+        self.name_regexes = tuple(re.compile("|".join(globs)) if globs else None for globs in name_globs)
+        self.path_regexes = tuple(dict((first, re.compile("|".join(globs))) for first, globs in by_first.items())
+                                  for by_first in path_globs)
+        self.has_file_rules = bool(self.names[False] or self.paths[False] or self.endings[False] or
+                                   name_globs[False] or path_globs[False])
+        self.compiled = True
+
+    def match_regex(self, regex, text, rule):
+        if regex is not None:
+            match = regex.fullmatch(text)
+            if match:
+                return max(rule, int(match.lastgroup[1:]))
+        return rule
+
+    def excluded(self, name, rel_path, is_dir):
+        # Returns True if the file or directory at rel_path (relative to the root of the sync) is excluded.
+        if not self.compiled:
+            self.compile()
+        if not is_dir and not self.has_file_rules:
+            return False
+        if os.sep != "/":
+            rel_path = rel_path.replace(os.sep, "/")
+
+        rule = max(self.names[is_dir].get(name, -1), self.paths[is_dir].get(rel_path, -1))
+        endings = self.endings[is_dir]
+        if endings:
+            # *.gz matches any name ending in .gz, so each ending of the name is looked up, from each dot
+            start = name.find(".")
+            while start >= 0:
+                rule = max(rule, endings.get(name[start:], -1))
+                start = name.find(".", start + 1)
+        rule = self.match_regex(self.name_regexes[is_dir], name, rule)
+        path_regexes = self.path_regexes[is_dir]
+        if path_regexes:
+            rule = self.match_regex(path_regexes.get(rel_path.split("/", 1)[0]), rel_path, rule)
+            rule = self.match_regex(path_regexes.get(None), rel_path, rule)
+        return rule >= 0 and not self.rules[rule][1]
@@ -0,0 +1,283 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for running several Timber syncs at the same time from a job file.
+
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from timber_copy import CopyBudget, DEFAULT_MAX_IN_FLIGHT_BYTES, DEFAULT_FILES_PER_JOB
+
+JOBS_VERSION = 1
+
+# The limits used when the job file doesn't set them. Each device (a disk, or a network share) copies at most
+# DEFAULT_DEVICE_COPIES files and DEFAULT_DEVICE_IN_FLIGHT_MB megabytes at a time, whichever jobs they are for,
+# and all jobs together copy at most DEFAULT_MAX_COPIES files and DEFAULT_MAX_IN_FLIGHT_MB megabytes.
+DEFAULT_MAX_COPIES = 4 * DEFAULT_FILES_PER_JOB
+DEFAULT_MAX_IN_FLIGHT_MB = 4 * DEFAULT_MAX_IN_FLIGHT_BYTES // 1000000
+DEFAULT_DEVICE_COPIES = DEFAULT_FILES_PER_JOB
+DEFAULT_DEVICE_IN_FLIGHT_MB = DEFAULT_MAX_IN_FLIGHT_BYTES // 1000000
+
+# Options that apply to the whole run, so they are given on the command line instead of for each job.
+RUN_OPTIONS = ("catalog", "dupes", "job_file", "log_dir", "keep_logs", "quiet_log")
+
+
+def job_arguments(options):
+    # This function turns a job's options into command line arguments, so each job is read by the same parser
+    # as a single sync. Each key is the name of a long option with - written as _, like "exclude_from".
+    # true adds a flag, a list repeats the option, and false or null leaves it out.
+    arguments = []
+    for key, value in options.items():
+        option = "--" + key.replace("_", "-")
+        if value is True:
+            arguments.append(option)
+        elif isinstance(value, list):
+            for item in value:
+                arguments.extend((option, str(item)))
+        elif value is not False and value is not None:
+            arguments.extend((option, str(value)))
+    return arguments
+
+
+def device_of(path):
+    # Returns the device a path is on. A destination that doesn't exist yet will be on the device of the
+    # nearest directory above it that does.
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class JobLogger:
+    # Writes a job's lines to the run's log, starting with the job's name. The run's log is closed by
+    # TimberJobs once every job has finished, so close_log does nothing here.
+
+    def __init__(self, logger, name):
+        self.logger = logger
+        self.path = logger.path
+        self.prefix = "[%s] " % name
+
+    def log(self, message, *args):
+        if args:
+            self.logger.log(self.prefix.replace("%", "%%") + message, *args)
+        else:
+            self.logger.log(self.prefix + message)
+
+    def detail(self, message, *args):
+        if self.logger.verbose:
+            self.log(message, *args)
+
+    def close_log(self):
+        pass
+
+
+class JobCopyBudget:
+    # The copy budget of one job: a copy has to fit in the budget of each device the job reads or writes, and
+    # in the budget shared by all jobs. The budgets are always taken in the same order (devices by number, then
+    # the shared one), so two jobs can never each hold a budget the other is waiting for.
+
+    def __init__(self, budgets):
+        self.budgets = budgets
+
+    def acquire(self, size):
+        for budget in self.budgets:
+            budget.acquire(size)
+
+    def release(self, size):
+        for budget in reversed(self.budgets):
+            budget.release(size)
+
+
+class TimberJobs:
+    # Runs the syncs in a job file at the same time, in one process. Each job is a TimberSync with its own
+    # options, and they all share one log. Copies are limited across all jobs and per device, so jobs on
+    # different disks run at full speed while jobs on the same disk take turns instead of thrashing it.
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.logger.log("Timber Jobs initialized.")
+
+        # parallel is the number of jobs run at the same time, or 0 for all of them
+        self.parallel = 0
+        self.max_copies = DEFAULT_MAX_COPIES
+        self.max_in_flight_bytes = DEFAULT_MAX_IN_FLIGHT_MB * 1000000
+        self.device_copies = DEFAULT_DEVICE_COPIES
+        self.device_in_flight_bytes = DEFAULT_DEVICE_IN_FLIGHT_MB * 1000000
+
+        # If metrics_out is set, every job is measured and one JSON report for all of them is saved to it.
+        self.metrics_out = ""
+
+        # each job is a dictionary with its name, sync and arguments, and its status and time once it has run
+        self.jobs = []
+
+    def load(self, path):
+        # This function reads the limits from a job file and returns its jobs as a list of (name, options). The
+        # file is JSON, like:
+        #   {"parallel": 4, "max_copies": 16, "max_in_flight_mb": 1024, "device_copies": 4,
+        #    "device_in_flight_mb": 256,
+        #    "jobs": [{"name": "photos", "source": "D:\\Photos", "destination": "E:\\Photos", "delete": true}]}
+        # Every setting but jobs is optional. Each job takes the same options as a single sync.
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                job_file = json.load(f)
+            self.parallel = int(job_file.get("parallel", self.parallel))
+            self.max_copies = int(job_file.get("max_copies", self.max_copies))
+            self.max_in_flight_bytes = int(job_file.get("max_in_flight_mb", DEFAULT_MAX_IN_FLIGHT_MB)) * 1000000
+            self.device_copies = int(job_file.get("device_copies", self.device_copies))
+            self.device_in_flight_bytes = int(job_file.get("device_in_flight_mb", DEFAULT_DEVICE_IN_FLIGHT_MB)) \
+                * 1000000
+            jobs = []
+            for number, options in enumerate(job_file["jobs"], 1):
+                options = dict(options)
+                name = str(options.pop("name", "job %d" % number))
+                for option in RUN_OPTIONS:
+                    if option in options:
+                        raise ValueError("%s can't be set for a job (job %s)" % (option, name))
+                jobs.append((name, options))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            msg = "Could not load the job file %s: %s. Exiting..." % (path, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+
+        if not jobs:
+            msg = "The job file %s has no jobs. Exiting..." % path
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        return jobs
+
+    def add(self, name, sync, source, destination, ignored_directories, delete_preference):
+        # Two jobs writing to the same destination would undo each other's work.
+        for job in self.jobs:
+            if destination and job["destination"] and \
+                    os.path.abspath(job["destination"]) == os.path.abspath(destination):
+                msg = "Jobs %s and %s both sync to %s. Exiting..." % (job["name"], name, destination)
+                print(msg), self.logger.log(msg)
+                sys.exit(1)
+        self.jobs.append({"name": name, "sync": sync, "source": source, "destination": destination,
+                          "ignored_directories": ignored_directories, "delete_preference": delete_preference,
+                          "status": "not run", "seconds": 0.0})
+
+    def set_budgets(self):
+        # Gives each job a copy budget made of the budgets of the devices it reads and writes, and the budget
+        # shared by all jobs.
+        shared = CopyBudget(self.max_in_flight_bytes, max(self.max_copies, 1))
+        devices = {}
+        for job in self.jobs:
+            budgets = []
+            for device in sorted(set(device_of(path) for path in (job["source"], job["destination"]) if path)
+                                 - {None}):
+                if device not in devices:
+                    devices[device] = CopyBudget(self.device_in_flight_bytes, max(self.device_copies, 1))
+                budgets.append(devices[device])
+            budgets.append(shared)
+            job["sync"].copy_budget = JobCopyBudget(budgets)
+        return len(devices)
+
+    def run_job(self, job):
+        sync = job["sync"]
+        start = time.perf_counter()
+        msg = "Starting job %s: %s to %s" % (job["name"], job["source"], job["destination"])
+        print(msg), self.logger.log(msg)
+        try:
+            sync.sync(job["source"], job["destination"], job["ignored_directories"], job["delete_preference"])
+            job["status"] = "complete"
+        except SystemExit:
+            # the sync has already printed and logged why it stopped
+            job["status"] = "failed"
+        except Exception as e:
+            job["status"] = "failed"
+            msg = "Job %s failed: %s" % (job["name"], e)
+            print(msg), self.logger.log(msg)
+            self.logger.log(traceback.format_exc())
+        job["seconds"] = time.perf_counter() - start
+        msg = "Job %s %s in %.1f s." % (job["name"], job["status"], job["seconds"])
+        print(msg), self.logger.log(msg)
+
+    def run(self):
+        # This function runs every job, prints and logs a combined summary, and returns True if they all
+        # completed.
+        device_count = self.set_budgets()
+        for job in self.jobs:
+            job["sync"].record_metrics = bool(self.metrics_out)
+        parallel = self.parallel if self.parallel > 0 else len(self.jobs)
+        msg = "Running %d jobs, %d at a time, on %d devices." % (len(self.jobs), min(parallel, len(self.jobs)),
+                                                                  device_count)
+        print(msg), self.logger.log(msg)
+
+        started = time.time()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            list(pool.map(self.run_job, self.jobs))
+        seconds = time.perf_counter() - start
+
+        self.print_summary(seconds)
+        self.metrics_save(started, seconds)
+        print("See %s for additional details." % self.logger.path)
+        self.logger.close_log()
+        return all(job["status"] == "complete" for job in self.jobs)
+
+    def print_summary(self, seconds):
+        lines = ["All jobs finished in %.1f s." % seconds]
+        totals = {}
+        for job in self.jobs:
+            counts = job["sync"].counts if job["status"] == "complete" else {}
+            for key, count in counts.items():
+                totals[key] = totals.get(key, 0) + count
+            lines.append("%s: %s in %.1f s | %s" % (job["name"], job["status"], job["seconds"],
+                                                    self.format_counts(counts)))
+        complete = sum(job["status"] == "complete" for job in self.jobs)
+        lines.append("%d of %d jobs complete | %s" % (complete, len(self.jobs), self.format_counts(totals)))
+        msg = "\n".join(lines) + "\n"
+        print(msg), self.logger.log(msg)
+
+    def format_counts(self, counts):
+        return "%d files copied | %d files updated | %d files moved | %d files deleted" \
+               % (counts.get("copied", 0), counts.get("updated", 0), counts.get("moved", 0), counts.get("deleted", 0))
+
+    def metrics_save(self, started, seconds):
+        # This function saves one report with each job's metrics report and the totals of all of them.
+        if not self.metrics_out:
+            return
+        jobs = []
+        files = bytes_read = bytes_written = 0
+        for job in self.jobs:
+            report = job["sync"].metrics_report
+            if report is not None:
+                files += report["copy"]["files"]
+                bytes_read += report["copy"]["bytes_read"]
+                bytes_written += report["copy"]["bytes_written"]
+            jobs.append({"name": job["name"], "source": job["source"], "destination": job["destination"],
+                         "status": job["status"], "seconds": round(job["seconds"], 6),
+                         "counts": job["sync"].counts, "metrics": report})
+
+        report = {
+            "timber_jobs": JOBS_VERSION,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "seconds": round(seconds, 6),
+            "limits": {"parallel": self.parallel, "max_copies": self.max_copies,
+                       "max_in_flight_bytes": self.max_in_flight_bytes, "device_copies": self.device_copies,
+                       "device_in_flight_bytes": self.device_in_flight_bytes},
+            "copy": {
+                "files": files,
+                "bytes_read": bytes_read,
+                "bytes_written": bytes_written,
+                "mb_per_second": round(bytes_written / 1000000 / seconds, 2) if seconds else None,
+            },
+            "jobs": jobs,
+        }
+        try:
+            with open(self.metrics_out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            msg = "Could not write the metrics report to %s: %s" % (self.metrics_out, e)
+            print(msg), self.logger.log(msg)
+            return
+        print("Metrics report saved to %s" % self.metrics_out)
@@ -0,0 +1,93 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for the journal that lets an interrupted sync be resumed.
+
+import atexit
+import json
+import os
+import threading
+import time
+
+# The journal is kept in the root of the destination while a sync runs, and removed when the sync finishes.
+JOURNAL_FILENAME = ".timber_journal"
+
+# Completed operations are written to the journal at least this often, in seconds.
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+
+class TimberJournal:
+    # The journal starts with the sync plan, written by SyncPlan.save. Every finished operation is then appended
+    # as one line, like ["copied", index], so the plan and its progress can be read back with SyncPlan.load.
+    # Files added to the plan while it runs are appended as plan lines, so their indexes match on resume.
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.file = None
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def journal_path(self, destination):
+        return os.path.join(destination, JOURNAL_FILENAME)
+
+    def exists(self, destination):
+        return os.path.exists(self.journal_path(destination))
+
+    def start(self, plan, destination):
+        # This function writes the plan to a new journal and opens it to record progress. The plan is written to
+        # a temporary file first, so an interrupted start never leaves a journal with part of the plan.
+        # If the journal can't be written, the sync goes on without one.
+        path = self.journal_path(destination)
+        try:
+            plan.save(path + ".tmp")
+            os.replace(path + ".tmp", path)
+            self.open(destination)
+        except OSError as e:
+            msg = "Could not write the journal %s: %s. This sync can't be resumed if it is interrupted." % (path, e)
+            print(msg), self.logger.log(msg)
+
+    def open(self, destination):
+        self.file = open(self.journal_path(destination), "a", encoding="utf-8")
+        self.last_flush = time.monotonic()
+
+        # buffered progress is written even if the sync is interrupted
+        atexit.register(self.close)
+
+    def record(self, *entry):
+        # Appends one entry. Entries are buffered and flushed every JOURNAL_FLUSH_INTERVAL seconds, so an
+        # interruption loses at most the last second of progress, which is redone on resume.
+        if self.file is None:
+            return
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            now = time.monotonic()
+            if now - self.last_flush >= JOURNAL_FLUSH_INTERVAL:
+                self.last_flush = now
+                self.file.flush()
+
+    def checkpoint(self, *entry):
+        # Appends one entry and makes sure it is on disk before returning.
+        if self.file is None:
+            return
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        atexit.unregister(self.close)
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def finish(self, destination):
+        # Closes and removes the journal once the sync is done.
+        self.close()
+        try:
+            os.remove(self.journal_path(destination))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            msg = "Could not remove the journal %s: %s" % (self.journal_path(destination), e)
+            print(msg), self.logger.log(msg)
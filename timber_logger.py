@@ -1,19 +1,139 @@
+import atexit
+import glob
 import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Per-run log files are named timber_<date>_<time>.log. The newest DEFAULT_KEEP_LOGS of them are kept.
+RUN_LOG_PATTERN = "timber_*.log"
+DEFAULT_KEEP_LOGS = 10
+
+# Lines are written to the log file in batches. The batch is written when the buffer is full, when a line is
+# logged FLUSH_INTERVAL seconds or more after the last write, and when the log is closed. With a background
+# listener, the batch is also written once no line has been logged for FLUSH_INTERVAL seconds, so the last lines
+# before a long copy reach the file even if the process dies during it.
+LOG_BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 1.0
+
+
+class BatchingFileHandler(logging.FileHandler):
+    # A FileHandler that doesn't flush after every line.
+
+    def __init__(self, filename, encoding=None):
+        self.last_flush = time.monotonic()
+        logging.FileHandler.__init__(self, filename, encoding=encoding)
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, encoding=self.encoding, buffering=LOG_BUFFER_SIZE)
+
+    def flush(self):
+        now = time.monotonic()
+        if now - self.last_flush >= FLUSH_INTERVAL:
+            self.last_flush = now
+            logging.FileHandler.flush(self)
+
+    def flush_now(self):
+        self.acquire()
+        try:
+            self.last_flush = time.monotonic()
+            logging.FileHandler.flush(self)
+        finally:
+            self.release()
+
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler formats each message before queueing it. The queue never leaves this process, so the record
+    # can be queued as it is and the message is formatted on the listener thread instead.
+
+    def prepare(self, record):
+        return record
+
+
+class FlushingQueueListener(QueueListener):
+    # A QueueListener that writes out its handlers' batches whenever the queue has been empty for FLUSH_INTERVAL
+    # seconds.
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    handler.flush_now()
+
 
 class TimberLogger:
 
-    def __init__(self):
+    def __init__(self, log_directory="", keep_logs=DEFAULT_KEEP_LOGS, verbose=True, background=True):
+        # Without a log_directory, everything is appended to timber.log in the working directory. With one,
+        # each run gets its own log file there and only the newest keep_logs run logs are kept.
+        # verbose logs every file copied and deleted. Errors and summaries are always logged.
+        # With background, lines are queued and written by a listener thread, so logging never waits for the disk.
+        self.verbose = verbose
+        if log_directory:
+            os.makedirs(log_directory, exist_ok=True)
+            self.path = self.run_log_path(log_directory)
+        else:
+            self.path = "timber.log"
+
         self.logger = logging.getLogger("Timber")
         self.logger.setLevel(logging.INFO)
-        handler = logging.FileHandler("timber.log", encoding="utf-8")
+        self.file_handler = BatchingFileHandler(self.path, encoding="utf-8")
         formatter = logging.Formatter("[%(asctime)s] %(message)s", datefmt='%Y-%m-%d %H:%M:%S')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        self.file_handler.setFormatter(formatter)
+
+        self.listener = None
+        if background:
+            self.handler = DeferredQueueHandler(queue.SimpleQueue())
+            self.listener = FlushingQueueListener(self.handler.queue, self.file_handler)
+            self.listener.start()
+        else:
+            self.handler = self.file_handler
+        self.logger.addHandler(self.handler)
+
+        # queued lines are written even if the program exits without closing the log
+        atexit.register(self.close_log)
+
+        if log_directory:
+            self.remove_old_logs(log_directory, keep_logs)
+
+    def run_log_path(self, log_directory):
+        path = os.path.join(log_directory, time.strftime("timber_%Y%m%d_%H%M%S.log"))
+        count = 1
+        while os.path.exists(path):
+            count += 1
+            path = os.path.join(log_directory, time.strftime("timber_%Y%m%d_%H%M%S") + "_%d.log" % count)
+        return path
+
+    def remove_old_logs(self, log_directory, keep_logs):
+        # Removes the oldest run logs, so there are at most keep_logs left, including this run's.
+        logs = sorted(glob.glob(os.path.join(log_directory, RUN_LOG_PATTERN)), key=os.path.getmtime)
+        for path in logs[:max(len(logs) - max(keep_logs, 1), 0)]:
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.log("Could not remove old log %s: %s" % (path, e))
+
+    def log(self, message, *args):
+        # The message is formatted with args (like message % args) only when it is written.
+        self.logger.info(message, *args)
 
-    def log(self, message):
-        self.logger.info(message)
+    def detail(self, message, *args):
+        # Logs a line about a single file. Nothing is done, not even formatting, unless verbose is on.
+        if self.verbose:
+            self.logger.info(message, *args)
 
     def close_log(self):
-        for handler in self.logger.handlers:
-            handler.close()
-        self.logger.handlers = []
\ No newline at end of file
+        # Writes out any queued lines and closes the log file. It is safe to call more than once.
+        atexit.unregister(self.close_log)
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.logger.removeHandler(self.handler)
+        self.file_handler.close()
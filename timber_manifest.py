@@ -0,0 +1,162 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for the persistent destination manifest used by incremental syncs.
+
+import os
+import random
+import struct
+import zlib
+
+from timber_scanner import FileRecord
+
+# The manifest is kept in the root of the destination so it follows the destination when it is renamed.
+MANIFEST_FILENAME = ".timber_manifest"
+MANIFEST_MAGIC = b"TIMBERM1"
+
+# Each record is stored as size, mtime_ns, path length and hash length, followed by the path and hash bytes.
+RECORD_STRUCT = struct.Struct("<qqHB")
+
+# The number of manifest entries checked against the destination before the manifest is trusted.
+SPOT_CHECK_COUNT = 32
+
+
+class TimberManifest:
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.source = ""
+
+        # records maps the normalized relative path to a FileRecord describing the synced source file.
+        # Files that were found in the destination but never copied by Timber are stored with a size of -1.
+        # hashes maps the normalized relative path to a file hash, for files that have one. They are saved by
+        # verified syncs and used by --hash-moves, so moved files don't have to be read in the destination.
+        self.records = {}
+        self.hashes = {}
+
+    def manifest_path(self, destination):
+        return os.path.join(destination, MANIFEST_FILENAME)
+
+    def load(self, source, destination):
+        # This function loads the manifest from the destination. It returns False if there is no manifest,
+        # if it can't be read, or if it was written for a different source directory.
+        self.records.clear()
+        self.hashes.clear()
+        path = self.manifest_path(destination)
+
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(MANIFEST_MAGIC)) != MANIFEST_MAGIC:
+                    raise ValueError("bad header")
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            msg = "No manifest found in %s. Scanning the destination." % destination
+            print(msg), self.logger.log(msg)
+            return False
+        except (OSError, ValueError, zlib.error) as e:
+            msg = "Could not read manifest %s (%s). Scanning the destination." % (path, e)
+            print(msg), self.logger.log(msg)
+            return False
+
+        try:
+            self.parse(data)
+        except (struct.error, UnicodeDecodeError, ValueError) as e:
+            self.records.clear()
+            self.hashes.clear()
+            msg = "Manifest %s is corrupt (%s). Scanning the destination." % (path, e)
+            print(msg), self.logger.log(msg)
+            return False
+
+        if self.source != source:
+            msg = "Manifest %s was written for a different source (%s). Scanning the destination." \
+                  % (path, self.source)
+            print(msg), self.logger.log(msg)
+            return False
+
+        self.logger.log("Loaded manifest %s with %d entries." % (path, len(self.records)))
+        return True
+
+    def parse(self, data):
+        (source_length,) = struct.unpack_from("<H", data, 0)
+        offset = 2
+        self.source = data[offset:offset + source_length].decode("utf-8", "surrogateescape")
+        offset += source_length
+
+        while offset < len(data):
+            size, mtime_ns, path_length, hash_length = RECORD_STRUCT.unpack_from(data, offset)
+            offset += RECORD_STRUCT.size
+            rel_path = data[offset:offset + path_length].decode("utf-8", "surrogateescape")
+            offset += path_length
+            key = os.path.normcase(rel_path)
+            if hash_length:
+                self.hashes[key] = data[offset:offset + hash_length]
+                offset += hash_length
+            self.records[key] = FileRecord(rel_path, size, mtime_ns)
+
+        if offset != len(data):
+            raise ValueError("truncated record")
+
+    def save(self, source, destination, records, hashes=None):
+        # This function writes the manifest to a temporary file and then replaces the old manifest,
+        # so an interrupted sync never leaves a half-written manifest behind.
+        path = self.manifest_path(destination)
+        temp_path = path + ".tmp"
+        hashes = hashes or {}
+        compressor = zlib.compressobj()
+
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(MANIFEST_MAGIC)
+                source_bytes = source.encode("utf-8", "surrogateescape")
+                f.write(compressor.compress(struct.pack("<H", len(source_bytes)) + source_bytes))
+
+                chunk = []
+                for record in records:
+                    path_bytes = record.rel_path.encode("utf-8", "surrogateescape")
+                    hash_bytes = hashes.get(os.path.normcase(record.rel_path), b"")
+                    chunk.append(RECORD_STRUCT.pack(record.size, record.mtime_ns, len(path_bytes), len(hash_bytes)))
+                    chunk.append(path_bytes)
+                    chunk.append(hash_bytes)
+                    if len(chunk) >= 3000:
+                        f.write(compressor.compress(b"".join(chunk)))
+                        chunk.clear()
+
+                f.write(compressor.compress(b"".join(chunk)))
+                f.write(compressor.flush())
+            os.replace(temp_path, path)
+        except OSError as e:
+            msg = "Could not write manifest %s: %s" % (path, e)
+            print(msg), self.logger.log(msg)
+            return False
+
+        self.logger.log("Saved manifest %s." % path)
+        return True
+
+    def remove(self, destination):
+        # Removes the manifest, so the next sync scans the destination and writes a new one.
+        try:
+            os.remove(self.manifest_path(destination))
+            self.logger.log("Removed manifest %s." % self.manifest_path(destination))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            msg = "Could not remove manifest %s: %s" % (self.manifest_path(destination), e)
+            print(msg), self.logger.log(msg)
+
+    def spot_check(self, destination, scanner):
+        # This function compares a random sample of manifest entries with the destination to detect drift,
+        # such as files that were deleted or replaced outside of Timber.
+        tracked = [record for record in self.records.values() if record.size >= 0]
+        sample = random.sample(tracked, min(SPOT_CHECK_COUNT, len(tracked)))
+
+        for record in sample:
+            scanner.stat_count += 1
+            try:
+                size = os.stat(os.path.join(destination, record.rel_path)).st_size
+            except OSError:
+                size = -1
+            if size != record.size:
+                msg = "Manifest does not match the destination at %s. Scanning the destination." % record.rel_path
+                print(msg), self.logger.log(msg)
+                return False
+
+        return True
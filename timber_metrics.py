@@ -0,0 +1,119 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for measuring where the time goes in a Timber sync.
+
+import contextlib
+import heapq
+import json
+import threading
+import time
+
+METRICS_VERSION = 1
+
+# The number of slowest file copies kept for the report.
+SLOWEST_FILE_COUNT = 10
+
+# Copy latencies are counted in buckets that double in size, starting at up to 1 ms.
+LATENCY_BUCKET_START = 0.001
+LATENCY_BUCKET_COUNT = 20
+
+
+class TimberMetrics:
+    # Records the wall time of each phase of a sync, and the size and time of each file copy.
+    # Phase times cost almost nothing and are always recorded. File copies are only recorded when enabled is
+    # True, so copy_file can skip the work entirely when no report was asked for.
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.phases = {}
+        self.files_copied = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.latency_buckets = [0] * LATENCY_BUCKET_COUNT
+
+        # a min-heap of (seconds, path, size), so the fastest of the slowest files is the one pushed out
+        self.slowest_files = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Times the code inside the with block and adds it to the named phase.
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def record_copy(self, path, size, seconds, bytes_read, bytes_written):
+        # This function records one file copy. It is called from the copy workers.
+        bucket = 0
+        limit = LATENCY_BUCKET_START
+        while seconds > limit and bucket < LATENCY_BUCKET_COUNT - 1:
+            bucket += 1
+            limit *= 2
+
+        with self.lock:
+            self.files_copied += 1
+            self.bytes_read += bytes_read
+            self.bytes_written += bytes_written
+            self.latency_buckets[bucket] += 1
+            if len(self.slowest_files) < SLOWEST_FILE_COUNT:
+                heapq.heappush(self.slowest_files, (seconds, path, size))
+            elif seconds > self.slowest_files[0][0]:
+                heapq.heapreplace(self.slowest_files, (seconds, path, size))
+
+    def report(self, sync):
+        # This function builds the report as a dictionary that can be saved as JSON. Copy rates are measured
+        # over the phase the files were copied in.
+        copy_seconds = self.phases.get("copy", 0.0) + self.phases.get("analyze_and_copy", 0.0)
+        histogram = []
+        limit = LATENCY_BUCKET_START
+        for i, count in enumerate(self.latency_buckets):
+            histogram.append({"max_seconds": limit if i < LATENCY_BUCKET_COUNT - 1 else None, "files": count})
+            limit *= 2
+
+        return {
+            "timber_metrics": METRICS_VERSION,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "source": sync.source,
+            "destination": sync.destination,
+            "phases": dict((name, round(seconds, 6)) for name, seconds in self.phases.items()),
+            "scan": {
+                "directories_listed": sync.scanner.list_count,
+                "stat_calls": sync.scanner.stat_count,
+                "stat_calls_saved": sync.scanner.stats_saved(),
+            },
+            "copy": {
+                "files": self.files_copied,
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "files_per_second": round(self.files_copied / copy_seconds, 2) if copy_seconds else None,
+                "mb_per_second": round(self.bytes_written / 1000000 / copy_seconds, 2) if copy_seconds else None,
+                "methods": dict((tier, count) for tier, count in sync.copy_backend.tier_counts.items() if count),
+                "delta_bytes_skipped": sync.copy_backend.delta_bytes_skipped,
+            },
+            "latency_histogram": histogram,
+            "slowest_files": [{"path": path, "size": size, "seconds": round(seconds, 6)}
+                              for seconds, path, size in sorted(self.slowest_files, reverse=True)],
+        }
+
+    def save(self, path, report):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    def log(self, logger, report):
+        # Writes a short summary of the report to the log.
+        logger.log("Phase times: %s" % ", ".join("%s %.3f s" % (name, seconds)
+                                                 for name, seconds in report["phases"].items()))
+        copy = report["copy"]
+        logger.log("Copied %d files: %d bytes read, %d bytes written, %s files/s, %s MB/s."
+                   % (copy["files"], copy["bytes_read"], copy["bytes_written"],
+                      copy["files_per_second"], copy["mb_per_second"]))
+        logger.log("Analysis listed %d directories and made %d stat calls."
+                   % (report["scan"]["directories_listed"], report["scan"]["stat_calls"]))
+        for entry in report["slowest_files"]:
+            logger.log("Slow copy: %s (%d bytes) took %.3f s" % (entry["path"], entry["size"], entry["seconds"]))
@@ -0,0 +1,240 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for the compact sync plan that lists the files Timber will copy and delete.
+
+import json
+import os
+import struct
+import tempfile
+from array import array
+
+# The number of entries kept in memory per list before the oldest are spilled to a temporary file.
+DEFAULT_SPILL_THRESHOLD = 1000000
+
+# Each spilled entry is stored as directory id, size, mtime_ns, flag and name length, followed by the name.
+SPILL_STRUCT = struct.Struct("<IqqBH")
+
+PLAN_VERSION = 1
+
+# flags for copy entries
+FLAG_NEW = 0
+FLAG_UPDATE = 1
+
+
+class PlanColumns:
+    # Compact storage for one list of plan entries. Each entry's directory is an id into the plan's directory
+    # table, so a directory path is stored once no matter how many files it holds. Sizes, times and flags are
+    # kept in arrays instead of one tuple per file. When there are more than spill_threshold entries in memory,
+    # they are moved to a temporary file and read back in order when the list is iterated.
+
+    def __init__(self, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+        self.spill_threshold = spill_threshold
+        self.dir_ids = array("I")
+        self.names = []
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.flags = array("B")
+        self.spill_file = None
+        self.spilled_count = 0
+
+        # done has one byte per entry (including spilled ones) and is set when the entry's operation succeeds
+        self.done = bytearray()
+
+    def __len__(self):
+        return self.spilled_count + len(self.names)
+
+    def append(self, dir_id, name, size=0, mtime_ns=0, flag=0):
+        self.dir_ids.append(dir_id)
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+        self.flags.append(flag)
+        self.done.append(0)
+        if len(self.names) >= self.spill_threshold:
+            self.spill()
+
+    def spill(self):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="timber_plan_")
+        self.spill_file.seek(0, os.SEEK_END)
+
+        chunk = []
+        for i in range(len(self.names)):
+            name = self.names[i].encode("utf-8", "surrogateescape")
+            chunk.append(SPILL_STRUCT.pack(self.dir_ids[i], self.sizes[i], self.mtimes[i], self.flags[i], len(name)))
+            chunk.append(name)
+        self.spill_file.write(b"".join(chunk))
+
+        self.spilled_count += len(self.names)
+        self.dir_ids = array("I")
+        self.names = []
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.flags = array("B")
+
+    def __iter__(self):
+        # yields (index, dir_id, name, size, mtime_ns, flag) for every entry, in the order they were added
+        index = 0
+        if self.spill_file is not None:
+            self.spill_file.flush()
+            self.spill_file.seek(0)
+            for _ in range(self.spilled_count):
+                dir_id, size, mtime_ns, flag, name_length = SPILL_STRUCT.unpack(
+                    self.spill_file.read(SPILL_STRUCT.size))
+                name = self.spill_file.read(name_length).decode("utf-8", "surrogateescape")
+                yield index, dir_id, name, size, mtime_ns, flag
+                index += 1
+
+        for i in range(len(self.names)):
+            yield index, self.dir_ids[i], self.names[i], self.sizes[i], self.mtimes[i], self.flags[i]
+            index += 1
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+
+class SyncPlan:
+
+    def __init__(self, source="", destination="", spill_threshold=DEFAULT_SPILL_THRESHOLD):
+        self.source = source
+        self.destination = destination
+        self.delete_preference = False
+
+        # the directory table. Entries refer to directories by their index in dirs.
+        self.dirs = []
+        self.dir_index = {}
+
+        self.copies = PlanColumns(spill_threshold)
+        self.deletions = PlanColumns(spill_threshold)
+
+        # directories to delete, relative to the destination, children before parents
+        self.dirs_to_delete = []
+
+        # directories to delete with everything in them, relative to the destination
+        self.subtrees_to_delete = []
+        self.subtrees_done = bytearray()
+
+        # partial maps the index of a copy that was interrupted to (bytes safely copied, source mtime_ns when they
+        # were copied). It is only filled when a journal is loaded.
+        self.partial = {}
+        self.copy_size = 0
+
+        # files to rename in the destination before copying, as (old path, new path, size, mtime_ns).
+        # moves_done has one byte per move and is set when the rename succeeds.
+        self.moves = []
+        self.moves_done = bytearray()
+
+    def intern_dir(self, rel_dir):
+        dir_id = self.dir_index.get(rel_dir)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(rel_dir)
+            self.dir_index[rel_dir] = dir_id
+        return dir_id
+
+    def add_copy(self, rel_path, size, mtime_ns, exists):
+        rel_dir, name = os.path.split(rel_path)
+        self.copies.append(self.intern_dir(rel_dir), name, size, mtime_ns, FLAG_UPDATE if exists else FLAG_NEW)
+        self.copy_size += size
+
+    def add_deletion(self, rel_path):
+        rel_dir, name = os.path.split(rel_path)
+        self.deletions.append(self.intern_dir(rel_dir), name)
+
+    def add_subtree_deletion(self, rel_path):
+        self.subtrees_to_delete.append(rel_path)
+        self.subtrees_done.append(0)
+
+    def add_move(self, old_rel_path, new_rel_path, size, mtime_ns):
+        self.moves.append((old_rel_path, new_rel_path, size, mtime_ns))
+        self.moves_done.append(0)
+
+    def add_dir_deletion(self, rel_path):
+        self.dirs_to_delete.append(rel_path)
+
+    def rel_path(self, dir_id, name):
+        rel_dir = self.dirs[dir_id]
+        return os.path.join(rel_dir, name) if rel_dir else name
+
+    def iter_copies(self):
+        # yields (index, source file, destination file, exists, size) for each file to copy
+        for index, dir_id, name, size, mtime_ns, flag in self.copies:
+            rel_path = self.rel_path(dir_id, name)
+            yield index, os.path.join(self.source, rel_path), os.path.join(self.destination, rel_path), \
+                flag == FLAG_UPDATE, size
+
+    def iter_copy_records(self):
+        # yields (index, relative path, size, mtime_ns, exists) for each file to copy
+        for index, dir_id, name, size, mtime_ns, flag in self.copies:
+            yield index, self.rel_path(dir_id, name), size, mtime_ns, flag == FLAG_UPDATE
+
+    def iter_deletions(self):
+        # yields (index, relative path) for each file to delete
+        for index, dir_id, name, size, mtime_ns, flag in self.deletions:
+            yield index, self.rel_path(dir_id, name)
+
+    def save(self, path):
+        # This function writes the plan as JSON lines, one operation per line, so it can be reviewed before it is
+        # run with --plan-in. The first line holds the source, destination and delete preference.
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"timber_plan": PLAN_VERSION, "source": self.source,
+                                "destination": self.destination,
+                                "delete": self.delete_preference}) + "\n")
+            for old_rel_path, new_rel_path, size, mtime_ns in self.moves:
+                f.write(json.dumps(["move", old_rel_path, new_rel_path, size, mtime_ns]) + "\n")
+            for index, rel_path, size, mtime_ns, exists in self.iter_copy_records():
+                f.write(json.dumps(["update" if exists else "new", rel_path, size, mtime_ns]) + "\n")
+            # deletions are only part of the plan if it was made with the delete preference
+            if self.delete_preference:
+                for index, rel_path in self.iter_deletions():
+                    f.write(json.dumps(["delete", rel_path]) + "\n")
+                for rel_path in self.dirs_to_delete:
+                    f.write(json.dumps(["rmdir", rel_path]) + "\n")
+                for rel_path in self.subtrees_to_delete:
+                    f.write(json.dumps(["rmtree", rel_path]) + "\n")
+
+    def load(self, path):
+        # This function reads a plan written by save. It raises ValueError if the file isn't a Timber plan.
+        # It also reads the progress a TimberJournal appends to a plan, and marks the finished operations done.
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("timber_plan") != PLAN_VERSION:
+                raise ValueError("%s is not a Timber plan" % path)
+            self.source = header["source"]
+            self.destination = header["destination"]
+            self.delete_preference = header["delete"]
+
+            for line in f:
+                # a journal's last line is incomplete if the sync was interrupted while it was written
+                if not line.endswith("\n"):
+                    break
+                entry = json.loads(line)
+                if entry[0] == "new" or entry[0] == "update":
+                    self.add_copy(entry[1], entry[2], entry[3], entry[0] == "update")
+                elif entry[0] == "move":
+                    self.add_move(entry[1], entry[2], entry[3], entry[4])
+                elif entry[0] == "delete":
+                    self.add_deletion(entry[1])
+                elif entry[0] == "rmdir":
+                    self.add_dir_deletion(entry[1])
+                elif entry[0] == "rmtree":
+                    self.add_subtree_deletion(entry[1])
+                elif entry[0] == "copied":
+                    self.copies.done[entry[1]] = 1
+                    self.partial.pop(entry[1], None)
+                elif entry[0] == "deleted":
+                    self.deletions.done[entry[1]] = 1
+                elif entry[0] == "moved":
+                    self.moves_done[entry[1]] = 1
+                elif entry[0] == "deleted_tree":
+                    self.subtrees_done[entry[1]] = 1
+                elif entry[0] == "partial":
+                    self.partial[entry[1]] = (entry[2], entry[3])
+                else:
+                    raise ValueError("Unknown plan operation %s in %s" % (entry[0], path))
+
+    def close(self):
+        self.copies.close()
+        self.deletions.close()
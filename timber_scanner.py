@@ -0,0 +1,214 @@
+# Name: Laurence Finn
+# Date: 10/17/2026
+# Description: Module for scanning directory trees with os.scandir for Timber file analysis.
+
+import os
+import stat
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from timber_exclude import ExcludeMatcher
+
+# A compact metadata record for a single file. rel_path is relative to the scanned root.
+# inode is the file's inode number where the platform reports one (0 otherwise). It is only used to order copies.
+FileRecord = namedtuple("FileRecord", ["rel_path", "size", "mtime_ns", "inode"], defaults=(0,))
+
+
+class TimberScanner:
+
+    def __init__(self, logger):
+        self.logger = logger
+
+        # stat_count is the number of stat calls actually made by the scanner.
+        # legacy_stat_count is the number of path checks (exists/getsize/getmtime) the old
+        # os.walk based analysis would have made for the same trees.
+        # list_count is the number of directories listed.
+        self.stat_count = 0
+        self.legacy_stat_count = 0
+        self.list_count = 0
+        self.count_lock = threading.Lock()
+
+        # The number of directories listed at the same time. On network shares each listing is a round trip,
+        # so listing several directories at once hides most of the latency.
+        self.jobs = 1
+
+    def reset_counters(self):
+        self.stat_count = 0
+        self.legacy_stat_count = 0
+        self.list_count = 0
+
+    def stats_saved(self):
+        return max(self.legacy_stat_count - self.stat_count, 0)
+
+    def is_ignored(self, name, rel_path, ignored_directories):
+        # A directory is ignored if it is excluded by ignored_directories, which is an ExcludeMatcher (see
+        # TimberSync.set_ignored_directories) or a plain list of directory names and relative paths using forward
+        # slashes.
+        if isinstance(ignored_directories, ExcludeMatcher):
+            return ignored_directories.excluded(name, rel_path, True)
+        return name in ignored_directories or rel_path.replace(os.sep, "/") in ignored_directories
+
+    def is_ignored_file(self, name, rel_path, ignored_directories):
+        # Files can only be excluded by an ExcludeMatcher.
+        return isinstance(ignored_directories, ExcludeMatcher) and ignored_directories.excluded(name, rel_path, False)
+
+    def list_directory(self, path):
+        # This function lists a directory with os.scandir and returns its entries sorted by name.
+        # If the directory can't be listed, an empty list is returned and the error is logged.
+        with self.count_lock:
+            self.list_count += 1
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except PermissionError:
+            self.logger.log("Permission denied. Skipping %s" % path)
+            print("Permission denied. Skipping %s" % path)
+            return []
+        except FileNotFoundError:
+            self.logger.log("Error: The directory %s was not found for analysis. Skipping." % path)
+            print("Error: The directory %s was not found for analysis. Skipping." % path)
+            return []
+        except OSError as e:
+            self.logger.log("Error listing directory %s: %s. Skipping." % (path, e))
+            print("Error listing directory %s: %s. Skipping." % (path, e))
+            return []
+
+        entries.sort(key=lambda entry: os.path.normcase(entry.name))
+        return entries
+
+    def entry_is_dir(self, entry):
+        # Uses the file type cached by scandir, so no stat call is needed on most platforms.
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
+
+    def stat_entry(self, entry, rel_path):
+        # This function makes exactly one (cached) stat call for a directory entry and returns a FileRecord.
+        # None is returned if the file disappeared or can't be accessed.
+        with self.count_lock:
+            self.stat_count += 1
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            self.logger.log("Error: The file %s was not found for analysis, even though it was "
+                            "found when walking the directory. Skipping." % entry.path)
+            print("Error: The file %s was not found for analysis, even though it was "
+                  "found when walking the directory. Skipping." % entry.path)
+            return None
+        except PermissionError:
+            self.logger.log("Permission denied. Skipping %s" % entry.path)
+            print("Permission denied. Skipping %s" % entry.path)
+            return None
+        except OSError as e:
+            self.logger.log("Error reading %s: %s. Skipping." % (entry.path, e))
+            print("Error reading %s: %s. Skipping." % (entry.path, e))
+            return None
+
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return FileRecord(rel_path, st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def walk_tree(self, visit, root, jobs=None):
+        # This function calls visit(item) for every directory in a tree, starting with root. visit returns a tuple
+        # (result, children), where children are the items for its subdirectories in sorted order.
+        # With more than one job, directories are visited on a thread pool: every idle worker takes the next
+        # directory from a shared queue, so one deep subtree can't hold up the rest of the scan.
+        # Either way, the results are returned in the order of a depth-first walk, so the output is deterministic.
+        # jobs overrides the scanner's number of jobs for this walk.
+        jobs = self.jobs if jobs is None else jobs
+        if jobs <= 1:
+            results = []
+            pending = [root]
+            while pending:
+                result, children = visit(pending.pop())
+                results.append(result)
+                # push in reverse so directories are visited in sorted order
+                pending.extend(reversed(children))
+            return results
+
+        # each visited directory is stored as (result, ids of its children) until the walk is done
+        nodes = {}
+        next_id = 1
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            running = {pool.submit(visit, root): 0}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_id = running.pop(future)
+                    result, children = future.result()
+                    child_ids = []
+                    for child in children:
+                        running[pool.submit(visit, child)] = next_id
+                        child_ids.append(next_id)
+                        next_id += 1
+                    nodes[node_id] = (result, child_ids)
+
+        results = []
+        pending = [0]
+        while pending:
+            result, child_ids = nodes.pop(pending.pop())
+            results.append(result)
+            pending.extend(reversed(child_ids))
+        return results
+
+    def iter_tree(self, visit, root, jobs=None):
+        # Like walk_tree, but yields each result as soon as it is ready, in the same depth-first order, so only the
+        # directories still waiting to be yielded are kept in memory. With more than one job, the directories on
+        # the stack are visited ahead of time on a thread pool.
+        jobs = self.jobs if jobs is None else jobs
+        if jobs <= 1:
+            pending = [root]
+            while pending:
+                result, children = visit(pending.pop())
+                yield result
+                pending.extend(reversed(children))
+            return
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            pending = [pool.submit(visit, root)]
+            while pending:
+                result, children = pending.pop().result()
+                yield result
+                pending.extend(pool.submit(visit, child) for child in reversed(children))
+
+    def scan(self, top, ignored_directories, stat_files=True):
+        # This function walks the tree under top and returns a tuple (files, dirs).
+        # files maps each relative file path to a FileRecord (or None if stat_files is False).
+        # dirs is a list of relative directory paths, parents before children.
+        # Ignored directories are pruned and never listed, and ignored files are left out.
+
+        def visit(rel_dir):
+            dir_files = []
+            dir_dirs = []
+            subdirs = []
+
+            for entry in self.list_directory(os.path.join(top, rel_dir) if rel_dir else top):
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+
+                if self.entry_is_dir(entry):
+                    if self.is_ignored(entry.name, rel_path, ignored_directories):
+                        continue
+                    dir_dirs.append(rel_path)
+                    # like os.walk, don't follow symbolic links to directories
+                    if not entry.is_symlink():
+                        subdirs.append(rel_path)
+                elif self.is_ignored_file(entry.name, rel_path, ignored_directories):
+                    continue
+                elif stat_files:
+                    record = self.stat_entry(entry, rel_path)
+                    if record is not None:
+                        dir_files.append((rel_path, record))
+                else:
+                    dir_files.append((rel_path, None))
+
+            return (dir_files, dir_dirs), subdirs
+
+        files = {}
+        dirs = []
+        for dir_files, dir_dirs in self.walk_tree(visit, ""):
+            files.update(dir_files)
+            dirs.extend(dir_dirs)
+
+        return files, dirs
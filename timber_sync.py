@@ -2,53 +2,173 @@
 # Date: 2/25/2023
 # Description: Module for the Timber file synchronization/backup functionality.
 
+import collections
 import os
 import re
+import queue
 import shutil
-import datetime
+import stat
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from tqdm import tqdm
+from timber_copy import CopyBackend, CopyBudget, DEFAULT_FILES_PER_JOB, PIPELINE_QUEUE_PER_JOB, SMALL_FILE_BATCH, \
+    LARGE_FILE_SIZE, RESUMABLE_MIN_SIZE, TEMP_FILE_SUFFIX, DURABILITY_NONE, DurableWrites, new_hasher
+from timber_diff import TimberDiff, MOVE_MIN_SIZE
+from timber_dupes import DuplicateIndex, DUPLICATES_LINK, DUPLICATES_SKIP
+from timber_exclude import compile_excludes
+from timber_journal import TimberJournal, JOURNAL_FILENAME
 from timber_logger import TimberLogger
+from timber_manifest import TimberManifest, MANIFEST_FILENAME
+from timber_metrics import TimberMetrics
+from timber_plan import SyncPlan, FLAG_UPDATE
+from timber_scanner import TimberScanner, FileRecord
 
+# Snapshots are named with the date they were made (YYYY-MMDD), and the time too if there is already a snapshot
+# from that day. A snapshot is built under its name plus SNAPSHOT_INCOMPLETE_SUFFIX and renamed when it is done,
+# so an interrupted snapshot is never used as the base for the next one.
+SNAPSHOT_DATE_FORMAT = "%Y-%m%d"
+SNAPSHOT_TIME_FORMAT = "%Y-%m%d_%H%M%S"
+SNAPSHOT_NAME_PATTERN = re.compile(r"^\d{4}-\d{4}(_\d{6})?$")
+SNAPSHOT_INCOMPLETE_SUFFIX = ".incomplete"
 
-# Increase the buffer size for shutil.copyfileobj to improve copy speed
-def _copyfileobj_patched(fsrc, fdst, length=16 * 1024 * 1024):
-    while True:
-        buf = fsrc.read(length)
-        if not buf:
-            break
-        fdst.write(buf)
-
-
-shutil.copyfileobj = _copyfileobj_patched
+# The free space check rounds every file up to a whole number of ALLOCATION_UNIT bytes, and leaves
+# FREE_SPACE_RESERVE bytes free on the destination.
+ALLOCATION_UNIT = 4096
+FREE_SPACE_RESERVE = 64 * 1024 * 1024
 
 
 class TimberSync:
 
-    def __init__(self):
+    def __init__(self, logger=None):
         self.delete_preference = False
         self.source = ""
         self.destination = ""
         self.new_destination = False
         self.ignored_directories = []
-        self.files_to_copy = set()
-        self.files_to_delete = []
-        self.dirs_to_delete = []
+
+        # Files and directories matching exclude_patterns or the rules in the exclude_from file are left out of the
+        # sync, like the ignored directories. Both use gitignore style rules (see ExcludeMatcher).
+        self.exclude_patterns = []
+        self.exclude_from = ""
+
+        # The sync plan lists the files to copy and delete. plan_out saves the plan after analysis without
+        # running it, and plan_in runs a saved plan instead of analyzing the trees again.
+        self.plan = SyncPlan()
+        self.plan_in = ""
+        self.plan_out = ""
 
         # Initialize logger
-        self.logger = TimberLogger()
+        self.logger = logger or TimberLogger()
         self.logger.log("Timber Sync initialized.")
 
-    def check_corrupt(self, source_file, destination_file):
+        # Initialize the directory scanner used for file analysis
+        self.scanner = TimberScanner(self.logger)
+        self.tree_diff = TimberDiff(self.scanner, self.logger)
+        self.copy_plan_ready = False
+        self.delete_plan_ready = False
+
+        # The manifest records what was synced to the destination, so later syncs can skip the destination walk.
+        # Timber's own files in the destination are never treated as orphans.
+        self.use_manifest = False
+        self.rescan = False
+        self.manifest = TimberManifest(self.logger)
+        self.tree_diff.excluded_paths.update((MANIFEST_FILENAME, MANIFEST_FILENAME + ".tmp"))
+
+        # While a sync runs, its plan and every finished operation are written to a journal in the destination.
+        # If the sync is interrupted, the next sync with resume carries on from the journal without analyzing the
+        # trees again, and large files continue from their last checkpoint. use_journal turns the journal off.
+        self.journal = TimberJournal(self.logger)
+        self.use_journal = True
+        self.resume = False
+        self.tree_diff.excluded_paths.update((JOURNAL_FILENAME, JOURNAL_FILENAME + ".tmp"))
+
+        # The number of files copied at the same time. copy_budget can be set to share one in-flight limit
+        # between several syncs, like TimberJobs does; otherwise each copy gets its own.
+        self.jobs = 1
+        self.copy_budget = None
+
+        # With pipeline, copying starts as soon as the first differences are found instead of after analysis.
+        self.pipeline = False
+        self.directory_lock = threading.Lock()
+
+        # The copy backend picks the fastest way to copy each file: reflink, copy_file_range, sendfile
+        # or a buffered read/write loop.
+        self.copy_backend = CopyBackend()
+
+        # With atomic_writes, files are copied to a temporary file next to the destination and renamed over it, so
+        # the old version of an updated file is only replaced once the new one is complete. durable_writes makes
+        # the copies durable with one of the DURABILITY_POLICIES, which is none by default.
+        self.atomic_writes = False
+        self.durable_writes = DurableWrites()
+
+        # Updated files of at least delta_min_size bytes are updated in place by rewriting only the blocks that
+        # changed. None turns delta updates off.
+        self.delta_min_size = None
+
+        # Files smaller than small_file_size bytes are copied with one read and one write, relative to open
+        # directory descriptors, after all destination directories are created. None turns this off.
+        self.small_file_size = None
+
+        # With detect_moves, new source files that match a file about to be deleted from the destination are
+        # renamed in the destination instead of copied. hash_moves confirms the matches by hashing both files.
+        self.detect_moves = False
+        self.hash_moves = False
+
+        # With dupes_in, new files that a duplicates report (see TimberDupes) says are duplicates of a file
+        # already in the destination are hard linked to it, or skipped, depending on duplicate_action.
+        # duplicate_copies maps each group in the report to the first of its files copied by this sync.
+        self.dupes_in = ""
+        self.duplicates = None
+        self.duplicate_action = DUPLICATES_LINK
+        self.duplicate_copies = {}
+
+        # With snapshot, each sync makes a new dated snapshot directory inside the destination. Files that haven't
+        # changed since the last snapshot are hard linked to it, so only changed files are copied and stored.
+        self.snapshot = False
+
+        # With space_check, the free space on the destination is checked against the plan before copying.
+        self.space_check = True
+
+        # With verify, files are hashed while they are copied and the destination is read back and checked.
+        # verify_uncached drops the destination from the page cache before reading it back.
+        # file_hashes maps the plan index of each verified file to its hash, so it can be saved in the manifest.
+        self.verify = False
+        self.verify_uncached = False
+        self.file_hashes = {}
+
+        # files inside orphaned directories that couldn't be deleted, relative to the destination
+        self.undeleted_files = []
+
+        # metrics times each phase of the sync. If metrics_out is set, every file copy is measured too and a
+        # JSON report is saved to metrics_out at the end of the sync.
+        self.metrics = TimberMetrics()
+        self.metrics_out = ""
+
+        # With record_metrics, the metrics report is built without saving it, for TimberJobs to combine.
+        # metrics_report is the last report built, and counts are the totals of the last sync.
+        self.record_metrics = False
+        self.metrics_report = None
+        self.counts = {}
+
+    def check_corrupt(self, source_file, destination_file, source_hash=None):
         # This function checks the size of the source and destination files to see if they match.
-        # If they don't match, "false" is returned and file_copy will attempt the copy operation again.
+        # If a hash of the source was taken while copying, the destination is read back and its hash is checked too.
+        # If they don't match, "true" is returned and file_copy will attempt the copy operation again.
         try:
             if os.path.getsize(destination_file) < os.path.getsize(source_file):
                 self.logger.log("File %s is corrupt. Deleting and retrying copy." % destination_file)
                 print("File %s is corrupt. Deleting and retrying copy." % destination_file)
                 os.remove(destination_file)
                 return True
+            elif source_hash is not None and \
+                    self.copy_backend.hash_file(destination_file, new_hasher(), self.verify_uncached) != source_hash:
+                self.logger.log("File %s failed verification. Deleting and retrying copy." % destination_file)
+                print("File %s failed verification. Deleting and retrying copy." % destination_file)
+                os.remove(destination_file)
+                return True
             else:
                 return False
         except FileNotFoundError:
@@ -56,219 +176,1261 @@ class TimberSync:
             print("Error checking file %s. Skipping." % destination_file)
             return False
 
-    def file_analyze_for_copy_update(self, source, destination, ignored_directories):
-        # This function analyzes the source and destination directories and determines which files need to be copied
-        # and which files need to be updated. The results are stored in the files_to_copy and files_to_update sets.
+    def file_analyze(self, source, destination, ignored_directories, find_orphans=True):
+        # This function compares the source and destination trees in one traversal and builds the sync plan:
+        # the files to copy and, if find_orphans is True, the files and directories to delete.
 
-        self.files_to_copy.clear()
-        new_count = 0
-        updated_count = 0
-        file_size = 0
-
-        print("Analyzing files for copying and updating...")
+        self.plan.close()
+        self.plan = SyncPlan(source, destination)
+        self.scanner.reset_counters()
 
-        for root, dirs, files in os.walk(source):
-            dirs[:] = [d for d in dirs if d not in ignored_directories]
-            if root != source and os.path.relpath(root, source) in ignored_directories:
-                continue
-
-            for file in files:
+        print("Analyzing files...")
 
-                source_file = os.path.join(root, file)
-                destination_file = os.path.join(destination, os.path.relpath(source_file, source))
+        # moves are only looked for when orphans are going to be deleted
+        detect_moves = self.detect_moves and find_orphans
+        manifest_records = None
 
-                if os.path.exists(destination_file):
+        self.tree_diff.record_unchanged = self.use_manifest or self.snapshot
 
-                    # If the source file is newer than the destination file, mark it for update.
-                    # If the source and destination file have the same timestamp, but the sizes are different,
-                    # mark it for update.
-                    try:
-                        source_time = datetime.datetime.fromtimestamp(os.path.getmtime(source_file))
-                        destination_time = datetime.datetime.fromtimestamp(os.path.getmtime(destination_file))
-                        source_size = os.path.getsize(source_file)
-                        destination_size = os.path.getsize(destination_file)
-                    except FileNotFoundError:
-                        self.logger.log("Error: The file %s was not found for analysis, even though it was"
-                                        "found when walking the directory. Skipping." % source_file)
-                        print("Error: The file %s was not found for analysis, even though it was"
-                              "found when walking the directory. Skipping." % source_file)
-                        continue
-                    except PermissionError:
-                        self.logger.log("Permission denied. Skipping %s" % destination_file)
-                        print("Permission denied. Skipping %s" % destination_file)
-                        continue
-                    if source_time > destination_time or source_size != destination_size:
-                        self.files_to_copy.add((source_file, destination_file, True))
-                        updated_count += 1
-                        file_size += source_size
-
-                elif not os.path.exists(destination_file):
-                    # Try to get the file size first. If that fails, do not add the file to the copy list.
-                    # This could indicate the file was moved or a permission error occurred.
-                    try:
-                        file_size += os.path.getsize(source_file)
-                        self.files_to_copy.add((source_file, destination_file, False))
-                        new_count += 1
-                    except FileNotFoundError:
-                        self.logger.log("Error getting file size for %s. Skipping." % source_file)
-                        print("Error getting file size for %s. Skipping." % source_file)
-                    except PermissionError:
-                        self.logger.log("Permission denied. Skipping %s" % source_file)
-                        print("Permission denied. Skipping %s" % source_file)
+        # Directories that are only in the destination are deleted whole, so they don't need to be walked now.
+        # Moved files are looked for among the orphans, so they have to be walked then.
+        self.tree_diff.prune_orphaned_dirs = find_orphans and not detect_moves
+        if self.use_manifest and not self.rescan and self.manifest.load(source, destination) \
+                and self.manifest.spot_check(destination, self.scanner):
+            msg = "Comparing the source with the destination manifest. Use --rescan to scan the destination."
+            print(msg), self.logger.log(msg)
+            self.tree_diff.diff_manifest(source, self.manifest.records, ignored_directories)
+            manifest_records = self.manifest.records
+            find_orphans = True
+        else:
+            if self.use_manifest:
+                # rebuilding the manifest needs every destination file, including orphans
+                self.manifest.records.clear()
+                self.manifest.hashes.clear()
+                find_orphans = True
+
+            def consume(result):
+                # Add each directory's differences to the compact plan as soon as it is compared, so the diff
+                # never holds the records of the whole tree. Moves are matched across the whole tree, so their
+                # candidates (large new files and orphaned files) are left in the diff until the walk is done.
+                # A pipelined sync adds copies from the scan threads, so the plan is only changed under the lock.
+                with self.directory_lock:
+                    new_files = result.new_files
+                    if detect_moves:
+                        result.new_files = [record for record in new_files if record.size >= MOVE_MIN_SIZE]
+                        new_files = [record for record in new_files if record.size < MOVE_MIN_SIZE]
+                    else:
+                        result.new_files = []
+                    for record, exists in self.order_copies(new_files, result.updated_files):
+                        self.plan.add_copy(record.rel_path, record.size, record.mtime_ns, exists)
+                    result.updated_files = []
+                    if not detect_moves:
+                        for rel_path in result.orphaned_files:
+                            self.plan.add_deletion(rel_path)
+                        result.orphaned_files = []
+                    for rel_path in result.orphaned_subtrees:
+                        self.plan.add_subtree_deletion(rel_path)
+                    result.orphaned_subtrees = []
+
+            self.tree_diff.consumer = consume
+            try:
+                self.tree_diff.diff(source, destination, ignored_directories, find_orphans)
+            finally:
+                self.tree_diff.consumer = None
+
+        if detect_moves:
+            hash_file = (lambda path: self.copy_backend.hash_file(path, new_hasher())) if self.hash_moves else None
+            manifest_hashes = self.manifest.hashes if manifest_records is not None else None
+            for orphan, record in self.tree_diff.find_moves(source, destination, manifest_records, hash_file,
+                                                            manifest_hashes):
+                self.plan.add_move(orphan, record.rel_path, record.size, record.mtime_ns)
+            if self.plan.moves:
+                msg = "Found %d moved files. They will be renamed in the destination instead of copied." \
+                      % len(self.plan.moves)
+                print(msg), self.logger.log(msg)
 
+        # move the differences still in the diff (all of them, when comparing with the manifest) into the compact
+        # plan and free the diff's lists
+        for record, exists in self.order_copies(self.tree_diff.new_files, self.tree_diff.updated_files):
+            self.plan.add_copy(record.rel_path, record.size, record.mtime_ns, exists)
+        for rel_path in self.tree_diff.orphaned_files:
+            self.plan.add_deletion(rel_path)
+        for rel_path in self.tree_diff.orphaned_dirs:
+            self.plan.add_dir_deletion(rel_path)
+        for rel_path in self.tree_diff.orphaned_subtrees:
+            self.plan.add_subtree_deletion(rel_path)
+        self.tree_diff.new_files.clear()
+        self.tree_diff.updated_files.clear()
+        self.tree_diff.orphaned_files.clear()
+        self.tree_diff.orphaned_dirs.clear()
+        self.tree_diff.orphaned_subtrees.clear()
+
+        self.copy_plan_ready = True
+        self.delete_plan_ready = find_orphans
+
+        self.print_copy_size()
+        self.log_scanner_stats()
+
+    def order_copies(self, new_files, updated_files):
+        # This function returns (record, exists) pairs for the new and updated files, grouped by directory and
+        # ordered by inode number inside each directory. Copying one directory at a time keeps its metadata
+        # cached on both sides, and on most filesystems inode order is close to the order of the files on disk,
+        # so hard disks seek less. Files without inode numbers keep their name order.
+        dir_order = {}
+        copies = []
+        for exists, records in ((False, new_files), (True, updated_files)):
+            for record in records:
+                rel_dir = os.path.dirname(record.rel_path)
+                copies.append((dir_order.setdefault(rel_dir, len(dir_order)), record.inode, record, exists))
+        copies.sort(key=lambda copy: (copy[0], copy[1]))
+        return [(record, exists) for dir_id, inode, record, exists in copies]
+
+    def format_size(self, file_size):
         # reformat the file size to megabytes or gigabytes, whichever is appropriate
         if file_size > 1000000000:
-            file_size = str(round(file_size / 1000000000, 2)) + " GB"
+            return str(round(file_size / 1000000000, 2)) + " GB"
         elif file_size > 1000000:
-            file_size = str(round(file_size / 1000000, 2)) + " MB"
+            return str(round(file_size / 1000000, 2)) + " MB"
+        return str(file_size)
+
+    def print_copy_size(self):
+        print("Total file size to copy: %s" % self.format_size(self.plan.copy_size))
+
+    def check_free_space(self, can_delete_first):
+        # This function checks that the plan fits in the free space on the destination before anything is copied.
+        # It returns True if the plan only fits when the deletions are done before the copies (which is only
+        # allowed with can_delete_first), and exits if it doesn't fit at all.
+        # Updated files replace their old versions, except in snapshots, where nothing is replaced.
+        if not self.space_check:
+            return False
+        try:
+            free = shutil.disk_usage(self.plan.destination).free - FREE_SPACE_RESERVE
+        except OSError as e:
+            self.logger.log("Could not check the free space on %s: %s" % (self.plan.destination, e))
+            return False
+
+        # first check the worst case without looking at the destination, which is enough on most syncs
+        needed = 0
+        for index, rel_path, size, mtime_ns, exists in self.plan.iter_copy_records():
+            if not self.plan.copies.done[index]:
+                needed += self.allocated_size(size)
+        if needed <= free:
+            return False
 
-        print("Total file size to copy: %s" % file_size)
+        if not self.snapshot:
+            for index, rel_path, size, mtime_ns, exists in self.plan.iter_copy_records():
+                if exists and not self.plan.copies.done[index]:
+                    needed -= self.destination_size(rel_path)
+            if needed <= free:
+                return False
+
+        freed = 0
+        if can_delete_first:
+            for index, rel_path in self.plan.iter_deletions():
+                if not self.plan.deletions.done[index]:
+                    freed += self.destination_size(rel_path)
+            for rel_path in self.plan.subtrees_to_delete:
+                files, dirs = self.scanner.scan(os.path.join(self.plan.destination, rel_path), [])
+                freed += sum(self.allocated_size(record.size) for record in files.values())
+            if needed <= free + freed:
+                msg = "The sync needs %s and the destination only has %s free. " \
+                      "Deleting files before copying to make room." \
+                      % (self.format_size(needed), self.format_size(max(free, 0)))
+                print(msg), self.logger.log(msg)
+                return True
+
+        msg = "Not enough free space on the destination. The sync needs %s, but only %s is free%s. Exiting..." \
+              % (self.format_size(needed), self.format_size(max(free, 0)),
+                 " after deleting files" if freed else "")
+        print(msg), self.logger.log(msg)
+        sys.exit(1)
+
+    def allocated_size(self, size):
+        return (size + ALLOCATION_UNIT - 1) // ALLOCATION_UNIT * ALLOCATION_UNIT
+
+    def destination_size(self, rel_path):
+        try:
+            return self.allocated_size(os.stat(os.path.join(self.plan.destination, rel_path)).st_size)
+        except OSError:
+            return 0
+
+    def file_analyze_for_copy_update(self, source, destination, ignored_directories):
+        # This function determines which files need to be copied and which files need to be updated.
+        # The results are stored in the sync plan. If sync already analyzed the trees, that plan is reused.
+        if not self.copy_plan_ready:
+            self.file_analyze(source, destination, ignored_directories, find_orphans=False)
 
         # keep new and updated separate for now because it may be useful in the future
-        return new_count + updated_count
+        return len(self.plan.copies)
 
     def file_analyze_for_deletion(self, source, destination, ignored_directories):
-        # This function will analyze the source and destination directories and determine which files need to be deleted
-        # The source file and destination file will be added to the "files_to_delete" set.
-        # Directories to delete will be added to the "dirs_to_delete" set.
+        # This function determines which files and directories need to be deleted. The results are stored in the
+        # sync plan, directories children before parents. If sync already analyzed the trees, that plan is reused.
+        if not self.delete_plan_ready:
+            self.file_analyze(source, destination, ignored_directories, find_orphans=True)
+
+        return len(self.plan.deletions) + len(self.plan.subtrees_to_delete)
+
+    def manifest_update(self, source, destination):
+        # This function rebuilds the manifest from the analysis and the file operations that succeeded.
+        # Files that failed to copy keep their old entry (if any), so they are retried on the next sync.
+        records = list(self.tree_diff.unchanged_files)
+
+        for index, (old_rel_path, rel_path, size, mtime_ns) in enumerate(self.plan.moves):
+            if self.plan.moves_done[index]:
+                records.append(FileRecord(rel_path, size, mtime_ns))
+                if os.path.normcase(old_rel_path) in self.manifest.hashes:
+                    self.manifest.hashes[os.path.normcase(rel_path)] = \
+                        self.manifest.hashes.pop(os.path.normcase(old_rel_path))
+
+        for index, rel_path, size, mtime_ns, exists in self.plan.iter_copy_records():
+            key = os.path.normcase(rel_path)
+            if self.plan.copies.done[index]:
+                records.append(FileRecord(rel_path, size, mtime_ns))
+                if index in self.file_hashes:
+                    self.manifest.hashes[key] = self.file_hashes[index]
+                else:
+                    self.manifest.hashes.pop(key, None)
+            elif key in self.manifest.records:
+                records.append(self.manifest.records[key])
+
+        # orphans that weren't deleted are still in the destination
+        for index, rel_path in self.plan.iter_deletions():
+            if not self.plan.deletions.done[index]:
+                records.append(self.manifest.records.get(os.path.normcase(rel_path), FileRecord(rel_path, -1, -1)))
+        for rel_path in self.undeleted_files:
+            records.append(FileRecord(rel_path, -1, -1))
+
+        self.manifest.save(source, destination, records, self.manifest.hashes)
+
+    def plan_save(self, path):
+        try:
+            self.plan.save(path)
+        except OSError as e:
+            msg = "Could not write the plan to %s: %s" % (path, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
 
-        self.files_to_delete.clear()
-        deleted_count = 0
+        msg = "Plan saved to %s: %d files to move, %d files to copy, %d files to delete. " \
+              "Nothing was copied or deleted.\nRun Timber with --plan-in %s to carry out this plan." \
+              % (path, len(self.plan.moves), len(self.plan.copies),
+                 len(self.plan.deletions) if self.delete_preference else 0, path)
+        print(msg), self.logger.log(msg)
 
-        print("Analyzing files for deletion...")
+    def plan_load(self, path):
+        # This function loads a saved plan. The plan must have been made for the same source and destination.
+        # Whether files are deleted is decided by the plan, which records the delete preference it was made with.
+        plan = SyncPlan()
+        try:
+            plan.load(path)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            msg = "Could not load the plan %s: %s. Exiting..." % (path, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
 
-        # find files to delete from the destination
-        for root, dirs, files in os.walk(destination):
-            dirs[:] = [d for d in dirs if d not in ignored_directories]
-            if root != destination and os.path.relpath(root, destination) in ignored_directories:
-                continue
+        if plan.source != self.source or plan.destination != self.destination:
+            msg = "The plan %s was made for %s and %s, not %s and %s. Exiting..." \
+                  % (path, plan.source, plan.destination, self.source, self.destination)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
 
-            for file in files:
+        self.plan.close()
+        self.plan = plan
+        self.delete_preference = plan.delete_preference
+        self.copy_plan_ready = True
+        self.delete_plan_ready = plan.delete_preference
 
-                destination_file = os.path.join(root, file)
-                common_prefix = os.path.commonprefix([destination_file, destination])
-                source_file = os.path.join(source, os.path.relpath(destination_file, common_prefix))
+        msg = "Loaded plan %s: %d files to move, %d files to copy, %d files to delete." \
+              % (path, len(plan.moves), len(plan.copies), len(plan.deletions))
+        print(msg), self.logger.log(msg)
+        self.print_copy_size()
+
+    def journal_load(self):
+        # This function loads the plan of an interrupted sync, and the operations it finished, from its journal.
+        # Like a saved plan, it must have been made for the same source and destination, and it decides whether
+        # files are deleted.
+        path = self.journal.journal_path(self.destination)
+        plan = SyncPlan()
+        try:
+            plan.load(path)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            msg = "Could not read the journal %s: %s. Run without --resume to start over. Exiting..." % (path, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
 
-                if not os.path.exists(source_file):
-                    self.files_to_delete.append(destination_file)
-                    deleted_count += 1
+        if plan.source != self.source or plan.destination != self.destination:
+            msg = "The journal %s was written by a sync from %s to %s, not %s to %s. Exiting..." \
+                  % (path, plan.source, plan.destination, self.source, self.destination)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
 
-        # find empty directories to delete from the destination
-        for root, dirs, files in os.walk(destination, topdown=False):
-            dirs[:] = [d for d in dirs if d not in ignored_directories]
-            if root != destination and os.path.relpath(root, destination) in ignored_directories:
-                continue
+        self.plan.close()
+        self.plan = plan
+        self.delete_preference = plan.delete_preference
+        self.copy_plan_ready = True
+        self.delete_plan_ready = plan.delete_preference
+
+        msg = "Resuming an interrupted sync: %d of %d files left to move, %d of %d files left to copy, " \
+              "%d of %d files left to delete." \
+              % (plan.moves_done.count(0), len(plan.moves), plan.copies.done.count(0), len(plan.copies),
+                 plan.deletions.done.count(0) if plan.delete_preference else 0,
+                 len(plan.deletions) if plan.delete_preference else 0)
+        print(msg), self.logger.log(msg)
+
+    def duplicates_load(self, path):
+        # This function loads a duplicates report made for the source. Files that changed since the report was
+        # made aren't treated as duplicates.
+        duplicates = DuplicateIndex()
+        try:
+            duplicates.load(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            msg = "Could not load the duplicates report %s: %s. Exiting..." % (path, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        if os.path.normcase(os.path.abspath(duplicates.directory)) != os.path.normcase(os.path.abspath(self.source)):
+            msg = "The duplicates report %s was made for %s, not %s. Exiting..." % (path, duplicates.directory,
+                                                                                   self.source)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        self.duplicates = duplicates
+        self.duplicate_copies.clear()
+
+    def duplicate_group(self, source_file):
+        # Returns the duplicates report group of a source file, or None if it isn't a known duplicate.
+        rel_path = os.path.relpath(source_file, self.plan.source)
+        if not self.duplicates.contains(rel_path):
+            return None
+        try:
+            return self.duplicates.group_of(rel_path, os.stat(source_file).st_mtime_ns)
+        except OSError:
+            return None
+
+    def duplicate_copy(self, group, destination_file):
+        # Returns a file in the destination with the same contents as destination_file should have, or None.
+        # Files are only linked to copies made by this sync, which are known to be current. Skipping only needs
+        # one good copy of the group to be in the destination, so a file from an earlier sync will do too, if it is
+        # up to date: its source hasn't changed since the report was made, and the copy has the same size and
+        # isn't older than its source, which is how the analysis decides a file doesn't need updating.
+        with self.directory_lock:
+            copy = self.duplicate_copies.get(group)
+        if copy is None and self.duplicate_action == DUPLICATES_SKIP:
+            size, rel_paths = self.duplicates.groups[group]
+            for rel_path in rel_paths:
+                candidate = os.path.join(self.plan.destination, rel_path)
+                if candidate == destination_file:
+                    continue
+                try:
+                    source_mtime_ns = os.stat(os.path.join(self.plan.source, rel_path)).st_mtime_ns
+                    st = os.stat(candidate)
+                except OSError:
+                    continue
+                if self.duplicates.group_of(rel_path, source_mtime_ns) == group and st.st_size == size \
+                        and st.st_mtime_ns >= source_mtime_ns:
+                    return candidate
+        return copy
+
+    def is_hard_linked(self, path):
+        try:
+            return os.stat(path).st_nlink > 1
+        except OSError:
+            return False
 
-            for directory in dirs:
-                destination_dir = os.path.join(root, directory)
-                common_prefix = os.path.commonprefix([destination_dir, destination])
-                source_dir = os.path.join(source, os.path.relpath(destination_dir, common_prefix))
-                if not os.path.exists(source_dir):
-                    self.dirs_to_delete.append(destination_dir)
+    def resume_offset(self, source_file, destination_file, index, size):
+        # This function returns the number of bytes of an interrupted copy that can be kept. They are only kept
+        # if the source still has the size and modification time it had when they were copied, and the
+        # destination still holds them. Each offset is only used once, so a retried copy starts over.
+        offset, mtime_ns = self.plan.partial.pop(index, (0, 0))
+        if not offset:
+            return 0
+        try:
+            source_stat = os.stat(source_file)
+            if source_stat.st_size != size or source_stat.st_mtime_ns != mtime_ns or \
+                    os.path.getsize(destination_file) < offset:
+                return 0
+        except OSError:
+            return 0
+        return offset
+
+    def log_scanner_stats(self):
+        msg = "Analysis made %d stat calls (%d saved compared to checking each path separately)." \
+              % (self.scanner.stat_count, self.scanner.stats_saved())
+        print(msg), self.logger.log(msg)
 
-        return deleted_count
+    def metrics_save(self, sync_start):
+        # This function logs the metrics report and saves it to metrics_out, if a report was asked for.
+        if not self.metrics.enabled:
+            return
+        self.metrics.phases["total"] = time.perf_counter() - sync_start
+        report = self.metrics.report(self)
+        self.metrics_report = report
+        self.metrics.log(self.logger, report)
+        if not self.metrics_out:
+            return
+        try:
+            self.metrics.save(self.metrics_out, report)
+        except OSError as e:
+            msg = "Could not write the metrics report to %s: %s" % (self.metrics_out, e)
+            print(msg), self.logger.log(msg)
+            return
+        print("Metrics report saved to %s" % self.metrics_out)
+
+    def file_move(self, destination):
+        # This function renames the moved files found by the analysis in the destination. If a file can't be
+        # renamed, it is added to the plan to be copied, and the old file to be deleted, as if it wasn't a move.
+        # It returns a tuple of (moved files, new directories).
+        moved_count = 0
+        new_dir_count = 0
+        if not self.plan.moves:
+            return moved_count, new_dir_count
+
+        print("Moving files in the destination...")
+
+        for index, (old_rel_path, rel_path, size, mtime_ns) in enumerate(self.plan.moves):
+            if self.plan.moves_done[index]:
+                continue
+            old_file = os.path.join(destination, old_rel_path)
+            new_file = os.path.join(destination, rel_path)
+            self.logger.detail("Moving %s to %s", old_file, new_file)
+            try:
+                # a pipelined sync may be creating directories on its copy workers at the same time
+                with self.directory_lock:
+                    if not os.path.isdir(os.path.dirname(new_file)):
+                        os.makedirs(os.path.dirname(new_file))
+                        new_dir_count += 1
+                os.rename(old_file, new_file)
+            except OSError as e:
+                msg = "Could not move %s to %s: %s. Copying it instead." % (old_file, new_file, e)
+                print(msg), self.logger.log(msg)
+                self.plan.add_copy(rel_path, size, mtime_ns, False)
+                self.plan.add_deletion(old_rel_path)
+                # the copy and deletion take the move's place in the journal, so a resumed sync doesn't retry it
+                self.journal.record("new", rel_path, size, mtime_ns)
+                self.journal.record("delete", old_rel_path)
+                self.journal.record("moved", index)
+                continue
+            self.plan.moves_done[index] = 1
+            self.journal.record("moved", index)
+            moved_count += 1
+
+        return moved_count, new_dir_count
 
     def file_copy(self, source, destination, ignored_directories):
+        self.durable_writes.atomic = self.atomic_writes
         file_count = self.file_analyze_for_copy_update(source, destination, ignored_directories)
+        file_count -= self.plan.copies.done.count(1)
 
         # while analyze_files can count the new and updated files, redoing the count here
         # is more accurate, because file operation failures will not be counted.
-        new_count = 0
-        updated_count = 0
-        new_dir_count = 0
+        counts = [0, 0, 0]
+        counts_lock = threading.Lock()
+
+        small_files = self.small_files_supported()
+        if small_files:
+            counts[2] += self.make_destination_dirs()
 
         print("Copying new and updated files...")
 
         with tqdm(total=file_count, unit='file') as pbar:
-            for source_file, destination_file, exists in self.files_to_copy:
 
-                # if the destination directory doesn't exist, create it
-                destination_dir = os.path.dirname(destination_file)
-                if not os.path.exists(destination_dir):
-                    self.logger.log("Creating directory %s" % destination_dir)
+            def finish(result):
+                # Add the result of one file to the counts. Called from the copy workers when jobs > 1.
+                with counts_lock:
+                    for i in range(3):
+                        counts[i] += result[i]
+                    pbar.update(1)
+
+            if small_files:
+                self.copy_small_files(finish)
+
+            if self.jobs <= 1:
+                def copy(source_file, destination_file, exists, size, index):
                     try:
-                        os.makedirs(destination_dir)
-                        new_dir_count += 1
-                    except PermissionError:
-                        self.logger.log("Permission denied when trying to create directory %s. Skipping..."
-                                        % destination_dir)
-                        continue
+                        finish(self.copy_file_shared(source_file, destination_file, exists, size, index))
+                    except OSError as e:
+                        msg = "Error copying %s: %s. Skipping." % (source_file, e)
+                        print(msg), self.logger.log(msg)
+                        finish((0, 0, 0))
+
+                # start reading each file ahead while the one before it is copied
+                previous = None
+                for index, source_file, destination_file, exists, size in self.iter_copies(small_files):
+                    self.copy_backend.prefetch(source_file, size)
+                    if previous is not None:
+                        copy(*previous)
+                    previous = (source_file, destination_file, exists, size, index)
+                if previous is not None:
+                    copy(*previous)
+            else:
+                self.copy_files_concurrently(finish, small_files)
 
-                # while the file isn't created or updated properly (due to corruption), try three times
-                while_count = 0
+        self.durable_writes.finish(destination)
+
+        # the copy plan has been used up, so the next copy needs a fresh analysis
+        self.copy_plan_ready = False
+        self.log_copy_stats()
+
+        new_count, updated_count, new_dir_count = counts
+        return new_count, updated_count, new_dir_count
+
+    def log_copy_stats(self):
+        if self.copy_backend.tier_summary():
+            self.logger.log("Files copied by method: %s" % self.copy_backend.tier_summary())
+        if self.copy_backend.delta_bytes_written or self.copy_backend.delta_bytes_skipped:
+            msg = "Delta updates wrote %d bytes and avoided writing %d unchanged bytes." \
+                  % (self.copy_backend.delta_bytes_written, self.copy_backend.delta_bytes_skipped)
+            print(msg), self.logger.log(msg)
+
+    def file_copy_pipelined(self, source, destination, ignored_directories, find_orphans):
+        # This function analyzes the trees and copies files at the same time. Each directory's new and updated
+        # files are added to the plan and put on a bounded queue as soon as the directory is compared, and copy
+        # workers take them off the queue while the scan goes on. When the queue is full, the scan waits for
+        # the copies to catch up. The progress bar's total grows as files are found.
+        # With detect_moves, new files that could be moves are held back until the whole tree is compared and the
+        # moves are renamed, then copied with the rest. It returns a tuple of (new files, updated files,
+        # new directories, moved files).
+        self.durable_writes.atomic = self.atomic_writes
+        detect_moves = self.detect_moves and find_orphans
+        moved_count = 0
+        counts = [0, 0, 0]
+        counts_lock = threading.Lock()
+        work = queue.Queue(maxsize=self.jobs * PIPELINE_QUEUE_PER_JOB)
+        queued = [0]
+
+        print("Analyzing and copying files...")
+
+        with tqdm(total=0, unit='file') as pbar:
+
+            def finish(result):
+                with counts_lock:
+                    for i in range(3):
+                        counts[i] += result[i]
+                    pbar.update(1)
+
+            def enqueue(items):
+                with counts_lock:
+                    pbar.total += len(items)
+                    pbar.refresh()
+                for item in items:
+                    self.copy_backend.prefetch(item[1], item[4])
+                    work.put(item)
+
+            def listener(result):
+                # take the directory's copies out of the result and queue them right away, except the new files
+                # that file_analyze has to match with orphans first
+                new_files = result.new_files
+                if detect_moves:
+                    result.new_files = [record for record in new_files if record.size >= MOVE_MIN_SIZE]
+                    new_files = [record for record in new_files if record.size < MOVE_MIN_SIZE]
+                else:
+                    result.new_files = []
+                items = []
+                with self.directory_lock:
+                    for record, exists in self.order_copies(new_files, result.updated_files):
+                        self.plan.add_copy(record.rel_path, record.size, record.mtime_ns, exists)
+                        items.append((len(self.plan.copies) - 1, os.path.join(source, record.rel_path),
+                                      os.path.join(destination, record.rel_path), exists, record.size))
+                    queued[0] += len(items)
+                result.updated_files = []
+                enqueue(items)
+
+            def worker():
                 while True:
-                    while_count += 1
-                    if while_count > 3:
+                    item = work.get()
+                    if item is None:
                         break
+                    index, source_file, destination_file, exists, size = item
+                    try:
+                        finish(self.copy_file_shared(source_file, destination_file, exists, size, index))
+                    except OSError as e:
+                        msg = "Error copying %s: %s. Skipping." % (source_file, e)
+                        print(msg), self.logger.log(msg)
+                        finish((0, 0, 0))
+
+            workers = [threading.Thread(target=worker, daemon=True) for _ in range(self.jobs)]
+            for thread in workers:
+                thread.start()
+
+            self.tree_diff.listener = listener
+            try:
+                self.file_analyze(source, destination, ignored_directories, find_orphans)
+                moved_count, moved_dir_count = self.file_move(destination)
+                with counts_lock:
+                    counts[2] += moved_dir_count
+            finally:
+                self.tree_diff.listener = None
+
+                # The manifest comparison doesn't go directory by directory, so its copies are queued here, with
+                # the files held back to look for moves.
+                enqueue([item for item in self.plan.iter_copies() if item[0] >= queued[0]])
+
+                for thread in workers:
+                    work.put(None)
+                for thread in workers:
+                    thread.join()
+
+        self.durable_writes.finish(destination)
+        self.copy_plan_ready = False
+        self.log_copy_stats()
+
+        new_count, updated_count, new_dir_count = counts
+        return new_count, updated_count, new_dir_count, moved_count
+
+    def iter_copies(self, skip_small_files):
+        # Like SyncPlan.iter_copies, but leaves out the files that were already copied, and the files
+        # copy_small_files handles if skip_small_files is True.
+        for item in self.plan.iter_copies():
+            if self.plan.copies.done[item[0]]:
+                continue
+            if not (skip_small_files and self.is_small_file(item[4], item[3])):
+                yield item
+
+    def small_files_supported(self):
+        # The small file path needs directory descriptors, which Windows doesn't have. Verified copies read
+        # the destination back, so they always take the normal path.
+        # Duplicates are linked or skipped by copy_file, so they take the normal path too.
+        return self.small_file_size is not None and not self.verify and self.duplicates is None and \
+            hasattr(os, "O_DIRECTORY") and \
+            os.open in os.supports_dir_fd and os.unlink in os.supports_dir_fd and os.utime in os.supports_fd
+
+    def is_small_file(self, size, exists):
+        # Files that are updated by delta copies are never handled as small files.
+        return size < self.small_file_size and \
+            not (exists and self.delta_min_size is not None and size >= self.delta_min_size)
+
+    def make_destination_dirs(self):
+        # This function creates every destination directory that files will be copied to before copying starts,
+        # so the copies don't have to check for them. It returns the number of directories created.
+        dir_ids = set(dir_id for index, dir_id, name, size, mtime_ns, flag in self.plan.copies)
+        created = 0
+        for rel_dir in sorted(self.plan.dirs[dir_id] for dir_id in dir_ids):
+            destination_dir = os.path.join(self.plan.destination, rel_dir) if rel_dir else self.plan.destination
+            if os.path.isdir(destination_dir):
+                continue
+            self.logger.log("Creating directory %s" % destination_dir)
+            try:
+                os.makedirs(destination_dir)
+                created += 1
+            except OSError as e:
+                # the files in this directory fall back to copy_file, which reports the error
+                self.logger.log("Could not create directory %s: %s" % (destination_dir, e))
+        return created
+
+    def copy_small_files(self, finish):
+        # This function copies the small files in the plan in batches. The plan is grouped by directory, so
+        # every batch is from one directory. Batches are copied on self.jobs threads, within the copy budget.
+
+        def batches():
+            batch = []
+            batch_dir_id = None
+            for index, dir_id, name, size, mtime_ns, flag in self.plan.copies:
+                exists = flag == FLAG_UPDATE
+                if self.plan.copies.done[index] or not self.is_small_file(size, exists):
+                    continue
+                if batch and (dir_id != batch_dir_id or len(batch) >= SMALL_FILE_BATCH):
+                    yield batch_dir_id, batch
+                    batch = []
+                batch_dir_id = dir_id
+                batch.append((index, name, size, exists))
+            if batch:
+                yield batch_dir_id, batch
+
+        if self.jobs <= 1:
+            for dir_id, batch in batches():
+                batch_size = sum(entry[2] for entry in batch)
+                if self.copy_budget is not None:
+                    self.copy_budget.acquire(batch_size)
+                try:
+                    self.copy_small_batch(dir_id, batch, finish)
+                finally:
+                    if self.copy_budget is not None:
+                        self.copy_budget.release(batch_size)
+            return
+
+        budget = self.copy_budget or CopyBudget(max_files=self.jobs * DEFAULT_FILES_PER_JOB)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for dir_id, batch in batches():
+                batch_size = sum(entry[2] for entry in batch)
+                budget.acquire(batch_size)
+                future = pool.submit(self.copy_small_batch, dir_id, batch, finish)
+                future.add_done_callback(lambda f, n=batch_size: budget.release(n))
+
+    def copy_small_batch(self, dir_id, batch, finish):
+        # Opens the source and destination directory once and copies a batch of files between them.
+        # If either directory can't be opened, the files are copied by copy_file, which reports any errors.
+        rel_dir = self.plan.dirs[dir_id]
+        source_dir = os.path.join(self.plan.source, rel_dir) if rel_dir else self.plan.source
+        destination_dir = os.path.join(self.plan.destination, rel_dir) if rel_dir else self.plan.destination
+        source_fd = None
+        destination_fd = None
+        try:
+            source_fd = os.open(source_dir, os.O_RDONLY | os.O_DIRECTORY)
+            destination_fd = os.open(destination_dir, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            pass
 
-                    # if the file already exists, update it
-                    if exists:
-                        self.logger.log("Updating %s" % destination_file)
-                        # try to delete then copy file, but if it's in use, skip it
+        try:
+            for index, name, size, exists in batch:
+                if destination_fd is None:
+                    result = self.copy_file(os.path.join(source_dir, name), os.path.join(destination_dir, name),
+                                            exists, size, index)
+                else:
+                    result = self.copy_small_file(source_fd, destination_fd, source_dir, destination_dir,
+                                                  index, name, size, exists)
+                finish(result)
+        finally:
+            for fd in (source_fd, destination_fd):
+                if fd is not None:
+                    os.close(fd)
+
+    def copy_small_file(self, source_fd, destination_fd, source_dir, destination_dir, index, name, size, exists):
+        # This function copies one small file with a single read and a single write, opening it relative to the
+        # open directories so its path is never looked up again. Like copy_file, new files get the source's mode
+        # and updated files get its mode and times. If the file changes size while it is read, or anything else
+        # goes wrong, it is copied by copy_file instead. Returns (new files, updated files, new directories).
+        start = time.perf_counter()
+        try:
+            fd = os.open(name, os.O_RDONLY, dir_fd=source_fd)
+            try:
+                st = os.fstat(fd)
+                data = os.read(fd, st.st_size + 1)
+            finally:
+                os.close(fd)
+            if len(data) != st.st_size:
+                raise OSError("%s changed while it was read" % name)
+
+            if exists:
+                self.logger.detail("Updating %s in %s", name, destination_dir)
+                if not self.atomic_writes:
+                    try:
+                        os.unlink(name, dir_fd=destination_fd)
+                    except FileNotFoundError:
+                        pass
+            else:
+                self.logger.detail("Copying %s from %s to %s", name, source_dir, destination_dir)
+
+            target = name + TEMP_FILE_SUFFIX if self.atomic_writes else name
+            fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600, dir_fd=destination_fd)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                os.fchmod(fd, stat.S_IMODE(st.st_mode))
+                if exists:
+                    os.utime(fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+                if self.durable_writes.sync_each_file:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            if self.atomic_writes:
+                os.rename(target, name, src_dir_fd=destination_fd, dst_dir_fd=destination_fd)
+            self.durable_writes.file_written(os.path.join(destination_dir, name))
+        except PermissionError:
+            self.logger.log("Permission denied when trying to copy file. Skipping %s"
+                            % os.path.join(destination_dir, name))
+            return 0, 0, 0
+        except OSError:
+            return self.copy_file(os.path.join(source_dir, name), os.path.join(destination_dir, name),
+                                  exists, size, index)
+
+        with self.directory_lock:
+            self.plan.copies.done[index] = 1
+            self.journal.record("copied", index)
+        if self.metrics.enabled:
+            self.metrics.record_copy(os.path.join(source_dir, name), len(data), time.perf_counter() - start,
+                                     len(data), len(data))
+        return (0, 1, 0) if exists else (1, 0, 0)
+
+    def copy_files_concurrently(self, finish, skip_small_files=False):
+        # This function copies the files in the sync plan on self.jobs threads. Any thread copies any file, but
+        # while smaller files are being copied at most half of them copy files of LARGE_FILE_SIZE or more, so large
+        # files stream while small files keep the rest of the workers busy. Large files that can't start yet wait
+        # on their own queue, so they never hold up the small files behind them, and start as workers free up.
+        # The copy budget keeps the number of small files and bytes in flight bounded, so a huge plan is never
+        # queued up in memory at once.
+        budget = self.copy_budget or CopyBudget(max_files=self.jobs * DEFAULT_FILES_PER_JOB)
+        large_slots = max(self.jobs // 2, 1)
+        large_running = [0]
+        small_running = [0]
+        large_waiting = collections.deque()
+        large_condition = threading.Condition()
+
+        def copy(index, source_file, destination_file, exists, size):
+            try:
+                result = self.copy_file(source_file, destination_file, exists, size, index)
+            except OSError as e:
+                msg = "Error copying %s: %s. Skipping." % (source_file, e)
+                print(msg), self.logger.log(msg)
+                result = (0, 0, 0)
+            finish(result)
+
+        def copy_large(item):
+            # large files are bounded by their slots, but still count against a budget shared with other syncs
+            if self.copy_budget is None:
+                copy(*item)
+                return
+            self.copy_budget.acquire(item[4])
+            try:
+                copy(*item)
+            finally:
+                self.copy_budget.release(item[4])
+
+        def start_large():
+            # Starts waiting large files while there are workers for them. Called with large_condition held.
+            limit = large_slots if small_running[0] else self.jobs
+            while large_waiting and large_running[0] < limit:
+                large_running[0] += 1
+                pool.submit(copy_large, large_waiting.popleft()).add_done_callback(large_done)
+            large_condition.notify_all()
+
+        def large_done(future):
+            with large_condition:
+                large_running[0] -= 1
+                start_large()
+
+        def small_done(future, size):
+            budget.release(size)
+            with large_condition:
+                small_running[0] -= 1
+                start_large()
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for item in self.iter_copies(skip_small_files):
+                index, source_file, destination_file, exists, size = item
+                self.copy_backend.prefetch(source_file, size)
+                if size >= LARGE_FILE_SIZE:
+                    with large_condition:
+                        large_waiting.append(item)
+                        start_large()
+                    continue
+                budget.acquire(size)
+                with large_condition:
+                    small_running[0] += 1
+                future = pool.submit(copy, *item)
+                future.add_done_callback(lambda f, n=size: small_done(f, n))
+
+            # the pool can't take new files once it starts shutting down, so wait for every large file to start
+            with large_condition:
+                while large_waiting:
+                    large_condition.wait()
+
+    def copy_file_shared(self, source_file, destination_file, exists, size, index=None):
+        # Copies one file within the copy budget, if one is shared with other syncs. Copies made one at a time
+        # aren't otherwise counted against a budget.
+        if self.copy_budget is None:
+            return self.copy_file(source_file, destination_file, exists, size, index)
+        self.copy_budget.acquire(size)
+        try:
+            return self.copy_file(source_file, destination_file, exists, size, index)
+        finally:
+            self.copy_budget.release(size)
+
+    def copy_file(self, source_file, destination_file, exists, size, index=None):
+        # This function copies or updates a single file, retrying up to three times if the copy is corrupt.
+        # It returns a tuple of (new files, updated files, new directories) for this file.
+        # If the file's plan index is given, the plan entry is marked as done when the copy succeeds.
+        # With atomic_writes, the file is copied to a temporary file that is checked and then renamed into place,
+        # except for delta updates, which always rewrite the destination in place.
+        # It is safe to call from several copy workers at once.
+        new_count = 0
+        updated_count = 0
+        new_dir_count = 0
+        start = time.perf_counter()
+        bytes_read = 0
+        bytes_written = 0
+
+        # if the destination directory doesn't exist, create it
+        destination_dir = os.path.dirname(destination_file)
+        with self.directory_lock:
+            if not os.path.exists(destination_dir):
+                self.logger.log("Creating directory %s" % destination_dir)
+                try:
+                    os.makedirs(destination_dir)
+                    new_dir_count += 1
+                except PermissionError:
+                    self.logger.log("Permission denied when trying to create directory %s. Skipping..."
+                                    % destination_dir)
+                    return new_count, updated_count, new_dir_count
+
+        # while the file isn't created or updated properly (due to corruption), try three times
+        # a new file that duplicates one already in the destination is hard linked to it or skipped
+        group = None
+        linked = False
+        if self.duplicates is not None and not exists:
+            group = self.duplicate_group(source_file)
+            copy = self.duplicate_copy(group, destination_file) if group is not None else None
+            if copy is not None and self.duplicate_action == DUPLICATES_SKIP:
+                self.logger.detail("Skipping %s, a duplicate of %s", destination_file, copy)
+                return new_count, updated_count, new_dir_count
+            if copy is not None:
+                try:
+                    os.link(copy, destination_file)
+                    self.logger.detail("Linking %s to its duplicate %s", destination_file, copy)
+                    linked = True
+                except OSError as e:
+                    self.logger.log("Could not link %s to %s: %s. Copying it instead." % (destination_file, copy, e))
+
+        while_count = 0
+        copied = linked
+        source_hash = None
+        durable = self.durable_writes.sync_each_file
+        # A delta update writes into the destination file, which would change every other hard link to it too.
+        in_place = exists and self.delta_min_size is not None and size >= self.delta_min_size and \
+            not self.is_hard_linked(destination_file)
+        target = destination_file + TEMP_FILE_SUFFIX if self.atomic_writes and not in_place else destination_file
+        while not linked:
+            while_count += 1
+            if while_count > 3:
+                break
+
+            hasher = new_hasher() if self.verify else None
+            resumable = self.journal.file is not None and index is not None and size >= RESUMABLE_MIN_SIZE
+
+            # if the file is large and already exists, rewrite only the blocks that changed
+            if in_place:
+                self.logger.detail("Updating changed blocks of %s", destination_file)
+                try:
+                    bytes_written += self.copy_backend.copy_delta(source_file, destination_file, hasher=hasher,
+                                                                  durable=durable)
+                    bytes_read += 2 * size
+                    copied = True
+                except PermissionError:
+                    self.logger.log("Permission denied when trying to update %s. Skipping..." % destination_file)
+
+            # if the file is large and the sync is journaled, copy it in pieces that are recorded in the journal,
+            # continuing from the last one recorded if the copy was interrupted
+            elif resumable:
+                offset = self.resume_offset(source_file, target, index, size)
+                if offset:
+                    self.logger.detail("Resuming the copy of %s at byte %d", destination_file, offset)
+                elif exists:
+                    self.logger.detail("Updating %s", destination_file)
+                else:
+                    self.logger.detail("Copying %s to %s", source_file, destination_file)
+                try:
+                    if exists and not offset and not self.atomic_writes:
                         try:
                             os.remove(destination_file)
-                            shutil.copy2(source_file, destination_file)
-                            updated_count += 1
-                        except PermissionError:
-                            self.logger.log("Permission denied when trying to delete then copy %s. Skipping..."
-                                            % destination_file)
-
-                    # if the file doesn't exist, copy it
-                    elif not exists:
-                        self.logger.log("Copying %s to %s" % (source_file, destination_file))
+                        except FileNotFoundError:
+                            pass
+                    # Pieces are only forced to disk when the durability policy asks for it. Otherwise they are
+                    # recorded like any other progress, which is enough to resume a sync that was stopped or killed.
+                    mtime_ns = os.stat(source_file).st_mtime_ns
+                    sync_checkpoints = self.durable_writes.policy != DURABILITY_NONE
+                    record = self.journal.checkpoint if sync_checkpoints else self.journal.record
+                    self.copy_backend.copy_resumable(source_file, target, offset,
+                                                     lambda n: record("partial", index, n, mtime_ns),
+                                                     preserve_metadata=exists, hasher=hasher, durable=durable,
+                                                     sync_checkpoints=sync_checkpoints)
+                    bytes_read += size if hasher is not None else size - offset
+                    bytes_written += size - offset
+                    copied = True
+                except PermissionError:
+                    self.logger.log("Permission denied when trying to copy file. Skipping %s" % destination_file)
+
+            # if the file already exists, update it
+            elif exists:
+                self.logger.detail("Updating %s", destination_file)
+                # try to delete then copy file, but if it's in use, skip it
+                try:
+                    if not self.atomic_writes:
                         try:
-                            shutil.copy(source_file, destination_file)
-                            new_count += 1
-                        except PermissionError:
-                            self.logger.log("Permission denied when trying to copy file. Skipping %s"
-                                            % destination_file)
-                    if self.check_corrupt(source_file, destination_file):
-                        continue
-                    else:
-                        break
+                            os.remove(destination_file)
+                        except FileNotFoundError:
+                            pass
+                    self.copy_backend.copy(source_file, target, preserve_metadata=True, hasher=hasher,
+                                           durable=durable)
+                    bytes_read += size
+                    bytes_written += size
+                    copied = True
+                except PermissionError:
+                    self.logger.log("Permission denied when trying to delete then copy %s. Skipping..."
+                                    % destination_file)
 
-                pbar.update(1)
+            # if the file doesn't exist, copy it
+            elif not exists:
+                self.logger.detail("Copying %s to %s", source_file, destination_file)
+                try:
+                    self.copy_backend.copy(source_file, target, preserve_metadata=False, hasher=hasher,
+                                           durable=durable)
+                    bytes_read += size
+                    bytes_written += size
+                    copied = True
+                except PermissionError:
+                    self.logger.log("Permission denied when trying to copy file. Skipping %s"
+                                    % destination_file)
+            source_hash = hasher.digest() if hasher is not None and copied else None
+            if source_hash is not None:
+                # the destination is read back to check it
+                bytes_read += size
+            if self.check_corrupt(source_file, target, source_hash):
+                copied = False
+                continue
+            else:
+                break
+
+        if copied and target != destination_file and not linked:
+            try:
+                os.replace(target, destination_file)
+            except OSError as e:
+                msg = "Could not replace %s with its new copy: %s. Skipping." % (destination_file, e)
+                print(msg), self.logger.log(msg)
+                copied = False
+
+        if copied:
+            self.durable_writes.file_written(destination_file)
+            if group is not None:
+                with self.directory_lock:
+                    self.duplicate_copies.setdefault(group, destination_file)
+            if exists:
+                updated_count += 1
+            else:
+                new_count += 1
+            if index is not None:
+                with self.directory_lock:
+                    self.plan.copies.done[index] = 1
+                    self.journal.record("copied", index)
+                    if source_hash is not None:
+                        self.file_hashes[index] = source_hash
+            if self.metrics.enabled:
+                self.metrics.record_copy(source_file, size, time.perf_counter() - start, bytes_read, bytes_written)
 
         return new_count, updated_count, new_dir_count
 
     def file_delete(self, source, destination, ignored_directories):
-        file_count = self.file_analyze_for_deletion(source, destination, ignored_directories)
+        self.file_analyze_for_deletion(source, destination, ignored_directories)
+
+        # the deletion plan is used up here, so the next deletion needs a fresh analysis
+        self.delete_plan_ready = False
 
-        if file_count == 0:
+        file_count = self.plan.deletions.done.count(0)
+        if file_count == 0 and len(self.plan.dirs_to_delete) == 0 and len(self.plan.subtrees_to_delete) == 0:
             return 0, 0
 
-        deleted_count = 0
-        deleted_dir_count = 0
+        # counts holds (deleted files, deleted directories) and is updated by the delete workers
+        counts = [0, 0]
+        counts_lock = threading.Lock()
 
         print("Deleting files from destination that are not in source...")
 
+        # the number of files in orphaned directories isn't known until they are listed, so the total grows
         with tqdm(total=file_count, unit='file') as pbar:
-            for destination_file in self.files_to_delete:
-                self.logger.log("Deleting %s" % destination_file)
-                try:
-                    os.remove(destination_file)
-                    deleted_count += 1
-                except PermissionError:
-                    self.logger.log("Permission denied when trying to delete file. Skipping %s" % destination_file)
-                    print("Permission denied when trying to delete file. Skipping %s" % destination_file)
 
-                pbar.update(1)
+            def finish(deleted_files, listed_files=None):
+                # Called for each file in the plan, or with the number of files listed in an orphaned directory.
+                with counts_lock:
+                    counts[0] += deleted_files
+                    if listed_files is None:
+                        pbar.update(1)
+                    elif listed_files:
+                        pbar.total += listed_files
+                        pbar.update(listed_files)
+
+            if self.jobs <= 1:
+                for index, rel_path in self.plan.iter_deletions():
+                    if not self.plan.deletions.done[index]:
+                        finish(self.delete_file(destination, index, rel_path))
+            else:
+                budget = CopyBudget(max_files=self.jobs * DEFAULT_FILES_PER_JOB)
+                with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                    for index, rel_path in self.plan.iter_deletions():
+                        if self.plan.deletions.done[index]:
+                            continue
+                        budget.acquire(0)
+                        future = pool.submit(self.delete_file, destination, index, rel_path)
+                        future.add_done_callback(lambda f: (budget.release(0), finish(f.result())))
+
+            for index, rel_path in enumerate(self.plan.subtrees_to_delete):
+                if self.plan.subtrees_done[index]:
+                    continue
+                counts[1] += self.delete_subtree(destination, rel_path, ignored_directories, finish)
+                self.plan.subtrees_done[index] = 1
+                self.journal.record("deleted_tree", index)
 
         # delete directories that do not exist in source
         print("Deleting directories that are not in source...")
 
-        for destination_dir in self.dirs_to_delete:
-            self.logger.log("Deleting %s" % destination_dir)
+        for rel_path in self.plan.dirs_to_delete:
+            destination_dir = os.path.join(destination, rel_path)
+            self.logger.detail("Deleting %s", destination_dir)
             try:
                 os.rmdir(destination_dir)
-                deleted_dir_count += 1
+                counts[1] += 1
+            except FileNotFoundError:
+                # already deleted by a sync that was interrupted
+                continue
             except OSError:
                 self.logger.log("Could not delete %s." % destination_dir)
                 print("Could not delete %s." % destination_dir)
                 continue
 
+        deleted_count, deleted_dir_count = counts
         return deleted_count, deleted_dir_count
 
+    def delete_file(self, destination, index, rel_path):
+        # Deletes one orphaned file and marks it as done in the plan. Returns 1 if it was deleted, otherwise 0.
+        destination_file = os.path.join(destination, rel_path)
+        self.logger.detail("Deleting %s", destination_file)
+        try:
+            os.remove(destination_file)
+        except PermissionError:
+            self.logger.log("Permission denied when trying to delete file. Skipping %s" % destination_file)
+            print("Permission denied when trying to delete file. Skipping %s" % destination_file)
+            return 0
+        except OSError as e:
+            msg = "Could not delete %s: %s" % (destination_file, e)
+            print(msg), self.logger.log(msg)
+            return 0
+        self.plan.deletions.done[index] = 1
+        self.journal.record("deleted", index)
+        return 1
+
+    def delete_subtree(self, destination, rel_root, ignored_directories, finish):
+        # This function deletes an orphaned directory and everything in it. The directories are listed with the
+        # scanner's walk_tree on self.jobs threads, and each directory's files are deleted by the thread that
+        # listed it. Then the directories are removed, children before parents. Ignored directories and files are
+        # kept, like they are when the destination is analyzed, so their parents are kept too.
+        # finish(deleted files, listed files) is called for each directory. Returns the number of directories
+        # deleted. Files that can't be deleted are added to undeleted_files.
+
+        def visit(rel_dir):
+            deleted_count = 0
+            listed_count = 0
+            undeleted = []
+            subdirs = []
+            for entry in self.scanner.list_directory(os.path.join(destination, rel_dir)):
+                rel_path = os.path.join(rel_dir, entry.name)
+                if self.scanner.entry_is_dir(entry) and not entry.is_symlink():
+                    if not self.scanner.is_ignored(entry.name, rel_path, ignored_directories):
+                        subdirs.append(rel_path)
+                    continue
+                if self.scanner.is_ignored_file(entry.name, rel_path, ignored_directories):
+                    continue
+                listed_count += 1
+                self.logger.detail("Deleting %s", entry.path)
+                try:
+                    os.remove(entry.path)
+                    deleted_count += 1
+                except OSError as e:
+                    self.logger.log("Could not delete %s: %s" % (entry.path, e))
+                    undeleted.append(rel_path)
+            finish(deleted_count, listed_count)
+            return (rel_dir, undeleted), subdirs
+
+        deleted_dir_count = 0
+        results = self.scanner.walk_tree(visit, rel_root, jobs=self.jobs)
+        for rel_dir, undeleted in reversed(results):
+            self.undeleted_files.extend(undeleted)
+            destination_dir = os.path.join(destination, rel_dir)
+            self.logger.detail("Deleting %s", destination_dir)
+            try:
+                os.rmdir(destination_dir)
+                deleted_dir_count += 1
+            except OSError:
+                self.logger.log("Could not delete %s." % destination_dir)
+                print("Could not delete %s." % destination_dir)
+        return deleted_dir_count
+
+    def latest_snapshot(self, root):
+        # Returns the name of the newest finished snapshot in root, or "" if there isn't one.
+        # Snapshot names sort by date and time, so the newest is the last one.
+        snapshots = [entry.name for entry in self.scanner.list_directory(root)
+                     if SNAPSHOT_NAME_PATTERN.match(entry.name) and self.scanner.entry_is_dir(entry)]
+        return max(snapshots) if snapshots else ""
+
+    def file_link(self, previous, snapshot):
+        # This function hard links each unchanged file from the previous snapshot into the new one. If a file
+        # can't be linked (for example, because it has reached the filesystem's link limit), it is added to the
+        # plan to be copied from the source instead. It returns the number of files linked.
+        linked_count = 0
+        made_dirs = set()
+
+        print("Linking unchanged files to the previous snapshot...")
+
+        with tqdm(total=len(self.tree_diff.unchanged_files), unit='file') as pbar:
+            for record in self.tree_diff.unchanged_files:
+                previous_file = os.path.join(previous, record.rel_path)
+                snapshot_file = os.path.join(snapshot, record.rel_path)
+                rel_dir = os.path.dirname(record.rel_path)
+                try:
+                    if rel_dir not in made_dirs:
+                        os.makedirs(os.path.join(snapshot, rel_dir), exist_ok=True)
+                        made_dirs.add(rel_dir)
+                    try:
+                        os.link(previous_file, snapshot_file)
+                    except FileExistsError:
+                        # left over from an interrupted snapshot
+                        os.remove(snapshot_file)
+                        os.link(previous_file, snapshot_file)
+                    linked_count += 1
+                except OSError as e:
+                    self.logger.log("Could not link %s to %s: %s. Copying it instead."
+                                    % (snapshot_file, previous_file, e))
+                    self.plan.add_copy(record.rel_path, record.size, record.mtime_ns, False)
+                pbar.update(1)
+
+        self.tree_diff.unchanged_files.clear()
+        return linked_count
+
+    def sync_snapshot(self, sync_start):
+        # This function makes a new snapshot of the source in the destination directory. The source is compared
+        # with the newest snapshot, unchanged files are linked to it and new and changed files are copied.
+        # Nothing in an earlier snapshot is ever changed, because every file in it may be linked to later ones.
+        if self.plan_in or self.plan_out:
+            msg = "Saved plans can't be used with snapshots. Exiting..."
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        if self.use_manifest:
+            msg = "The manifest is not used with snapshots."
+            print(msg), self.logger.log(msg)
+            self.use_manifest = False
+
+        previous = self.latest_snapshot(self.destination)
+        name = time.strftime(SNAPSHOT_DATE_FORMAT)
+        if os.path.exists(os.path.join(self.destination, name)):
+            name = time.strftime(SNAPSHOT_TIME_FORMAT)
+        snapshot = os.path.join(self.destination, name)
+        building = snapshot + SNAPSHOT_INCOMPLETE_SUFFIX
+        os.makedirs(building, exist_ok=True)
+
+        if previous:
+            msg = "Making snapshot %s based on %s." % (name, previous)
+            previous = os.path.join(self.destination, previous)
+        else:
+            msg = "Making the first snapshot, %s." % name
+        print(msg), self.logger.log(msg)
+
+        with self.metrics.phase("analyze"):
+            self.file_analyze(self.source, previous or building, self.ignored_directories, find_orphans=False)
+        # new and changed files are copied into the new snapshot, not the one they were compared with
+        self.plan.destination = building
+
+        self.check_free_space(False)
+
+        linked_count = 0
+        if previous:
+            with self.metrics.phase("link"):
+                linked_count = self.file_link(previous, building)
+
+        with self.metrics.phase("copy"):
+            new_count, updated_count, new_dir_count = self.file_copy(self.source, building, self.ignored_directories)
+        self.plan.close()
+
+        try:
+            os.rename(building, snapshot)
+        except OSError as e:
+            msg = "Could not rename %s to %s: %s" % (building, snapshot, e)
+            print(msg), self.logger.log(msg)
+            snapshot = building
+
+        msg = f"Snapshot complete: {snapshot}\n" \
+              f"{new_count} new files copied | {updated_count} changed files copied | " \
+              f"{linked_count} unchanged files linked\n"
+        print(msg), self.logger.log(msg)
+        self.counts = {"copied": new_count, "updated": updated_count, "linked": linked_count}
+        self.metrics_save(sync_start)
+        print("See %s for additional details." % self.logger.path)
+        self.logger.close_log()
+
     def set_sync_settings(self, source="", destination="", ignored_directories="", delete_preference=False):
         self.source = source
 
@@ -279,19 +1441,26 @@ class TimberSync:
 
         self.destination = destination
 
-        # check if the destination has a colon or double backslash
-        if self.destination[1] != ":" and (self.destination[0] + self.destination[1]) != "\\\\":
+        # on Windows, check if the destination has a colon or double backslash.
+        # on other systems, the destination must be an absolute path.
+        if os.name != "nt":
+            if not os.path.isabs(self.destination):
+                msg = "Invalid destination directory. Exiting..."
+                print(msg), self.logger.log(msg)
+                sys.exit(1)
+
+        elif self.destination[1] != ":" and (self.destination[0] + self.destination[1]) != "\\\\":
             msg = "Invalid destination directory. Exiting..."
             print(msg), self.logger.log(msg)
             sys.exit(1)
 
-        if (self.destination[0] + self.destination[1]) != "\\\\" and not os.path.exists(self.destination[0] + ":"):
+        elif (self.destination[0] + self.destination[1]) != "\\\\" and not os.path.exists(self.destination[0] + ":"):
             msg = "Invalid destination drive letter. Exiting..."
             print(msg), self.logger.log(msg)
             sys.exit(1)
 
         if not all(c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-. "
-                   for c in self.destination.split("\\")[-1]):
+                   for c in re.split(r"[\\/]", self.destination)[-1]):
             msg = "Invalid destination directory due to illegal characters. Exiting..."
             print(msg), self.logger.log(msg)
             sys.exit(1)
@@ -310,7 +1479,7 @@ class TimberSync:
                 print(msg), self.logger.log(msg)
                 sys.exit(1)
 
-        if ignored_directories != "":
+        if ignored_directories != "" or self.exclude_patterns or self.exclude_from:
             self.set_ignored_directories(ignored_directories)
 
         self.delete_preference = delete_preference
@@ -319,13 +1488,19 @@ class TimberSync:
         print(msg), self.logger.log(msg)
 
     def set_ignored_directories(self, ignored_directories=""):
-        self.ignored_directories = ignored_directories
-
-        self.ignored_directories = self.ignored_directories.split(",")
-        # format the ignored directories to be compatible with the os.walk() function
-        for i in range(len(self.ignored_directories)):
-            self.ignored_directories[i] = self.ignored_directories[i].replace("\\", "/")
-        self.ignored_directories.append("$RECYCLE.BIN")
+        # This function compiles the comma separated ignored directories, exclude_patterns and the rules in
+        # exclude_from, in that order, into one ExcludeMatcher. Later rules win, so the file can include again
+        # what the other rules exclude.
+        try:
+            self.ignored_directories = compile_excludes(ignored_directories, self.exclude_patterns, self.exclude_from)
+        except (OSError, UnicodeDecodeError) as e:
+            msg = "Could not read the exclude rules in %s: %s. Exiting..." % (self.exclude_from, e)
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
+        except re.error as e:
+            msg = "Invalid exclude pattern: %s. Exiting..." % e
+            print(msg), self.logger.log(msg)
+            sys.exit(1)
 
     def update_dirname_datetime(self, source, new_destination_dirname):
         # If the source directory contains YYYY-MMDD in the name,
@@ -347,29 +1522,121 @@ class TimberSync:
 
     def sync(self, source, destination, ignored_directories, delete_preference):
 
+        self.metrics.reset()
+        self.metrics.enabled = bool(self.metrics_out) or self.record_metrics
+        self.metrics_report = None
+        self.counts = {}
+        sync_start = time.perf_counter()
+
         # check if the sync settings are valid and if so, set them
         self.set_sync_settings(source, destination, ignored_directories, delete_preference)
 
+        self.file_hashes.clear()
+        self.undeleted_files.clear()
+        if self.dupes_in:
+            self.duplicates_load(self.dupes_in)
+
+        if self.snapshot:
+            self.sync_snapshot(sync_start)
+            return
+
+        # An interrupted sync leaves its journal in the destination. With resume, the sync carries on from it.
+        resuming = self.resume and not self.plan_in and self.journal.exists(self.destination)
+        if self.resume and not resuming and not self.plan_in:
+            msg = "There is no interrupted sync to resume in %s. Running a full sync." % self.destination
+            print(msg), self.logger.log(msg)
+        elif not self.resume and self.journal.exists(self.destination):
+            msg = "A sync to %s was interrupted. Starting over; run with --resume to continue it instead." \
+                  % self.destination
+            print(msg), self.logger.log(msg)
+        pipelined = self.pipeline and not self.plan_in and not resuming
+
+        with self.metrics.phase("analyze"):
+            if self.plan_in:
+                # run a plan that was saved earlier instead of analyzing the trees again
+                self.plan_load(self.plan_in)
+            elif resuming:
+                # finish the interrupted sync without analyzing the trees again
+                self.journal_load()
+            elif self.plan_out or not self.pipeline:
+                # compare the source and destination trees once for both copying and deleting
+                self.file_analyze(self.source, self.destination, self.ignored_directories, self.delete_preference)
+        self.plan.delete_preference = self.delete_preference
+
+        if self.plan_out:
+            self.plan_save(self.plan_out)
+            self.metrics_save(sync_start)
+            self.logger.close_log()
+            return
+
+        # Check that the copies fit on the destination, and delete first if they only fit that way.
+        # A pipelined sync starts copying before the plan is finished, so it can't be checked.
+        delete_first = False
+        if not pipelined:
+            delete_first = self.check_free_space(self.delete_preference)
+
+        # Record the plan and progress, so the sync can be resumed if it is interrupted. A pipelined sync has no
+        # plan to record until it is done, so it can't be resumed.
+        if resuming:
+            self.journal.open(self.destination)
+        elif self.use_journal and not pipelined:
+            self.journal.start(self.plan, self.destination)
+
+        # rename moved files in the destination before copying
+        with self.metrics.phase("move"):
+            moved_count, moved_dir_count = self.file_move(self.destination)
+
+        deleted_count = 0
+        deleted_dir_count = 0
+        if delete_first:
+            with self.metrics.phase("delete"):
+                deleted_count, deleted_dir_count = self.file_delete(self.source, self.destination,
+                                                                    self.ignored_directories)
+
         # copy and update files from source to destination
-        new_count, updated_count, new_dir_count = self.file_copy(self.source, self.destination,
-                                                                 self.ignored_directories)
+        if pipelined:
+            with self.metrics.phase("analyze_and_copy"):
+                new_count, updated_count, new_dir_count, pipelined_moved_count = \
+                    self.file_copy_pipelined(self.source, self.destination, self.ignored_directories,
+                                             self.delete_preference)
+                moved_count += pipelined_moved_count
+        else:
+            with self.metrics.phase("copy"):
+                new_count, updated_count, new_dir_count = self.file_copy(self.source, self.destination,
+                                                                         self.ignored_directories)
 
         # delete files from destination that are not in source
-        if self.delete_preference:
-            deleted_count, deleted_dir_count = self.file_delete(self.source, self.destination, self.ignored_directories)
-        else:
-            deleted_count = 0
-            deleted_dir_count = 0
+        if self.delete_preference and not delete_first:
+            with self.metrics.phase("delete"):
+                deleted_count, deleted_dir_count = self.file_delete(self.source, self.destination,
+                                                                    self.ignored_directories)
+
+        # Save what was synced, so the next sync can skip scanning the destination.
+        # A saved plan or a journal doesn't know which files were already in sync, so the manifest is removed
+        # instead and the next sync scans the destination.
+        with self.metrics.phase("manifest"):
+            if self.plan_in or resuming:
+                self.manifest.remove(self.destination)
+            elif self.use_manifest:
+                self.manifest_update(self.source, self.destination)
+        self.journal.finish(self.destination)
+        self.plan.close()
 
         # Update the destination file name with a new date, if appropriate
         self.update_dirname_datetime(self.source, self.destination)
 
         # Print and log a summary of the sync
+        new_dir_count += moved_dir_count
         msg = f"Sync complete.\n" \
-              f"{new_count} files copied | {updated_count} files updated | {deleted_count} files deleted\n" \
+              f"{new_count} files copied | {updated_count} files updated | {moved_count} files moved | " \
+              f"{deleted_count} files deleted\n" \
               f"{new_dir_count} directories created | {deleted_dir_count} directories deleted\n"
         print(msg), self.logger.log(msg)
-        print("See timber.log for additional details.")
+        self.counts = {"copied": new_count, "updated": updated_count, "moved": moved_count,
+                       "deleted": deleted_count, "directories_created": new_dir_count,
+                       "directories_deleted": deleted_dir_count}
+        self.metrics_save(sync_start)
+        print("See %s for additional details." % self.logger.path)
 
         # Close the logger
         self.logger.close_log()